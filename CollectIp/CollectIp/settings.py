@@ -166,6 +166,74 @@ IP_POOL_CONFIG = {
     'CRAWLER_INTERVAL': 3600,  # 爬虫间隔（秒）
     'SCORE_INTERVAL': 1800,    # 评分间隔（秒）
     'MIN_SCORE': 10,          # 最低分数
+    'SCORER_ENGINE': 'thread',  # 评分引擎：thread（线程池）或 async（asyncio/aiohttp，需要时手动开启）
+    'SCORER_CONCURRENCY': 500,  # 异步评分同时在途的代理数量上限
+    # 分布式评分：把IP池切分成块，以Celery chord分发给多个worker并行探测，最后汇总批量写回
+    'SCORE_FANOUT': False,
+    'FANOUT_CHUNK_SIZE': 500,   # 每个子任务最多评分的IP数量
+    'FANOUT_PARALLELISM': 8,    # 子任务数量上限，IP过多时自动增大每块的大小
+    'PROBE_TIMEOUT': 10,        # 单次探测的全局超时（秒），也是自适应超时的上限
+    # 自适应超时：按代理最近成功探测延迟的分位数 × 倍数设置超时，限制在 [TIMEOUT_FLOOR, PROBE_TIMEOUT] 内
+    'ADAPTIVE_TIMEOUT': False,
+    'TIMEOUT_PERCENTILE': 0.95,
+    'TIMEOUT_MULTIPLIER': 3,
+    'TIMEOUT_FLOOR': 1,
+    'TIMEOUT_MIN_SAMPLES': 3,   # 成功样本少于该数量的代理使用全局超时
+    'SCORE_DEADLINE': 1500,     # 整次评分的时间上限（秒），到达后取消未完成的探测；None表示不限
+    'PROBE_MAX_TIMEOUTS': 1,  # 同一代理累计超时多少次后放弃其余探测URL
+    'CAPABILITY_TTL': 86400,  # 协议能力（HTTP/CONNECT/SOCKS）验证结果的有效期（秒），有效期内只探测支持的协议
+    'DETECT_SOCKS': False,  # 评分时是否额外检测SOCKS4/SOCKS5支持
+    'PROBE_CACHE_TTL': 300,  # 探测结果在Redis中的缓存时间（秒），评分器和爬虫中间件共享；0表示不缓存
+    # 单个代理同时在途的请求数上限，按分数分档 {最低分数: 上限}，爬虫本地代理池和共享代理池共用；
+    # 低于所有档位的代理使用最低一档，上限为0表示不限
+    'PROXY_INFLIGHT_TIERS': {80: 3, 50: 2, 0: 1},
+    # 跨进程共享的Redis代理池：评分后发布，爬虫进程原子租用/归还代理，见 ip_operator/redis_pool.py
+    'REDIS_POOL_ENABLED': False,
+    'REDIS_POOL_MIN_SCORE': 60,      # 分数不低于该值的代理进入共享池
+    'REDIS_POOL_SIZE': 2000,         # 共享池最多保留的代理数量（按分数从高到低）
+    'REDIS_POOL_LEASE_TTL': 300,     # 未归还租约的过期时间（秒）
+    'REDIS_POOL_TOP_N': 50,          # 每次租用时参与加权随机选择的候选数量
+    'REDIS_POOL_MIN_WEIGHT': 5,      # 失败后权重低于该值的代理移出共享池
+    # 热门代理池（hot_pool表）：评分后物化的高分代理，爬虫中间件按排名读取
+    'HOT_POOL_SIZE': 500,
+    'HOT_POOL_MIN_SCORE': 50,
+    'HOT_POOL_MAX_AGE': 7200,        # 只物化该时间（秒）内更新过的代理
+    # TCP预筛选：HTTP探测前先并发检查 ip:port 能否建立TCP连接，只有存活的代理进入HTTP探测
+    'PREFILTER_ENABLED': False,  # 开启后端口不通的代理直接记0分（低于MIN_SCORE时删除）
+    'PREFILTER_TIMEOUT': 2,          # 单个TCP连接超时（秒）
+    'PREFILTER_CONCURRENCY': 1000,   # 同时进行的TCP连接数量上限（受文件描述符上限限制）
+    'SCORE_WRITE_CHUNK_SIZE': 500,  # 评分结果批量写回时每条SQL语句处理的IP数量
+    'SCORE_FLUSH_SIZE': 50,        # 流式写回：缓冲多少个评分结果写一次数据库
+    'SCORE_FLUSH_INTERVAL': 2,     # 流式写回：距上次写回超过多少秒立即写回
+    # 评分模型：latest 直接使用本次探测分数；history 记录每次探测明细，
+    # 用时间衰减的EWMA延迟和Beta分布成功率计算稳定的分数；
+    # composite 在 history 的基础上，评分结束后用NumPy对本次写回的代理计算综合分数
+    # （延迟、成功率、速度、在线率加权；新鲜度只在计算整个IP池时使用），低分删除仍以 history 分数为准
+    'SCORE_MODEL': 'latest',  # history / composite 会改变低分代理的删除规则，需要时手动开启
+    'COMPOSITE_WEIGHTS': {
+        'latency': 0.35,
+        'success': 0.30,
+        'speed': 0.10,
+        'uptime': 0.15,
+        'freshness': 0.10,
+    },
+    'COMPOSITE_FRESHNESS_HALF_LIFE': 86400,  # 新鲜度得分的半衰期（秒）
+    'HISTORY_HALF_LIFE': 6 * 3600,   # 历史记录权重的半衰期（秒）
+    'HISTORY_WINDOW': 3 * 86400,     # 计算分数时使用的历史窗口（秒）
+    'HISTORY_RETENTION': 7 * 86400,  # 评分历史保留时间（秒）
+    'HISTORY_PRIOR': (1.0, 1.0),     # 成功率Beta先验 (α, β)
+    # 重评分模式：full 每次重评整个IP池；incremental 每次只重评优先级最高的一批到期代理，
+    # 此时应缩短 SCORE_INTERVAL，让每次运行只处理少量代理
+    'RESCORE_MODE': 'full',
+    'RESCORE_BATCH_SIZE': 500,      # 增量模式每次最多重评的代理数量
+    'RESCORE_BASE_INTERVAL': 1800,  # 健康代理的期望重评间隔（秒）
+    'RESCORE_MAX_BACKOFF': 6,       # 连续失败代理的最大退避指数，间隔最长为 基础间隔 * 2^6
+    # 内置探测目标服务器（python -m ip_operator.probe_server），未配置HTTP_URL时使用httpbin.org
+    'PROBE_TARGET': {
+        'HTTP_URL': None,   # 例如 'http://your-server:8899/judge'
+        'HTTPS_URL': None,  # 例如 'https://your-server:8443/judge'
+        'VERIFY_SSL': False,
+    },
     'TEST_URLS': [
         'http://www.baidu.com',
         'http://www.qq.com',
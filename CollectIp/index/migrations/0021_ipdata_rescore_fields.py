@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index', '0020_collection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipdata',
+            name='fail_count',
+            field=models.IntegerField(default=0, verbose_name='连续失败次数'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='last_scored_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最近评分时间'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='use_count',
+            field=models.IntegerField(default=0, verbose_name='使用次数'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index', '0021_ipdata_rescore_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('server', models.CharField(max_length=21, verbose_name='服务器')),
+                ('protocol', models.CharField(default='http', max_length=8, verbose_name='协议')),
+                ('success', models.BooleanField(default=False, verbose_name='是否成功')),
+                ('latency_ms', models.IntegerField(blank=True, null=True, verbose_name='延迟ms')),
+                ('probed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='探测时间')),
+            ],
+            options={
+                'verbose_name': '评分历史',
+                'verbose_name_plural': '评分历史',
+                'indexes': [models.Index(fields=['server', 'probed_at'], name='index_score_server_c1fff6_idx')],
+            },
+        ),
+    ]
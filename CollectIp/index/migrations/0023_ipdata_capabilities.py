@@ -0,0 +1,38 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index', '0022_scorehistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipdata',
+            name='capability_checked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='协议能力验证时间'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='supports_connect',
+            field=models.BooleanField(blank=True, null=True, verbose_name='支持CONNECT隧道'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='supports_http',
+            field=models.BooleanField(blank=True, null=True, verbose_name='支持HTTP'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='supports_socks4',
+            field=models.BooleanField(blank=True, null=True, verbose_name='支持SOCKS4'),
+        ),
+        migrations.AddField(
+            model_name='ipdata',
+            name='supports_socks5',
+            field=models.BooleanField(blank=True, null=True, verbose_name='支持SOCKS5'),
+        ),
+    ]
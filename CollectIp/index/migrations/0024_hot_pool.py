@@ -0,0 +1,43 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('index', '0023_ipdata_capabilities'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotProxy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pool_rank', models.IntegerField(unique=True, verbose_name='排名')),
+                ('server', models.CharField(max_length=21, unique=True, verbose_name='服务器')),
+                ('score', models.IntegerField(verbose_name='分数')),
+                ('ping', models.DecimalField(blank=True, decimal_places=4, max_digits=6, null=True, verbose_name='延迟ms')),
+                ('speed', models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True, verbose_name='速度')),
+                ('country', models.CharField(default='Unknown', max_length=20, verbose_name='国家')),
+                ('supports_connect', models.BooleanField(blank=True, null=True, verbose_name='支持CONNECT隧道')),
+                ('updated_at', models.DateTimeField(verbose_name='更新时间')),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='物化时间')),
+            ],
+            options={
+                'verbose_name': '热门代理池',
+                'verbose_name_plural': '热门代理池',
+                'db_table': 'hot_pool',
+                'ordering': ['pool_rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ipdata',
+            index=models.Index(fields=['score', 'updated_at'], name='index_ipdat_score_0174a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ipdata',
+            index=models.Index(fields=['country', 'score'], name='index_ipdat_country_6fc04d_idx'),
+        ),
+    ]
@@ -19,15 +19,68 @@ class IpData(models.Model):
     score = models.IntegerField(verbose_name='分数', default=100)
     created_at = models.DateTimeField(verbose_name='创建时间', default=timezone.now)
     updated_at = models.DateTimeField(verbose_name='更新时间', default=timezone.now)
+    last_scored_at = models.DateTimeField(verbose_name='最近评分时间', blank=True, null=True)
+    fail_count = models.IntegerField(verbose_name='连续失败次数', default=0)
+    use_count = models.IntegerField(verbose_name='使用次数', default=0)
+    # 探测得到的协议能力，None表示尚未验证
+    supports_http = models.BooleanField(verbose_name='支持HTTP', blank=True, null=True)
+    supports_connect = models.BooleanField(verbose_name='支持CONNECT隧道', blank=True, null=True)
+    supports_socks4 = models.BooleanField(verbose_name='支持SOCKS4', blank=True, null=True)
+    supports_socks5 = models.BooleanField(verbose_name='支持SOCKS5', blank=True, null=True)
+    capability_checked_at = models.DateTimeField(verbose_name='协议能力验证时间', blank=True, null=True)
 
     class Meta:
         verbose_name = 'IP池'
         verbose_name_plural = verbose_name
         ordering = ['-score', '-updated_at']
+        indexes = [
+            # 爬虫中间件按分数和更新时间、按国家和分数选择代理
+            models.Index(fields=['score', 'updated_at']),
+            models.Index(fields=['country', 'score']),
+        ]
 
     def __str__(self):
         return f"{self.server} - {self.country}"
 
+class HotProxy(models.Model):
+    """热门代理池：每次评分结束后从IpData中按分数排序物化的少量高分代理，供爬虫中间件按排名直接读取"""
+    pool_rank = models.IntegerField(unique=True, verbose_name='排名')
+    server = models.CharField(max_length=21, unique=True, verbose_name='服务器')
+    score = models.IntegerField(verbose_name='分数')
+    ping = models.DecimalField(max_digits=6, decimal_places=4, verbose_name='延迟ms', blank=True, null=True)
+    speed = models.DecimalField(max_digits=7, decimal_places=2, verbose_name='速度', blank=True, null=True)
+    country = models.CharField(max_length=20, verbose_name='国家', default='Unknown')
+    supports_connect = models.BooleanField(verbose_name='支持CONNECT隧道', blank=True, null=True)
+    updated_at = models.DateTimeField(verbose_name='更新时间')
+    refreshed_at = models.DateTimeField(verbose_name='物化时间', default=timezone.now)
+
+    class Meta:
+        db_table = 'hot_pool'
+        verbose_name = '热门代理池'
+        verbose_name_plural = verbose_name
+        ordering = ['pool_rank']
+
+    def __str__(self):
+        return f"{self.pool_rank} - {self.server}"
+
+class ScoreHistory(models.Model):
+    """代理单次探测记录，用于计算随时间衰减的统计评分"""
+    server = models.CharField(max_length=21, verbose_name='服务器')
+    protocol = models.CharField(max_length=8, verbose_name='协议', default='http')
+    success = models.BooleanField(verbose_name='是否成功', default=False)
+    latency_ms = models.IntegerField(verbose_name='延迟ms', blank=True, null=True)
+    probed_at = models.DateTimeField(verbose_name='探测时间', default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = '评分历史'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['server', 'probed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.server} - {self.protocol} - {'成功' if self.success else '失败'}"
+
 class Movie(models.Model):
     title = models.CharField(max_length=200, verbose_name='电影名称')
     director = models.CharField(max_length=100, verbose_name='导演')
@@ -0,0 +1,121 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+评分计算内核的Cython实现，接口与 score_kernel.py 中的纯Python实现一致
+编译: 在 CollectIp 目录下执行 python utlis/setup.py build_ext --inplace
+"""
+from libc.math cimport exp, log, ceil, NAN
+from libc.stdlib cimport calloc, realloc, free
+from libc.string cimport memset
+
+
+def parse_proxy(str value):
+    """解析 'a.b.c.d:port' 格式的代理地址，合法时返回 (host, port)，否则返回None"""
+    cdef Py_UCS4 ch
+    cdef int octet = 0, digits = 0, dots = 0
+    cdef long port = 0
+    cdef int port_digits = 0
+    cdef bint in_port = False
+
+    for ch in value:
+        if ch == u':':
+            if in_port or dots != 3 or digits == 0:
+                return None
+            in_port = True
+        elif ch == u'.':
+            if in_port or digits == 0:
+                return None
+            dots += 1
+            if dots > 3:
+                return None
+            digits = 0
+            octet = 0
+        elif u'0' <= ch <= u'9':
+            if in_port:
+                port = port * 10 + (<int>ch - 48)
+                port_digits += 1
+                if port_digits > 5:
+                    return None
+            else:
+                octet = octet * 10 + (<int>ch - 48)
+                digits += 1
+                if digits > 3 or octet > 255:
+                    return None
+        else:
+            return None
+
+    if not in_port or port_digits == 0 or port <= 0 or port >= 65536:
+        return None
+    return value[:len(value) - port_digits - 1], port
+
+
+def decayed_scores(rows, double half_life, double prior_a, double prior_b, double timeout):
+    """按时间衰减聚合评分历史，计算每个代理的分数，公式见 score_kernel.decayed_scores"""
+    cdef double decay = log(2.0) / half_life
+    cdef double weight, age, alpha, beta, latency_score
+    cdef Py_ssize_t k, count = 0, capacity = 256
+    cdef dict index = {}
+    cdef list servers = []
+    cdef object slot
+    # 每个代理4个累加量: 成功权重, 失败权重, 延迟加权和, 延迟权重
+    cdef double *acc = <double *>calloc(capacity * 4, sizeof(double))
+    cdef double *grown
+    if acc == NULL:
+        raise MemoryError()
+
+    try:
+        for server, success, latency_ms, age_obj in rows:
+            slot = index.get(server)
+            if slot is None:
+                if count == capacity:
+                    grown = <double *>realloc(acc, capacity * 8 * sizeof(double))
+                    if grown == NULL:
+                        raise MemoryError()
+                    acc = grown
+                    memset(acc + capacity * 4, 0, capacity * 4 * sizeof(double))
+                    capacity *= 2
+                k = count
+                index[server] = k
+                servers.append(server)
+                count += 1
+            else:
+                k = slot
+            age = age_obj
+            if age < 0:
+                age = 0
+            weight = exp(-decay * age)
+            if success:
+                acc[k * 4] += weight
+                if latency_ms is not None:
+                    acc[k * 4 + 2] += weight * (<double>latency_ms) / 1000.0
+                    acc[k * 4 + 3] += weight
+            else:
+                acc[k * 4 + 1] += weight
+
+        scores = {}
+        for k in range(count):
+            if acc[k * 4 + 3] <= 0:
+                scores[servers[k]] = 0.0
+                continue
+            alpha = prior_a + acc[k * 4]
+            beta = prior_b + acc[k * 4 + 1]
+            latency_score = 1.0 - acc[k * 4 + 2] / acc[k * 4 + 3] / timeout
+            if latency_score < 0:
+                latency_score = 0.0
+            scores[servers[k]] = 100.0 * alpha / (alpha + beta) * latency_score
+        return scores
+    finally:
+        free(acc)
+
+
+def latency_quantile(values, double quantile):
+    """最近秩法计算延迟分位数，values 为空时返回NaN"""
+    cdef Py_ssize_t n = len(values), rank
+    if n == 0:
+        return NAN
+    ordered = sorted(values)
+    rank = <Py_ssize_t>ceil(quantile * n)
+    if rank < 1:
+        rank = 1
+    if rank > n:
+        rank = n
+    return ordered[rank - 1]
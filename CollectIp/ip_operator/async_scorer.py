@@ -0,0 +1,177 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+import logging
+import ssl
+
+import aiohttp
+
+from .capability import async_detect_socks
+from .ip_scorer import IPScorer
+from .score_kernel import parse_proxy
+from .probe_policy import BAD_STATUS, OK, classify_exception
+
+logger = logging.getLogger('ip_operator')
+
+
+class AsyncIPScorer(IPScorer):
+    """基于asyncio/aiohttp的IP评分引擎
+
+    与IPScorer保持相同的 score_ip_pool(ip_list) -> {server: score} 接口，
+    但所有探测都在同一个事件循环中并发执行，单核即可同时保持数千个探测在途。
+    """
+
+    def __init__(self, concurrency=500):
+        super().__init__()
+        self.concurrency = max(1, int(concurrency))  # 同时在途的代理数量上限
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+
+    async def probe_ip(self, session, ip, ssl_support=None):
+        """异步测试单个IP，返回 (score, metrics)，评分规则与 IPScorer.probe_single_ip 一致
+
+        aiohttp对HTTPS目标统一通过 CONNECT 隧道经 http://ip:port 代理访问。
+        缓存只读取 prepare() 预取的结果，写入由 iter_scores 在调用线程完成。
+        """
+        scores = []
+        latencies = []
+        metrics = {'latency': None, 'attempts': 0, 'successes': 0, 'anonymity': None, 'skipped': 0, 'cached': 0,
+                   'probes': []}
+        if parse_proxy(ip) is None:
+            logger.warning(f"IP格式不正确: {ip}")
+            return 0, metrics
+
+        test_urls = self.select_test_urls(ssl_support)
+        proxy = f'http://{ip}'
+
+        plan = self.start_plan(ip, test_urls, metrics, scores, latencies)
+        for url in plan:
+            metrics['attempts'] += 1
+            probe = {'protocol': url.split(':', 1)[0], 'success': False, 'latency': None, 'outcome': BAD_STATUS}
+            metrics['probes'].append(probe)
+            try:
+                start_time = time.monotonic()
+                timeout = aiohttp.ClientTimeout(total=self.timeout_for(ip))
+                async with session.get(url, proxy=proxy, allow_redirects=False, timeout=timeout) as response:
+                    body = await response.read()
+                    elapsed_time = time.monotonic() - start_time
+
+                    if response.status in (200, 301, 302):
+                        if self.use_judge:
+                            self.record_anonymity(ip, json.loads(body))
+                        score = self.latency_score(elapsed_time)
+                        scores.append(score)
+                        latencies.append(elapsed_time)
+                        probe.update(success=True, latency=elapsed_time, outcome=OK)
+                        logger.debug(f"IP: {ip} 访问 {url} 成功，得分: {score:.2f}，耗时: {elapsed_time:.2f}秒")
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+                probe['outcome'] = classify_exception(e, url)
+                logger.debug(f"IP: {ip} 访问 {url} 异常({probe['outcome']}): {type(e).__name__}: {e}")
+            finally:
+                plan.record(url, probe['outcome'])
+
+        metrics['skipped'] = plan.skipped
+        if self.detect_socks:
+            metrics['socks'] = await async_detect_socks(ip, self.socks4_target, timeout=min(3, self.timeout_for(ip)))
+        return self.summarize(ip, scores, latencies, metrics)
+
+    def ssl_option(self):
+        """把 verify_ssl 转换为aiohttp的 ssl 参数，与线程池引擎中 requests 的 verify 含义一致:
+        True 校验证书，False 不校验，字符串为CA证书文件路径"""
+        if isinstance(self.verify_ssl, str):
+            return ssl.create_default_context(cafile=self.verify_ssl)
+        return True if self.verify_ssl else False
+
+    async def aiter_scores(self, ip_list, protocol_hints=None):
+        """异步迭代器：按探测完成的顺序逐个产出 (server, score, metrics)"""
+        protocol_hints = protocol_hints or {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            ssl=self.ssl_option(),
+            force_close=True,  # 每个代理只用一次连接，不需要保活
+            ttl_dns_cache=300,
+        )
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=self.headers
+        ) as session:
+
+            async def run_one(ip):
+                async with semaphore:
+                    try:
+                        score, metrics = await self.probe_ip(session, ip, protocol_hints.get(ip))
+                    except Exception as e:
+                        logger.error(f"IP {ip} 测试失败: {e}")
+                        score, metrics = 0, {}
+                    return ip, score, metrics
+
+            tasks = [asyncio.ensure_future(run_one(ip)) for ip in ip_list]
+            finished = 0
+            try:
+                for next_done in asyncio.as_completed(tasks, timeout=self.remaining_time()):
+                    yield await next_done
+                    finished += 1
+            except asyncio.TimeoutError:
+                # 到达评分截止时间，取消仍在途的探测，未完成的代理保留原分数
+                logger.warning(f"评分到达截止时间，取消 {len(tasks) - finished} 个未完成的IP")
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    def iter_scores(self, ip_list, on_idle=None, idle_interval=1.0):
+        """在后台线程的事件循环中探测，调用线程按完成顺序逐个取得 (server, score, metrics)
+
+        评分结果的写回（Django ORM）留在调用线程，事件循环线程只负责网络探测。
+        on_idle 的含义与 IPScorer.iter_scores 相同。
+        """
+        ip_list = list(ip_list)
+        protocol_hints = self.prepare(ip_list)
+        results = queue.Queue()
+        stopped = threading.Event()
+        finished = object()
+
+        async def produce():
+            async for item in self.aiter_scores(ip_list, protocol_hints):
+                results.put(item)
+                if stopped.is_set():
+                    break
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                logger.error(f"异步评分事件循环异常退出: {e}")
+            finally:
+                results.put(finished)
+
+        start_time = time.monotonic()
+        thread = threading.Thread(target=run, name='async-scorer', daemon=True)
+        thread.start()
+
+        count = 0
+        try:
+            while True:
+                try:
+                    item = results.get(timeout=idle_interval if on_idle else None)
+                except queue.Empty:
+                    on_idle()
+                    continue
+                if item is finished:
+                    break
+                count += 1
+                # 缓存写入放在调用线程，不阻塞事件循环
+                self.store_probes(item[0], item[2])
+                yield item
+        finally:
+            stopped.set()
+            self.deadline = None
+
+        logger.info(
+            f"异步评分完成: {count} 个IP, 并发上限 {self.concurrency}, "
+            f"耗时 {time.monotonic() - start_time:.1f}秒"
+        )
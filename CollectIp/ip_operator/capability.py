@@ -0,0 +1,97 @@
+"""
+代理协议能力检测
+
+HTTP 和 CONNECT 隧道能力由评分探测本身得出（见 protocol_capabilities），
+SOCKS4/SOCKS5 通过一次握手单独检测:
+- SOCKS5: 发送无认证的问候 05 01 00，回复 05 00 表示支持
+- SOCKS4: 向探测目标发送 CONNECT 请求 04 01 port ip 00，回复 00 5A 表示支持
+"""
+import asyncio
+import socket
+import struct
+from urllib.parse import urlsplit
+
+from .probe_policy import OK
+
+SOCKS5_GREETING = b'\x05\x01\x00'
+
+
+def socks4_request(target):
+    """构造到 target=(ipv4, port) 的SOCKS4 CONNECT请求"""
+    host, port = target
+    return b'\x04\x01' + struct.pack('>H', port) + socket.inet_aton(host) + b'\x00'
+
+
+def resolve_socks4_target(url):
+    """把探测URL解析为SOCKS4 CONNECT的目标 (ipv4, port)，解析失败返回None"""
+    parts = urlsplit(url)
+    try:
+        host = socket.gethostbyname(parts.hostname)
+    except (OSError, TypeError):
+        return None
+    return host, parts.port or (443 if parts.scheme == 'https' else 80)
+
+
+def protocol_capabilities(probes):
+    """根据一次评分的探测明细得出HTTP/CONNECT能力
+
+    某种协议至少成功一次为True，探测过但全部失败为False，没有探测为None。
+
+    Returns:
+        dict: {'http': bool|None, 'connect': bool|None}
+    """
+    capabilities = {'http': None, 'connect': None}
+    for probe in probes or ():
+        key = 'connect' if probe.get('protocol') == 'https' else probe.get('protocol')
+        if key not in capabilities:
+            continue
+        success = bool(probe.get('success')) or probe.get('outcome') == OK
+        capabilities[key] = success or bool(capabilities[key])
+    return capabilities
+
+
+def _parse_reply(reply, expected):
+    return len(reply) >= 2 and reply[:2] == expected
+
+
+def detect_socks(server, socks4_target=None, timeout=3):
+    """同步检测SOCKS4/5支持
+
+    Returns:
+        dict: {'socks4': bool|None, 'socks5': bool}，未提供 socks4_target 时不检测SOCKS4
+    """
+    host, _, port = server.rpartition(':')
+    result = {'socks4': None, 'socks5': False}
+    checks = [('socks5', SOCKS5_GREETING, b'\x05\x00')]
+    if socks4_target:
+        checks.append(('socks4', socks4_request(socks4_target), b'\x00\x5a'))
+    for name, request, expected in checks:
+        try:
+            with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+                sock.sendall(request)
+                result[name] = _parse_reply(sock.recv(8), expected)
+        except (OSError, ValueError):
+            result[name] = False
+    return result
+
+
+async def async_detect_socks(server, socks4_target=None, timeout=3):
+    """异步检测SOCKS4/5支持，返回值同 detect_socks"""
+    host, _, port = server.rpartition(':')
+    result = {'socks4': None, 'socks5': False}
+    checks = [('socks5', SOCKS5_GREETING, b'\x05\x00')]
+    if socks4_target:
+        checks.append(('socks4', socks4_request(socks4_target), b'\x00\x5a'))
+    for name, request, expected in checks:
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+            writer.write(request)
+            await writer.drain()
+            result[name] = _parse_reply(await asyncio.wait_for(reader.read(8), timeout), expected)
+        except (OSError, ValueError, asyncio.TimeoutError):
+            result[name] = False
+        finally:
+            if writer is not None:
+                writer.close()
+    return result
@@ -0,0 +1,116 @@
+"""
+代理熔断器
+
+代替只增不减的黑名单，每个代理有三种状态:
+- closed: 正常使用，连续失败达到 failure_threshold 次后熔断
+- open: 熔断，不再分配请求；熔断时长从 base_delay 开始每次熔断翻倍，最长 max_delay
+- half_open: 熔断时间到期后只放行一个试探请求，成功则恢复为 closed 并清除记录，失败则再次熔断（时长翻倍）
+
+没有再失败的代理在 reset_after 秒后自动清除记录，长时间运行的爬虫不会因为偶发失败逐渐耗尽代理。
+"""
+import heapq
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProxyBreaker:
+    """按代理维护的熔断器"""
+
+    def __init__(self, failure_threshold=2, base_delay=30, max_delay=1800, reset_after=3600, trial_timeout=120):
+        """
+        Args:
+            failure_threshold (int): 连续失败多少次后熔断
+            base_delay (float): 第一次熔断的时长（秒）
+            max_delay (float): 熔断时长上限（秒）
+            reset_after (float): 最后一次失败后多久清除记录（秒）
+            trial_timeout (float): 试探请求多久没有结果后允许再次试探（秒）
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reset_after = reset_after
+        self.trial_timeout = trial_timeout
+        self.entries = {}  # {proxy: {'failures', 'trips', 'open_until', 'trial_at', 'last_failure'}}
+        self._reopen = []  # (open_until, proxy) 小顶堆，用于找出熔断到期的代理
+
+    def state(self, proxy, now=None):
+        entry = self.entries.get(proxy)
+        if entry is None or entry['open_until'] is None:
+            return CLOSED
+        now = time.monotonic() if now is None else now
+        return OPEN if now < entry['open_until'] else HALF_OPEN
+
+    def is_open(self, proxy, now=None):
+        return self.state(proxy, now) == OPEN
+
+    def available(self, proxy, now=None):
+        """代理当前能否分配请求：closed，或 half_open 且没有正在进行的试探请求"""
+        now = time.monotonic() if now is None else now
+        state = self.state(proxy, now)
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        trial_at = self.entries[proxy]['trial_at']
+        return trial_at is None or now - trial_at >= self.trial_timeout
+
+    def acquire(self, proxy, now=None):
+        """代理被分配请求时调用，half_open 状态下把这次请求标记为试探请求"""
+        now = time.monotonic() if now is None else now
+        if self.state(proxy, now) == HALF_OPEN:
+            self.entries[proxy]['trial_at'] = now
+
+    def success(self, proxy):
+        """请求成功：清除记录，恢复为 closed"""
+        self.entries.pop(proxy, None)
+
+    def failure(self, proxy, now=None):
+        """请求失败，返回这次失败是否导致熔断"""
+        now = time.monotonic() if now is None else now
+        entry = self.entries.get(proxy)
+        if entry is None or now - entry['last_failure'] >= self.reset_after:
+            entry = self.entries[proxy] = {'failures': 0, 'trips': 0, 'open_until': None,
+                                           'trial_at': None, 'last_failure': now}
+        state = self.state(proxy, now)
+        entry['failures'] += 1
+        entry['last_failure'] = now
+        if state == OPEN:
+            return False
+        if state == HALF_OPEN or entry['failures'] >= self.failure_threshold:
+            entry['trips'] += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (entry['trips'] - 1))
+            entry['open_until'] = now + delay
+            entry['trial_at'] = None
+            heapq.heappush(self._reopen, (entry['open_until'], proxy))
+            return True
+        return False
+
+    def pop_due(self, now=None):
+        """返回熔断已到期、进入 half_open 的代理，并清除过期的记录"""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self._reopen and self._reopen[0][0] <= now:
+            open_until, proxy = heapq.heappop(self._reopen)
+            entry = self.entries.get(proxy)
+            # 堆中可能残留已被新的熔断覆盖或已清除的旧记录
+            if entry is not None and entry['open_until'] == open_until:
+                due.append(proxy)
+        self.prune(now)
+        return due
+
+    def prune(self, now=None):
+        """清除 reset_after 秒内没有再失败、且未处于熔断中的代理记录"""
+        now = time.monotonic() if now is None else now
+        expired = [
+            proxy for proxy, entry in self.entries.items()
+            if now - entry['last_failure'] >= self.reset_after and self.state(proxy, now) != OPEN
+        ]
+        for proxy in expired:
+            del self.entries[proxy]
+
+    def open_proxies(self, now=None):
+        now = time.monotonic() if now is None else now
+        return [proxy for proxy in self.entries if self.state(proxy, now) == OPEN]
@@ -0,0 +1,84 @@
+"""
+支持中止对冲请求的HTTP下载处理器
+
+engine.download() 返回的 Deferred 停在下载器槽位队列中一个没有取消器的 Deferred 上，
+对它调用 cancel() 并不会中止真正的传输：落败的请求继续占用下载槽位、连接和代理，直到 DOWNLOAD_TIMEOUT。
+
+HedgeAwareDownloadHandler 包装Scrapy的 HTTP/1.1 下载处理器，为对冲请求的每次尝试记下传输本身的 Deferred。
+HedgedRequestMiddleware 选出胜者后调用 abort_download()，取消落败一方的传输（与 DOWNLOAD_TIMEOUT
+超时走同一条路径，连接被中止）；尚在槽位队列中的尝试轮到下载时直接失败，不再建立连接。
+落败一方的下载统一以 twisted 的 CancelledError 结束，ProxyMiddleware 在传输真正结束后才归还代理。
+
+需要在 DOWNLOAD_HANDLERS 中为 http 和 https 配置本处理器，见 settings.py。
+"""
+import inspect
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
+from scrapy.utils.misc import build_from_crawler
+from twisted.internet import defer
+from twisted.internet.defer import CancelledError
+from twisted.python.failure import Failure
+
+# requirements 固定的 Scrapy 2.12 的下载处理器返回 Deferred，较新的版本改为协程
+ASYNC_HANDLERS = inspect.iscoroutinefunction(HTTP11DownloadHandler.download_request)
+
+
+def abort_download(request):
+    """中止对冲尝试的下载，返回是否取消了进行中的传输"""
+    request.meta['hedge_cancelled'] = True
+    transfer = request.meta.pop('hedge_transfer', None)
+    if transfer is None:
+        return False
+    transfer.cancel()
+    return True
+
+
+class HedgeAwareDownloadHandler:
+    """HTTP/1.1 下载处理器的包装，对冲尝试的传输可以被 abort_download() 中止，其他请求原样下载"""
+
+    lazy = False
+
+    def __init__(self, crawler):
+        self.handler = build_from_crawler(HTTP11DownloadHandler, crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def transfer(self, request, spider=None):
+        """开始下载，返回可取消的 Deferred"""
+        if ASYNC_HANDLERS:
+            return deferred_from_coro(self.handler.download_request(request))
+        return self.handler.download_request(request, spider)
+
+    def download(self, request, spider=None):
+        if 'hedge_attempt' not in request.meta:
+            return self.transfer(request, spider)
+        if request.meta.get('hedge_cancelled'):
+            # 在槽位队列中等待时已经落败
+            return defer.fail(CancelledError())
+
+        def finished(result):
+            request.meta.pop('hedge_transfer', None)
+            if isinstance(result, Failure) and request.meta.get('hedge_cancelled'):
+                # Scrapy 2.13 起处理器把 CancelledError 转换为 DownloadCancelledError，这里统一还原
+                return Failure(CancelledError())
+            return result
+
+        transfer = self.transfer(request, spider)
+        request.meta['hedge_transfer'] = transfer
+        return transfer.addBoth(finished)
+
+    if ASYNC_HANDLERS:
+        async def download_request(self, request):
+            return await maybe_deferred_to_future(self.download(request))
+
+        async def close(self):
+            await self.handler.close()
+    else:
+        def download_request(self, request, spider):
+            return self.download(request, spider)
+
+        def close(self):
+            return self.handler.close()
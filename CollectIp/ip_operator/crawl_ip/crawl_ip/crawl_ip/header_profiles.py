@@ -0,0 +1,118 @@
+"""
+预先生成的浏览器请求头组合
+
+每个组合由一个 User-Agent 推导出其余请求头，保证同一个请求里的信息互相一致:
+- Chrome / Edge 发送与UA版本、平台、是否移动端一致的 Sec-CH-UA、Sec-CH-UA-Mobile、Sec-CH-UA-Platform
+- Firefox / Safari 不发送 Client Hints
+- Accept 使用该浏览器导航请求的默认值
+
+组合在中间件初始化时生成一次，之后只读（MappingProxyType），每个请求只需随机选择一个组合并合并到请求头。
+encode_profile() 预先按 Scrapy Headers 的规则把键名和值转换为字节，合并时不再逐项转换。
+"""
+import re
+from types import MappingProxyType
+
+from scrapy.http import Headers
+
+# 导航请求的通用请求头
+NAVIGATION_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+}
+
+# 各浏览器导航请求的默认 Accept
+BROWSER_ACCEPT = {
+    'chrome': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,'
+              'application/signed-exchange;v=b3;q=0.7',
+    'edge': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,'
+            'application/signed-exchange;v=b3;q=0.7',
+    'firefox': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'safari': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+}
+
+# Sec-CH-UA 中的品牌名
+BRANDS = {
+    'chrome': 'Google Chrome',
+    'edge': 'Microsoft Edge',
+}
+
+
+def describe_user_agent(user_agent):
+    """从 User-Agent 解析 (浏览器, 主版本号, 平台, 是否移动端)"""
+    if 'iPhone' in user_agent or 'iPad' in user_agent:
+        platform = 'iOS'
+    elif 'Android' in user_agent:
+        platform = 'Android'
+    elif 'Macintosh' in user_agent:
+        platform = 'macOS'
+    elif 'Windows' in user_agent:
+        platform = 'Windows'
+    else:
+        platform = 'Linux'
+    mobile = 'Mobile' in user_agent or platform in ('iOS', 'Android')
+
+    for browser, pattern in (('edge', r'Edg/(\d+)'), ('firefox', r'Firefox/(\d+)'), ('chrome', r'Chrome/(\d+)'),
+                             ('safari', r'Version/(\d+)')):
+        match = re.search(pattern, user_agent)
+        if match:
+            return browser, match.group(1), platform, mobile
+    return 'safari', '', platform, mobile
+
+
+def client_hints(browser, version, platform, mobile):
+    """Chromium内核浏览器默认发送的低熵 Client Hints，其他浏览器返回空字典"""
+    brand = BRANDS.get(browser)
+    if brand is None:
+        return {}
+    return {
+        'Sec-CH-UA': f'"{brand}";v="{version}", "Chromium";v="{version}", "Not A(Brand";v="99"',
+        'Sec-CH-UA-Mobile': '?1' if mobile else '?0',
+        'Sec-CH-UA-Platform': f'"{platform}"',
+    }
+
+
+def build_profile(user_agent, accept_language, overrides=None):
+    """生成一个只读的请求头组合，overrides 中的请求头（键不区分大小写）覆盖推导结果"""
+    browser, version, platform, mobile = describe_user_agent(user_agent)
+    headers = dict(NAVIGATION_HEADERS)
+    headers.update({
+        'User-Agent': user_agent,
+        'Accept': BROWSER_ACCEPT[browser],
+        'Accept-Language': accept_language,
+    })
+    headers.update(client_hints(browser, version, platform, mobile))
+    if overrides:
+        lowered = {key.lower(): key for key in headers}
+        for key, value in overrides.items():
+            # 保留推导结果中的键名，profile['User-Agent'] 始终存在
+            headers[lowered.get(key.lower(), key)] = value
+    return MappingProxyType(headers)
+
+
+def build_header_profiles(user_agents, accept_languages):
+    """每个 (User-Agent, Accept-Language) 组合生成一个请求头组合"""
+    return tuple(
+        build_profile(user_agent, accept_language)
+        for user_agent in user_agents
+        for accept_language in accept_languages
+    )
+
+
+def encode_profile(profile):
+    """按 Scrapy Headers 的规则把请求头组合转换为 {键名字节: 值字节}"""
+    return MappingProxyType({key: values[-1] for key, values in dict.items(Headers(profile))})
+
+
+def merge_headers(headers, encoded):
+    """把 encode_profile() 的结果合并到请求的 Headers，已有的同名请求头被覆盖
+
+    Headers.update 会对每个键名和值重新做大小写和编码转换，这里直接写入已转换好的字节；
+    每个值放入新的列表，后续 appendlist 不会修改共享的组合。
+    """
+    dict.update(headers, {key: [value] for key, value in encoded.items()})
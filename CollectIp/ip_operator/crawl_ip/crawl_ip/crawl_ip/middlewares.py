@@ -8,17 +8,41 @@ from scrapy import signals
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+import logging
 import random
 import pymysql
 from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.misc import load_object
+from twisted.internet.defer import CancelledError, Deferred
+from twisted.internet.threads import deferToThread
+from twisted.python.failure import Failure
 import time
 import sys
 import os
+import socket
+from collections import deque
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlparse
 
 # 添加ip_operator到系统路径
 sys.path.append(str(Path(__file__).parent.parent.parent.parent))
 from ip_operator.ip_scorer import IPScorer  # 导入IPScorer类
+from ip_operator.circuit_breaker import ProxyBreaker
+from ip_operator.domain_bandit import DomainBandit
+from ip_operator.inflight import InflightTracker
+from ip_operator.redis_pool import load_redis_pool
+from ip_operator.score_kernel import latency_quantile, parse_proxy
+from ip_operator.weighted_pool import WeightedPool
+import redis
+
+from .handlers import HedgeAwareDownloadHandler, abort_download
+from .header_profiles import build_header_profiles, build_profile, encode_profile, merge_headers
+
+logger = logging.getLogger(__name__)
 
 
 class CrawlIpSpiderMiddleware:
@@ -115,20 +139,319 @@ class CrawlIpDownloaderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+class ProxyFeedback:
+    """代理使用反馈的内存聚合器
+
+    process_response / process_exception 只调用 record() 在内存中累加成功/失败次数，
+    后台线程每 flush_interval 秒把累计结果批量写入MySQL。重新评分的网络探测也在后台线程中进行
+    （命中探测结果缓存时不会真正发起探测），Scrapy的reactor线程不再等待探测和数据库往返。
+    每次写回最多并发重新评分 max_rescore 个代理，其余代理只累加使用次数、保留原分数，
+    爬虫关闭时最后一次写回的耗时也有上限。
+    """
+
+    def __init__(self, connect, scorer, flush_interval=5.0, chunk_size=500, workers=10, max_rescore=100):
+        """
+        Args:
+            connect (callable): 返回pymysql连接的函数
+            scorer (IPScorer): 为请求成功的代理重新评分
+            flush_interval (float): 写回间隔（秒）
+            chunk_size (int): 每条UPDATE语句处理的代理数量
+            workers (int): 并发重新评分的线程数
+            max_rescore (int): 每次写回最多重新评分的代理数量
+        """
+        self.connect = connect
+        self.scorer = scorer
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_rescore = max_rescore
+        self.pending = {}  # {proxy: [成功次数, 失败次数, 最后一次是否成功]}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def record(self, proxy, success):
+        """记录一次代理使用结果，只修改内存，可以在reactor线程中调用"""
+        with self.lock:
+            entry = self.pending.setdefault(proxy, [0, 0, success])
+            entry[0 if success else 1] += 1
+            entry[2] = success
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='proxy-feedback', daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def stop(self, timeout=60):
+        """停止后台线程，退出前写回剩余的反馈
+
+        会等待最后一次写回，不要在reactor线程中直接调用，见 ProxyMiddleware.spider_closed
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def score(self, proxy):
+        """重新评分，出错时返回None保留原分数"""
+        try:
+            return self.scorer.test_single_ip(proxy)
+        except Exception as e:
+            logger.warning(f"代理重新评分出错: {proxy}, {e}")
+            return None
+
+    def flush(self):
+        """把累计的反馈批量写入数据库，返回写回的代理数量"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+
+        # 最后一次请求成功的代理重新评分，失败的代理分数置0，和逐条更新时的规则一致；
+        # 超出 max_rescore 的代理本次不重新评分（None保留原分数）
+        rescore = [proxy for proxy, entry in pending.items() if entry[2]][:self.max_rescore]
+        scores = {}
+        if rescore:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(rescore))) as executor:
+                scores = dict(zip(rescore, executor.map(self.score, rescore)))
+        rows = []
+        for proxy, (successes, failures, last_success) in pending.items():
+            rows.append((proxy, scores.get(proxy) if last_success else 0, successes + failures))
+
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cursor:
+                for i in range(0, len(rows), self.chunk_size):
+                    cursor.execute(*self.build_update_sql(rows[i:i + self.chunk_size]))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"批量写回代理反馈出错: {e}")
+        finally:
+            if conn:
+                conn.close()
+        return len(rows)
+
+    @staticmethod
+    def build_update_sql(rows):
+        """构造多行 UPDATE: score 和 use_count 用 CASE server WHEN ... 逐行赋值
+
+        Args:
+            rows (list): [(proxy, score或None, 使用次数)]，score为None时保留原分数
+        """
+        scored = [(proxy, score) for proxy, score, _ in rows if score is not None]
+        params = []
+        for proxy, score in scored:
+            params.extend((proxy, score))
+        score_sql = (f"CASE server {' '.join(['WHEN %s THEN %s'] * len(scored))} ELSE score END"
+                     if scored else 'score')
+        for proxy, _, count in rows:
+            params.extend((proxy, count))
+        params.extend(proxy for proxy, _, _ in rows)
+        sql = (
+            f"UPDATE index_ipdata SET "
+            f"score = {score_sql}, "
+            f"use_count = use_count + CASE server {' '.join(['WHEN %s THEN %s'] * len(rows))} ELSE 0 END, "
+            f"updated_at = NOW() "
+            f"WHERE server IN ({', '.join(['%s'] * len(rows))})"
+        )
+        return sql, params
+
+
+class ProxyRefresher:
+    """代理池的后台预取线程
+
+    后台线程每 interval 秒调用 fetch() 从MySQL读取下一份代理列表，并发预检排名前 validate_top 的代理，
+    剔除连接不上的代理后调用 build() 构建好代理池，reactor线程通过 take() 取走整份快照直接替换，
+    选择代理时只访问内存，不再等待MySQL和预检。
+
+    预检优先采用探测结果缓存中的结论（有成功探测即通过，全部失败即剔除），没有缓存时做一次TCP连接检查。
+    """
+
+    def __init__(self, fetch, build, interval=300, validate_top=50, validate_timeout=3, workers=20,
+                 probe_cache=None):
+        """
+        Args:
+            fetch (callable): 返回 [(server, supports_connect, score)] 的函数，按排名排序
+            build (callable): 把 fetch() 的结果构建为代理池快照的函数
+            interval (float): 刷新间隔（秒）
+            validate_top (int): 预检排名前多少个代理，0表示不预检
+            validate_timeout (float): TCP连接检查的超时（秒）
+            workers (int): 预检并发数
+            probe_cache (ProbeCache, optional): 探测结果缓存
+        """
+        self.fetch = fetch
+        self.build = build
+        self.interval = interval
+        self.validate_top = validate_top
+        self.validate_timeout = validate_timeout
+        self.workers = workers
+        self.probe_cache = probe_cache
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='proxy-refresher', daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if not self.stopped.is_set():
+                self.refresh()
+
+    def stop(self, timeout=10):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def request(self):
+        """请求后台线程立即刷新（代理池耗尽时由reactor线程调用，不阻塞）"""
+        self.wakeup.set()
+
+    def take(self):
+        """取走已准备好的快照，没有新快照时返回None"""
+        with self.lock:
+            snapshot, self.snapshot = self.snapshot, None
+        return snapshot
+
+    def refresh(self):
+        """读取并预检代理列表，构建快照，返回快照中的代理数量"""
+        try:
+            rows = self.fetch()
+            if not rows:
+                return 0
+            rows = self.validate(rows)
+            snapshot = self.build(rows)
+        except Exception as e:
+            print(f"后台刷新代理池出错: {e}")
+            return 0
+        with self.lock:
+            self.snapshot = snapshot
+        return len(rows)
+
+    def validate(self, rows):
+        """并发预检排名靠前的代理，剔除不可用的代理，其余代理原样保留"""
+        head, tail = list(rows[:self.validate_top]), list(rows[self.validate_top:])
+        if not head:
+            return tail
+        verdicts = self.cached_verdicts([row[0] for row in head])
+        unknown = [row[0] for row in head if row[0] not in verdicts]
+        if unknown:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(unknown))) as executor:
+                verdicts.update(zip(unknown, executor.map(self.reachable, unknown)))
+        passed = [row for row in head if verdicts.get(row[0])]
+        print(f"【代理中间件】预检 {len(head)} 个代理，通过 {len(passed)} 个")
+        return passed + tail
+
+    def cached_verdicts(self, servers):
+        """探测结果缓存中的结论 {server: 是否有成功的探测}"""
+        if self.probe_cache is None:
+            return {}
+        verdicts = {}
+        for server, by_protocol in self.probe_cache.get_many(servers).items():
+            probes = [probe for items in by_protocol.values() for probe in items]
+            if probes:
+                verdicts[server] = any(probe.get('success') for probe in probes)
+        return verdicts
+
+    def reachable(self, server):
+        """TCP连接检查"""
+        address = parse_proxy(server)
+        if address is None:
+            return False
+        try:
+            with socket.create_connection(address, timeout=self.validate_timeout):
+                return True
+        except OSError:
+            return False
+
+
 class ProxyMiddleware:
+    # 代理选择查询，按顺序尝试。hot_pool 由评分器在每次评分后按排名物化（pool_rank 唯一索引），
+    # 直接按排名做范围读取；index_ipdata 查询依赖 (country, score) 和 (score, updated_at) 索引
+    PROXY_QUERIES = (
+        # 只选择评分不低于80、1小时内更新过的亚洲代理
+        """
+            SELECT server, supports_connect, score
+            FROM hot_pool
+            WHERE score >= 80
+            AND updated_at >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
+            AND country IN ('China', 'Japan', 'Korea')
+            ORDER BY pool_rank
+            LIMIT 50
+        """,
+        # 备用：评分不低于50、2小时内更新过的代理
+        """
+            SELECT server, supports_connect, score
+            FROM hot_pool
+            WHERE score >= 50
+            AND updated_at >= DATE_SUB(NOW(), INTERVAL 2 HOUR)
+            ORDER BY pool_rank
+            LIMIT 20
+        """,
+        # hot_pool 尚未生成时直接查询 index_ipdata，条件同上
+        """
+            SELECT server, supports_connect, score
+            FROM index_ipdata
+            WHERE score >= 80
+            AND updated_at >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
+            AND country IN ('China', 'Japan', 'Korea')
+            ORDER BY score DESC, ping ASC, speed ASC
+            LIMIT 50
+        """,
+        """
+            SELECT server, supports_connect, score
+            FROM index_ipdata
+            WHERE score >= 50
+            AND updated_at >= DATE_SUB(NOW(), INTERVAL 2 HOUR)
+            ORDER BY score DESC
+            LIMIT 20
+        """,
+    )
+
     def __init__(self, db_host, db_user, db_password, db_name):
         """初始化数据库连接参数"""
         self.db_host = db_host
         self.db_user = db_user
         self.db_password = db_password
         self.db_name = db_name
-        self.proxy_list = []
+        # 按权重随机选择的代理池，初始权重为数据库中的分数，请求成功后按响应耗时调整，失败后移除
+        self.proxy_pool = WeightedPool()
+        self.https_proxy_pool = WeightedPool()  # 可用于HTTPS请求的代理：已验证支持CONNECT，没有时回退到能力未知的代理
+        self.download_timeout = 30  # 计算权重时的响应耗时上限（秒），取自 DOWNLOAD_TIMEOUT
+        # 按目标域名记录每个代理的成败，从全局代理池抽取的候选中用Thompson采样做最终选择
+        self.bandit = DomainBandit()
+        self.bandit_candidates = 8  # 每次选择时从代理池抽取的候选数量
         self.current_proxy = None
-        self.blacklist = set()  # 用于记录失败的代理
-        self.update_interval = 300  # 5分钟更新一次代理列表
-        self.last_update_time = 0
+        # 连接异常的代理按熔断器暂时移出代理池，熔断到期后放回并只放行一个试探请求
+        self.breaker = ProxyBreaker()
+        self.parked = {}  # 熔断中的代理 {proxy: (代理池权重, HTTPS代理池权重)}，恢复时沿用
+        # 每个代理同时在途的请求数，达到所在分数档位的上限后不再被选中；
+        # 档位取自 IP_POOL_CONFIG['PROXY_INFLIGHT_TIERS']，与共享代理池共用
+        self.inflight = InflightTracker()
         # 创建IPScorer实例
         self.scorer = IPScorer()
+        # 后台线程每5分钟预取并预检下一份代理池，reactor线程只做内存中的整体替换
+        self.refresher = ProxyRefresher(self.fetch_proxy_rows, self.build_pools, probe_cache=self.scorer.probe_cache)
+        # 请求结果先在内存中聚合，由后台线程批量重新评分并写回数据库
+        self.feedback = ProxyFeedback(self.get_connection, self.scorer)
+        # 所有爬虫进程共享的Redis代理池（IP_POOL_CONFIG['REDIS_POOL_ENABLED']），未启用时为None，使用本地代理池
+        self.shared_pool = load_redis_pool()
         self.debug = True  # 始终启用调试模式
         self.proxy_usage_stats = {}  # 跟踪代理使用情况
         self.proxy_success_stats = {}  # 跟踪代理成功情况
@@ -148,6 +471,27 @@ class ProxyMiddleware:
             db_name=crawler.settings.get('MYSQL_DATABASE')
         )
         
+        middleware.download_timeout = crawler.settings.getfloat('DOWNLOAD_TIMEOUT', 30)
+        if middleware.shared_pool is not None:
+            middleware.shared_pool.timeout = middleware.download_timeout
+        middleware.feedback.flush_interval = crawler.settings.getfloat('PROXY_FEEDBACK_INTERVAL', 5)
+        middleware.feedback.max_rescore = crawler.settings.getint('PROXY_FEEDBACK_MAX_RESCORE', 100)
+        middleware.bandit = DomainBandit(
+            half_life=crawler.settings.getfloat('PROXY_BANDIT_HALF_LIFE', 600),
+            max_proxies=crawler.settings.getint('PROXY_BANDIT_MAX_PROXIES', 5000),
+        )
+        middleware.bandit_candidates = crawler.settings.getint('PROXY_BANDIT_CANDIDATES', 8)
+        middleware.refresher.interval = crawler.settings.getfloat('PROXY_REFRESH_INTERVAL', 300)
+        middleware.refresher.validate_top = crawler.settings.getint('PROXY_VALIDATE_TOP', 50)
+        middleware.refresher.validate_timeout = crawler.settings.getfloat('PROXY_VALIDATE_TIMEOUT', 3)
+        middleware.breaker = ProxyBreaker(
+            failure_threshold=crawler.settings.getint('PROXY_BREAKER_THRESHOLD', 2),
+            base_delay=crawler.settings.getfloat('PROXY_BREAKER_BASE_DELAY', 30),
+            max_delay=crawler.settings.getfloat('PROXY_BREAKER_MAX_DELAY', 1800),
+            reset_after=crawler.settings.getfloat('PROXY_BREAKER_RESET', 3600),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
         # 设置调试标志，但不影响始终启用的调试输出
         debug_enabled = crawler.settings.getbool('PROXY_DEBUG', True)
         print(f"【代理中间件】PROXY_DEBUG设置为: {debug_enabled}")
@@ -163,120 +507,231 @@ class ProxyMiddleware:
             charset='utf8mb4'
         )
         
-    def update_proxy_list(self):
-        """从数据库更新代理IP列表"""
-        current_time = time.time()
-        # 检查是否需要更新代理列表
-        if current_time - self.last_update_time < self.update_interval and self.proxy_list:
-            return
-
+    def fetch_proxy_rows(self):
+        """从数据库读取代理列表 [(server, supports_connect, score)]，在后台预取线程中调用"""
+        conn = None
         try:
             conn = self.get_connection()
             with conn.cursor() as cursor:
-                sql = """
-                    SELECT server 
-                    FROM index_ipdata 
-                    WHERE score >= 80  -- 只选择评分大于等于80的代理
-                    AND server NOT IN (
-                        SELECT server 
-                        FROM index_ipdata 
-                        WHERE updated_at < DATE_SUB(NOW(), INTERVAL 1 HOUR)
-                    )  -- 排除1小时内未更新的代理
-                    AND country IN ('China', 'Japan', 'Korea')  -- 优先选择亚洲代理
-                    ORDER BY 
-                        score DESC,  -- 按分数降序
-                        ping ASC,    -- 按延迟升序
-                        speed ASC    -- 按速度升序
-                    LIMIT 50        -- 限制代理数量
-                """
-                cursor.execute(sql)
-                results = cursor.fetchall()
-                
-                # 更新代理列表，排除黑名单中的代理
-                self.proxy_list = [
-                    row[0] for row in results 
-                    if row[0] not in self.blacklist
-                ]
-                
-                self.last_update_time = current_time
-                
-                # 如果代理列表为空，使用备用查询
-                if not self.proxy_list:
-                    backup_sql = """
-                        SELECT server 
-                        FROM index_ipdata 
-                        WHERE score >= 50 
-                        AND server NOT IN (
-                            SELECT server FROM index_ipdata 
-                            WHERE updated_at < DATE_SUB(NOW(), INTERVAL 2 HOUR)
-                        )
-                        ORDER BY score DESC 
-                        LIMIT 20
-                    """
-                    cursor.execute(backup_sql)
-                    backup_results = cursor.fetchall()
-                    self.proxy_list = [
-                        row[0] for row in backup_results 
-                        if row[0] not in self.blacklist
-                    ]
-                
-        except Exception as e:
-            print(f"更新代理列表出错: {e}")
+                results = []
+                # 依次尝试各个查询，直到取得代理；hot_pool 为空或尚未创建时回退到 index_ipdata
+                for sql in self.PROXY_QUERIES:
+                    try:
+                        cursor.execute(sql)
+                    except pymysql.err.ProgrammingError as e:
+                        print(f"代理查询出错，尝试下一个查询: {e}")
+                        continue
+                    results = cursor.fetchall()
+                    # 全部处于熔断中时尝试下一个查询
+                    if any(not self.breaker.is_open(row[0]) for row in results):
+                        break
+                return list(results)
         finally:
             if conn:
                 conn.close()
 
-    def update_proxy_score(self, proxy, success=True):
-        """更新代理评分"""
-        try:
-            if success:
-                # 使用IPScorer进行评分
-                score = self.scorer.test_single_ip(proxy)
-            else:
-                score = 0
+    @staticmethod
+    def build_pools(rows):
+        """根据 (server, supports_connect, score) 行构建 (代理池, HTTPS代理池, {server: score})，
+        HTTPS请求优先使用已验证支持CONNECT的代理，分数用于确定在途请求上限的档位"""
+        return (
+            WeightedPool((server, max(score or 0, 1)) for server, _, score in rows),
+            WeightedPool(
+                [(server, max(score or 0, 1)) for server, supports_connect, score in rows if supports_connect]
+                or [(server, max(score or 0, 1)) for server, supports_connect, score in rows if supports_connect is None]
+            ),
+            {server: score for server, _, score in rows},
+        )
 
-            conn = self.get_connection()
-            with conn.cursor() as cursor:
-                sql = """
-                UPDATE index_ipdata 
-                SET score = %s,
-                            updated_at = NOW()
-                        WHERE server = %s
-                    """
-                cursor.execute(sql, (score, proxy))
-                conn.commit()
-        except Exception as e:
-            print(f"更新代理分数出错: {e}")
-        finally:
-            if conn:
-                conn.close()
+    def set_proxy_list(self, rows):
+        """根据 (server, supports_connect, score) 行重建代理池"""
+        self.install_pools(self.build_pools(rows))
+
+    def install_pools(self, pools):
+        """整体替换为新的代理池，熔断中的代理先放入 parked，熔断到期后再进入代理池；
+        不在新代理池中的代理不会再被选中，清理它们按域名的成败记录"""
+        retired = set(self.proxy_pool) | set(self.https_proxy_pool) | set(self.parked)
+        self.proxy_pool, self.https_proxy_pool, scores = pools
+        for proxy in retired.difference(self.proxy_pool, self.https_proxy_pool):
+            self.bandit.forget(proxy)
+        self.inflight.set_scores(scores)
+        self.parked = {}
+        for proxy in self.breaker.open_proxies():
+            self.park_proxy(proxy)
 
-    def get_random_proxy(self):
-        """获取随机代理"""
-        if not self.proxy_list:
+    def reward_proxy(self, proxy, latency):
+        """请求成功：权重向按响应耗时得出的目标值靠拢，越快的代理被选中的概率越大"""
+        target = 100 * max(0.05, 1 - (latency or 0) / self.download_timeout)
+        for pool in (self.proxy_pool, self.https_proxy_pool):
+            weight = pool.weight(proxy)
+            if weight is not None:
+                pool.update(proxy, 0.7 * weight + 0.3 * target)
+
+    def drop_proxy(self, proxy):
+        """代理本身不可用（连接异常）：计入熔断器，熔断时暂时移出代理池"""
+        if self.breaker.failure(proxy):
+            self.park_proxy(proxy)
             if self.debug:
-                print("【代理中间件】正在更新代理列表...")
-            self.update_proxy_list()
-            if self.debug and self.proxy_list:
-                print(f"【代理中间件】成功获取 {len(self.proxy_list)} 个代理")
-            
-        if self.proxy_list:
-            proxy = random.choice(self.proxy_list)
+                print(f"【代理中间件】代理熔断: {proxy}")
+
+    def park_proxy(self, proxy):
+        """把代理移出代理池并记下权重"""
+        weights = (self.proxy_pool.weight(proxy), self.https_proxy_pool.weight(proxy))
+        if weights == (None, None):
+            return
+        self.parked[proxy] = weights
+        self.proxy_pool.remove(proxy)
+        self.https_proxy_pool.remove(proxy)
+
+    def restore_proxies(self):
+        """熔断到期（half-open）的代理按原权重放回代理池，等待试探请求"""
+        for proxy in self.breaker.pop_due():
+            weights = self.parked.pop(proxy, None)
+            if weights is None:
+                continue
+            for pool, weight in zip((self.proxy_pool, self.https_proxy_pool), weights):
+                if weight is not None:
+                    pool.add(proxy, weight)
+
+    def spider_opened(self, spider):
+        # 第一份代理池在线程池中读取和预检，reactor不等待MySQL；返回的Deferred让Scrapy在代理池就绪后
+        # 才开始发送请求，之后由后台线程定期预取
+        return deferToThread(self.refresher.refresh).addCallback(self.pool_ready)
+
+    def pool_ready(self, count):
+        """第一份代理池读取完成：换上代理池，启动后台预取和反馈写回线程"""
+        if self.debug:
+            print(f"【代理中间件】成功获取 {count} 个代理")
+        self.install_snapshot()
+        self.refresher.start()
+        self.feedback.start()
+
+    def spider_closed(self, spider):
+        # 停止后台线程要等待进行中的预取和最后一次反馈写回，放到线程池中执行，不阻塞reactor；
+        # 返回的Deferred让Scrapy等待写回完成后再结束
+        return deferToThread(self.stop_workers)
+
+    def stop_workers(self):
+        self.refresher.stop()
+        self.feedback.stop()
+
+    def install_snapshot(self):
+        """换上后台线程准备好的代理池快照；代理池耗尽时请求后台线程立即刷新"""
+        pools = self.refresher.take()
+        if pools is not None:
+            self.install_pools(pools)
+        elif not self.proxy_pool:
+            self.refresher.request()
+
+    def get_random_proxy(self, scheme='http', domain=None, exclude=None):
+        """按权重随机获取代理，scheme 为 'https' 时只从支持CONNECT隧道的代理中选择
+
+        指定 domain 时先按权重抽取若干候选，再按该域名下的成败记录用Thompson采样选出一个。
+        exclude 为不参与选择的代理（对冲请求排除正在使用的代理）。
+        """
+        self.install_snapshot()
+        self.restore_proxies()
+
+        pool = self.https_proxy_pool if scheme == 'https' else self.proxy_pool
+        if domain and self.bandit_candidates > 1:
+            proxy = self.bandit.choose(domain, self.sample_candidates(pool, self.bandit_candidates, exclude))
+        else:
+            proxy = next(iter(self.sample_candidates(pool, 1, exclude)), None)
+        if proxy:
+            self.breaker.acquire(proxy)
             # 更新代理使用统计
             self.proxy_usage_stats[proxy] = self.proxy_usage_stats.get(proxy, 0) + 1
             return proxy
         return None
         
+    def sample_candidates(self, pool, count, exclude=None):
+        """按权重抽取最多 count 个候选代理
+
+        熔断中的代理不在池中，这里排除试探请求尚未返回的 half-open 代理、在途请求已达上限的代理和 exclude。
+        """
+        count = min(count, len(pool))
+        candidates = set()
+        for _ in range(count * 2):
+            proxy = pool.sample()
+            if proxy and proxy != exclude and self.breaker.available(proxy) and not self.inflight.saturated(proxy):
+                candidates.add(proxy)
+                if len(candidates) >= count:
+                    break
+        if not candidates and pool:
+            # 随机抽取一直落空时逐个查找；所有代理都已达到在途上限时选择在途请求最少的代理，
+            # 而不是不使用代理直接发送请求
+            usable = [p for p in pool if p != exclude and self.breaker.available(p)]
+            if usable:
+                candidates.add(min(usable, key=lambda p: (self.inflight.saturated(p), self.inflight.count(p))))
+        return candidates
+
+    def assign_proxy(self, request):
+        """为请求选择代理并写入 request.meta['proxy']，返回选中的代理
+
+        免费代理都是明文HTTP代理，HTTPS请求也使用 http:// 代理地址，由Scrapy发送 CONNECT 建立隧道。
+        request.meta['hedge_exclude'] 中的代理不会被选中。
+        """
+        scheme = 'https' if request.url.startswith('https://') else 'http'
+        domain = urlparse(request.url).hostname
+        exclude = request.meta.get('hedge_exclude')
+        proxy = self.lease_proxy(scheme, domain, exclude=exclude)
+        if proxy:
+            request.meta['proxy_lease'] = proxy  # 响应或异常时归还
+        else:
+            proxy = self.get_random_proxy(scheme, domain, exclude)
+        if proxy:
+            request.meta['proxy'] = f"http://{proxy}"
+        return proxy
+
+    def lease_proxy(self, scheme, domain=None, attempts=3, exclude=None):
+        """从共享代理池租用代理，共享池未启用、为空或Redis出错时返回None，回退到本地代理池
+
+        指定 domain 时按该域名下的抽样成功率决定是否接受租到的代理，不接受的代理原样归还后重新租用，
+        最多尝试 attempts 次。在本进程中处于熔断的代理和 exclude 同样归还后重新租用。
+        """
+        if self.shared_pool is None:
+            return None
+        try:
+            for attempt in range(attempts):
+                proxy = self.shared_pool.lease(scheme)
+                if not proxy:
+                    break
+                if proxy != exclude and self.breaker.available(proxy) and (
+                        not domain or attempt == attempts - 1 or self.bandit.accept(domain, proxy)):
+                    break
+                self.shared_pool.release(proxy, None)
+                proxy = None
+        except redis.RedisError as e:
+            print(f"【代理中间件】共享代理池不可用，使用本地代理池: {e}")
+            return None
+        if proxy:
+            self.breaker.acquire(proxy)
+            self.proxy_usage_stats[proxy] = self.proxy_usage_stats.get(proxy, 0) + 1
+        return proxy
+
+    def release_proxy(self, request, success):
+        """归还本请求使用的代理：减少在途计数；租用自共享代理池的代理同时归还并报告结果，
+        其他爬虫进程立即看到权重变化
+
+        success 为None时只归还，不改变共享权重（只对某个网站失败的代理不应在全局降权）。
+        """
+        inflight = request.meta.pop('proxy_inflight', None)
+        if inflight:
+            self.inflight.release(inflight)
+        proxy = request.meta.pop('proxy_lease', None)
+        if self.shared_pool is None or not proxy:
+            return
+        try:
+            self.shared_pool.release(proxy, success, request.meta.get('download_latency'))
+        except redis.RedisError as e:
+            print(f"【代理中间件】归还共享代理失败: {proxy}, {e}")
+
     def process_request(self, request, spider):
         """处理请求，添加代理"""
-        proxy = self.get_random_proxy()
+        proxy = self.assign_proxy(request)
         if proxy:
-            # 根据请求的URL协议选择代理协议
-            if request.url.startswith('https://'):
-                request.meta['proxy'] = f"https://{proxy}"
-            else:
-                request.meta['proxy'] = f"http://{proxy}"
-                
+            self.inflight.acquire(proxy)
+            request.meta['proxy_inflight'] = proxy  # 响应或异常时在 release_proxy 中减少在途计数
             # 始终输出代理调试信息
             protocol = "HTTPS" if request.url.startswith('https://') else "HTTP"
             print(f"【代理中间件】为请求 {request.url[:50]}... 分配{protocol}代理: {proxy} (已使用{self.proxy_usage_stats.get(proxy, 0)}次)")
@@ -289,32 +744,30 @@ class ProxyMiddleware:
     def process_response(self, request, response, spider):
         """处理响应"""
         proxy = request.meta.get('proxy', '').replace('http://', '').replace('https://', '')
-        
+        domain = urlparse(request.url).hostname
+        if proxy:
+            # 收到响应（无论状态码）说明代理能连通，关闭熔断
+            self.breaker.success(proxy)
+
         if response.status != 200:
+            # 状态码异常通常是目标网站拒绝了这个代理（例如豆瓣的403），只在该域名下记为失败，
+            # 不拉黑、不清零分数，代理对其他网站仍然可用
+            self.release_proxy(request, success=None)
             if proxy:
-                self.update_proxy_score(proxy, success=False)
-                self.blacklist.add(proxy)
+                self.bandit.update(domain, proxy, False)
                 if self.debug:
-                    print(f"【代理中间件】代理失败: {proxy}, 状态码: {response.status}, URL: {request.url[:50]}...")
-                spider.logger.warning(f'代理失败: {proxy}')
+                    print(f"【代理中间件】代理访问 {domain} 失败: {proxy}, 状态码: {response.status}, "
+                          f"该域名成功率估计: {self.bandit.success_rate(domain, proxy):.2%}")
+                spider.logger.warning(f'代理失败: {proxy}, 域名: {domain}, 状态码: {response.status}')
             
-            # 重试请求
-            request.dont_filter = True
-            new_proxy = self.get_random_proxy()
-            if new_proxy:
-                # 根据请求的URL协议选择代理协议
-                if request.url.startswith('https://'):
-                    request.meta['proxy'] = f"https://{new_proxy}"
-                else:
-                    request.meta['proxy'] = f"http://{new_proxy}"
-                    
-                if self.debug:
-                    print(f"【代理中间件】使用新代理重试: {new_proxy}")
-            return request
+            return self.retry_request(request)
         else:
             # 请求成功，更新代理评分
+            self.release_proxy(request, success=True)
             if proxy:
-                self.update_proxy_score(proxy, success=True)
+                self.bandit.update(domain, proxy, True)
+                self.feedback.record(proxy, success=True)
+                self.reward_proxy(proxy, request.meta.get('download_latency'))
                 # 更新代理成功统计
                 self.proxy_success_stats[proxy] = self.proxy_success_stats.get(proxy, 0) + 1
                 if self.debug:
@@ -326,25 +779,31 @@ class ProxyMiddleware:
     def process_exception(self, request, exception, spider):
         """处理异常"""
         proxy = request.meta.get('proxy', '').replace('http://', '').replace('https://', '')
+        if isinstance(exception, CancelledError) or request.meta.get('hedge_cancelled'):
+            # 对冲请求中落败的一方，传输已被中止（见 handlers.py），不是代理的问题，只归还租约、不重试
+            self.release_proxy(request, success=None)
+            return None
+        # 连接异常说明代理本身可能不可用，计入熔断器
+        self.release_proxy(request, success=False)
         if proxy:
-            self.update_proxy_score(proxy, success=False)
-            self.blacklist.add(proxy)
+            self.feedback.record(proxy, success=False)
+            self.drop_proxy(proxy)
             if self.debug:
                 print(f"【代理中间件】代理异常: {proxy}, 异常: {type(exception).__name__}, URL: {request.url[:50]}...")
             spider.logger.warning(f'代理异常: {proxy}, 异常: {exception}')
         
-        # 重试请求
+        return self.retry_request(request)
+
+    def retry_request(self, request):
+        """返回要重试的请求，新代理由重新经过 process_request 时分配
+
+        这里不预先选择代理：请求重新进入下载中间件链时会再次分配，预先选中的代理会被丢弃，
+        白白占用使用统计和 half-open 代理唯一的试探名额。
+        """
+        request.meta.pop('proxy', None)
         request.dont_filter = True
-        new_proxy = self.get_random_proxy()
-        if new_proxy:
-            # 根据请求的URL协议选择代理协议
-            if request.url.startswith('https://'):
-                request.meta['proxy'] = f"https://{new_proxy}"
-            else:
-                request.meta['proxy'] = f"http://{new_proxy}"
-                
-            if self.debug:
-                print(f"【代理中间件】使用新代理重试: {new_proxy}")
+        if self.debug:
+            print(f"【代理中间件】使用新代理重试: {request.url[:50]}...")
         return request
         
     def _print_proxy_stats(self):
@@ -370,6 +829,177 @@ class ProxyMiddleware:
         print("=====================\n")
 
 
+class HedgedRequestMiddleware:
+    """对冲请求中间件（HEDGE_ENABLED 开启）
+
+    免费代理的响应耗时长尾严重，一个卡住的代理会让请求一直等到 DOWNLOAD_TIMEOUT。
+    请求等待超过该域名最近响应耗时的 p95（HEDGE_QUANTILE）后，用另一个代理再发送一次同样的请求，
+    先返回的响应胜出，另一个下载的连接被中止（需要配置 handlers.HedgeAwareDownloadHandler）。
+
+    两次尝试都通过 engine.download 走完整的下载中间件链（由 ProxyMiddleware 分配代理、统计成败）
+    和下载槽位，本中间件需要排在 ProxyMiddleware 之前。对冲次数由令牌桶限制：每个请求积累
+    HEDGE_BUDGET_RATIO 个令牌，最多积累 HEDGE_BUDGET_BURST 个，每次对冲消耗一个。
+    """
+
+    def __init__(self, crawler, quantile=0.95, window=200, min_samples=20, min_delay=1.0,
+                 budget_ratio=0.05, budget_burst=10):
+        """
+        Args:
+            crawler (Crawler): 用于发起下载和记录统计
+            quantile (float): 触发对冲的响应耗时分位数
+            window (int): 每个域名保留的最近响应耗时数量
+            min_samples (int): 域名的响应耗时样本少于该数量时不对冲
+            min_delay (float): 对冲前至少等待的时间（秒）
+            budget_ratio (float): 每个请求积累的对冲令牌
+            budget_burst (float): 最多积累的对冲令牌
+        """
+        self.crawler = crawler
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.tokens = budget_burst
+        self.latencies = {}  # {domain: deque(最近的响应耗时)}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('HEDGE_ENABLED'):
+            raise NotConfigured
+        handlers = crawler.settings.getwithbase('DOWNLOAD_HANDLERS')
+        for scheme in ('http', 'https'):
+            handler = handlers.get(scheme)
+            if handler is None or load_object(handler) is not HedgeAwareDownloadHandler:
+                logger.warning(f"{scheme} 未配置 HedgeAwareDownloadHandler，对冲请求中落败的一方无法中止，"
+                               f"会占用连接和代理直到 DOWNLOAD_TIMEOUT")
+        return cls(
+            crawler,
+            quantile=crawler.settings.getfloat('HEDGE_QUANTILE', 0.95),
+            window=crawler.settings.getint('HEDGE_WINDOW', 200),
+            min_samples=crawler.settings.getint('HEDGE_MIN_SAMPLES', 20),
+            min_delay=crawler.settings.getfloat('HEDGE_MIN_DELAY', 1.0),
+            budget_ratio=crawler.settings.getfloat('HEDGE_BUDGET_RATIO', 0.05),
+            budget_burst=crawler.settings.getfloat('HEDGE_BUDGET_BURST', 10),
+        )
+
+    def record_latency(self, domain, latency):
+        samples = self.latencies.get(domain)
+        if samples is None:
+            samples = self.latencies[domain] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def hedge_delay(self, domain):
+        """该域名触发对冲的等待时间，样本不足时返回None"""
+        samples = self.latencies.get(domain)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, latency_quantile(list(samples), self.quantile))
+
+    def take_token(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def process_request(self, request, spider):
+        if 'hedge_attempt' in request.meta or request.meta.get('use_selenium'):
+            return None
+        request.meta.pop('hedge_raced', None)
+        self.tokens = min(self.budget_burst, self.tokens + self.budget_ratio)
+        delay = self.hedge_delay(urlparse(request.url).hostname)
+        if delay is None or self.tokens < 1:
+            return None
+        # 由两次尝试各自分配和归还代理
+        request.meta['hedge_raced'] = True
+        request.meta.pop('proxy', None)
+        return await maybe_deferred_to_future(self.race(request, delay))
+
+    def attempt(self, request, label, **meta):
+        base = {key: value for key, value in request.meta.items() if key != 'hedge_raced'}
+        return request.replace(dont_filter=True, meta=dict(base, hedge_attempt=label, **meta))
+
+    def download(self, request):
+        """经下载中间件链下载请求，返回 Deferred
+
+        取消这个 Deferred 不会中止传输，落败的一方由 abort_download() 中止，见 handlers.py。
+
+        requirements 固定的 Scrapy 2.12 只有 engine.download()；2.14 起新增 download_async()，
+        download() 被标记为弃用，有新接口时优先使用。
+        """
+        engine = self.crawler.engine
+        if hasattr(engine, 'download_async'):
+            return deferred_from_coro(engine.download_async(request))
+        return engine.download(request)
+
+    def race(self, request, delay):
+        """先通过原代理下载，等待 delay 秒仍未完成时再用另一个代理下载，返回先成功的响应"""
+        from twisted.internet import reactor
+
+        result = Deferred()
+        pending = {}  # {label: Request}
+        failures = []
+        started = time.monotonic()
+
+        def settle(outcome, label):
+            pending.pop(label, None)
+            if result.called:
+                return None
+            if isinstance(outcome, Failure):
+                failures.append(outcome)
+                if pending:
+                    return None
+                if timer.active():
+                    timer.cancel()
+                result.errback(failures[0])
+                return None
+            if timer.active():
+                timer.cancel()
+            for loser in list(pending.values()):
+                # 中止落败一方的传输；它的连接关闭后才经过 ProxyMiddleware.process_exception 归还代理
+                if abort_download(loser):
+                    self.crawler.stats.inc_value('hedge/aborted')
+            if label == 'hedge':
+                # 原代理的耗时至少是已经等待的时间，计入样本避免分位数被对冲结果拉低
+                self.record_latency(urlparse(request.url).hostname, time.monotonic() - started)
+                self.crawler.stats.inc_value('hedge/won')
+            result.callback(outcome)
+            return None
+
+        def launch(label, attempt):
+            pending[label] = attempt
+            self.download(attempt).addBoth(settle, label)
+
+        def hedge():
+            if result.called:
+                return
+            if not self.take_token():
+                self.crawler.stats.inc_value('hedge/budget_exhausted')
+                return
+            primary = pending['primary']
+            exclude = (primary.meta.get('proxy') or '').replace('http://', '') or None
+            self.crawler.stats.inc_value('hedge/launched')
+            launch('hedge', self.attempt(request, 'hedge', hedge_exclude=exclude))
+
+        timer = reactor.callLater(delay, hedge)
+        launch('primary', self.attempt(request, 'primary'))
+        return result
+
+    def process_response(self, request, response, spider):
+        # 外层请求的响应来自其中一次尝试，耗时已在尝试中记录
+        if response.status == 200 and not request.meta.get('hedge_raced'):
+            latency = request.meta.get('download_latency')
+            if latency is not None:
+                self.record_latency(urlparse(request.url).hostname, latency)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get('hedge_cancelled'):
+            # 落败的一方不再经过后续中间件的重试逻辑
+            raise exception
+        return None
+
+
 class RandomUserAgentMiddleware:
     """高级请求头定制中间件
     
@@ -379,7 +1009,22 @@ class RandomUserAgentMiddleware:
     3. 模拟真实浏览器指纹
     4. 智能Cookie处理
     5. 防止浏览器指纹识别
+
+    请求头组合（UA、Sec-CH-UA、平台、Accept、Accept-Language）和Cookie在初始化时预先生成，
+    每个请求只做一次随机选择和一次请求头合并，见 header_profiles.py。
     """
+
+    # AJAX请求和图片等资源请求覆盖的请求头
+    AJAX_HEADERS = encode_profile({
+        'X-Requested-With': 'XMLHttpRequest',
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+    })
+    RESOURCE_HEADERS = encode_profile({
+        'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+        'Sec-Fetch-Dest': 'image',
+        'Sec-Fetch-Mode': 'no-cors',
+    })
+    COOKIE_POOL_SIZE = 200  # 预先生成的Cookie数量
     
     def __init__(self):
         # 更新更现代的User-Agent列表
@@ -417,13 +1062,6 @@ class RandomUserAgentMiddleware:
             'ja-JP,ja;q=0.9,en-US;q=0.8,en;q=0.7',
         ]
         
-        # Accept头部
-        self.accept = [
-            'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        ]
-        
         # 网站特定的请求头模板
         self.site_specific_templates = {
             'douban.com': {
@@ -449,15 +1087,6 @@ class RandomUserAgentMiddleware:
             # 可以添加更多网站特定的请求头
         }
         
-        # Chrome版本号列表
-        self.chrome_versions = ['110', '111', '112', '113', '114', '115', '116', '117', '118', '119', '120', '121', '122']
-        
-        # 浏览器平台列表
-        self.platforms = ['"Windows"', '"macOS"', '"Linux"', '"Android"', '"iOS"']
-        
-        # 移动设备指示
-        self.mobile_indicators = ['?0', '?1']
-        
         # 常用的Cookie值，用于模拟已有的会话状态
         self.cookie_templates = [
             '_ga=GA1.2.{random_id}.{timestamp}; _gid=GA1.2.{random_id2}.{timestamp}',
@@ -465,40 +1094,60 @@ class RandomUserAgentMiddleware:
             '_octo=GH1.1.{random_id}.{timestamp}; tz=Asia%2FShanghai',
         ]
         
-        # 参考屏幕分辨率
-        self.screen_resolutions = [
-            '1920x1080', '2560x1440', '1366x768', '1440x900', 
-            '1536x864', '2560x1600', '3840x2160', '1280x720'
-        ]
+        # 预先生成的请求头组合和Cookie
+        # (User-Agent, 编码后的请求头组合)
+        self.profiles = tuple(
+            (profile['User-Agent'], encode_profile(profile))
+            for profile in build_header_profiles(self.user_agents, self.accept_language)
+        )
+        self.site_profiles = tuple(
+            (site_domain, self._build_site_profile(template))
+            for site_domain, template in self.site_specific_templates.items()
+        )
+        self.site_profile_cache = {}  # {域名: (网站, 请求头组合)}
+        self.cookies = tuple(self._get_random_cookie() for _ in range(self.COOKIE_POOL_SIZE))
+        self.douban_cookies = tuple(generate_random_cookie() for _ in range(self.COOKIE_POOL_SIZE))
 
-        # 添加调试支持
-        self.debug = True  # 调试模式始终开启
+        # 调试支持，由 UA_DEBUG 开启，开启后每个请求输出一行调试信息
+        self.debug = False
         self.ua_usage_stats = {}  # 用户代理使用统计
         self.domain_stats = {}  # 域名访问统计
         
-        print("【UA中间件】初始化完成，调试模式已启用")
+        print(f"【UA中间件】初始化完成，预先生成 {len(self.profiles)} 个请求头组合")
 
     @classmethod
     def from_crawler(cls, crawler):
         middleware = cls()
-        # 设置调试标志但不影响输出
-        debug_enabled = crawler.settings.getbool('UA_DEBUG', True)
-        print(f"【UA中间件】UA_DEBUG设置为: {debug_enabled}")
+        middleware.debug = crawler.settings.getbool('UA_DEBUG', False)
+        print(f"【UA中间件】UA_DEBUG设置为: {middleware.debug}")
         return middleware
+
+    def _build_site_profile(self, template):
+        """由网站模板中的User-Agent推导完整的请求头组合，模板中的请求头优先，返回 (User-Agent, 编码后的组合)"""
+        lowered = {key.lower(): value for key, value in template.items()}
+        user_agent = lowered.get('user-agent', self.user_agents[0])
+        accept_language = lowered.get('accept-language', self.accept_language[0])
+        return user_agent, encode_profile(build_profile(user_agent, accept_language, template))
+
+    def _match_site(self, domain):
+        """返回 (网站, (User-Agent, 编码后的组合))，没有特定配置的域名返回 (None, None)"""
+        matched = self.site_profile_cache.get(domain)
+        if matched is None:
+            matched = next(
+                ((site_domain, profile) for site_domain, profile in self.site_profiles if site_domain in domain),
+                (None, None),
+            )
+            self.site_profile_cache[domain] = matched
+        return matched
     
-    def _get_site_domain(self, url):
-        """从URL提取网站域名"""
-        from urllib.parse import urlparse
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc
-        
-        # 提取主域名(例如从www.example.com得到example.com)
-        domain_parts = domain.split('.')
+    def _get_site_domain(self, netloc):
+        """从域名提取网站域名(例如从www.example.com得到example.com)"""
+        domain_parts = netloc.split('.')
         if len(domain_parts) > 2 and domain_parts[0] != 'www':
-            return domain
+            return netloc
         elif len(domain_parts) > 2 and domain_parts[0] == 'www':
             return '.'.join(domain_parts[1:])
-        return domain
+        return netloc
     
     def _get_random_cookie(self):
         """生成随机Cookie值"""
@@ -521,26 +1170,8 @@ class RandomUserAgentMiddleware:
             random_num=random_num
         )
     
-    def _get_browser_fingerprint_headers(self):
-        """生成模拟浏览器指纹的请求头"""
-        import random
-        
-        chrome_version = random.choice(self.chrome_versions)
-        platform = random.choice(self.platforms)
-        mobile = random.choice(self.mobile_indicators)
-        
-        return {
-            'sec-ch-ua': f'"Google Chrome";v="{chrome_version}", "Chromium";v="{chrome_version}", "Not A(Brand";v="99"',
-            'sec-ch-ua-platform': platform,
-            'sec-ch-ua-mobile': mobile,
-        }
-    
-    def _get_referrer(self, url):
-        """智能生成合理的Referer值"""
-        from urllib.parse import urlparse
-        import random
-        
-        parsed_url = urlparse(url)
+    def _get_referrer(self, url, parsed_url):
+        """智能生成合理的Referer值，parsed_url 为 url 的解析结果"""
         domain = parsed_url.netloc
         scheme = parsed_url.scheme
         
@@ -570,141 +1201,56 @@ class RandomUserAgentMiddleware:
 
     def process_request(self, request, spider):
         """处理请求，添加定制请求头"""
-        # 从URL中提取域名
-        domain = self._get_site_domain(request.url)
+        parsed_url = urlparse_cached(request)
+        domain = self._get_site_domain(parsed_url.netloc)
         
         # 记录域名访问统计
         self.domain_stats[domain] = self.domain_stats.get(domain, 0) + 1
         
-        # 选择一个随机的User-Agent
-        user_agent = random.choice(self.user_agents)
+        # 有特定网站配置时使用网站的请求头组合，否则随机选择一个
+        site_domain, profile = self._match_site(domain)
+        if profile is None:
+            profile = random.choice(self.profiles)
+        user_agent, encoded = profile
+        merge_headers(request.headers, encoded)
         self.ua_usage_stats[user_agent] = self.ua_usage_stats.get(user_agent, 0) + 1
-        
-        # 首先添加默认通用请求头
-        # 随机选择 User-Agent
-        request.headers['User-Agent'] = user_agent
-        # 随机选择 Accept-Language
-        accept_language = random.choice(self.accept_language)
-        request.headers['Accept-Language'] = accept_language
-        # 随机选择 Accept
-        accept = random.choice(self.accept)
-        request.headers['Accept'] = accept
-        
-        # 添加其他常用请求头
-        request.headers.update({
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-        })
-        
-        # 检查是否存在特定网站的请求头配置
-        site_specific_used = False
-        for site_domain, headers_template in self.site_specific_templates.items():
-            if site_domain in domain:
-                # 克隆模板以避免修改原始模板
-                headers = headers_template.copy()
-                
-                # 如果是豆瓣，添加动态参数
-                if site_domain == 'douban.com':
-                    # 从URL中提取路径
-                    from urllib.parse import urlparse
-                    parsed_url = urlparse(request.url)
-                    request_path = parsed_url.path
-                    
-                    # 添加与请求相关的动态参数
-                    headers.update({
-                        "authority": domain,
-                        "method": request.method,
-                        "path": request_path,
-                        "scheme": "https",
-                        "cookie": generate_random_cookie(),
-                        "cache-control": random.choice(["max-age=0", "no-cache"]),
-                        "priority": random.choice(["u=0, i", "u=1, i"]),
-                    })
-                
-                # 使用特定网站的请求头
-                request.headers.update(headers)
-                site_specific_used = True
-                print(f"【UA中间件】为域名 {domain} 使用特定请求头配置")
-                break
-        
-        # 添加指纹防护请求头
-        use_fingerprint = random.random() < 0.9  # 90%的概率添加浏览器指纹相关头
-        if use_fingerprint:
-            fingerprint_headers = self._get_browser_fingerprint_headers()
-            request.headers.update(fingerprint_headers)
+
+        # 如果是豆瓣，添加与请求相关的动态参数
+        if site_domain == 'douban.com':
+            request.headers.update({
+                "authority": domain,
+                "method": request.method,
+                "path": parsed_url.path,
+                "scheme": "https",
+                "cookie": random.choice(self.douban_cookies),
+                "cache-control": random.choice(("max-age=0", "no-cache")),
+                "priority": random.choice(("u=0, i", "u=1, i")),
+            })
         
         # 添加Referer
-        referer_added = False
         if 'Referer' not in request.headers:
-            referer = self._get_referrer(request.url)
+            referer = self._get_referrer(request.url, parsed_url)
             if referer:
                 request.headers['Referer'] = referer
-                referer_added = True
         
         # 随机添加一些Cookie
-        cookie_added = False
         if random.random() < 0.7 and 'Cookie' not in request.headers:  # 70%的概率添加Cookie
-            cookie = self._get_random_cookie()
-            request.headers['Cookie'] = cookie
-            cookie_added = True
+            request.headers['Cookie'] = random.choice(self.cookies)
         
         # 针对AJAX请求特殊处理
-        is_ajax = request.meta.get('is_ajax', False)
-        if is_ajax:
-            request.headers.update({
-                'X-Requested-With': 'XMLHttpRequest',
-                'Accept': 'application/json, text/javascript, */*; q=0.01',
-            })
+        if request.meta.get('is_ajax', False):
+            merge_headers(request.headers, self.AJAX_HEADERS)
         
         # 针对图片和资源请求特殊处理
-        is_resource = request.meta.get('is_resource', False)
-        if is_resource:
-            request.headers.update({
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                'Sec-Fetch-Dest': 'image',
-                'Sec-Fetch-Mode': 'no-cors',
-            })
-        
-        # 随机设置屏幕分辨率和色深
-        extra_headers_added = False
-        if random.random() < 0.5:  # 50%的概率添加
-            resolution = random.choice(self.screen_resolutions)
-            width, height = resolution.split('x')
-            color_depth = random.choice([24, 30, 32])
-            
-            headers_js = {
-                'Sec-CH-UA-Bitness': random.choice(['64', '32']),
-                'Sec-CH-UA-Arch': random.choice(['x86', 'arm']),
-                'Sec-CH-UA-Full-Version': f'"{random.choice(self.chrome_versions)}.0.{random.randint(1000, 9999)}.{random.randint(10, 99)}"',
-                'Sec-CH-UA-Platform-Version': f'"{random.randint(10, 14)}.{random.randint(0, 9)}.{random.randint(10000, 99999)}"',
-                'Sec-CH-UA-Model': '""',
-                'Sec-CH-UA-WoW64': random.choice(['?0', '?1']),
-            }
-            request.headers.update(headers_js)
-            extra_headers_added = True
-
-        # 输出调试信息
-        print(f"\n【UA中间件】请求 URL: {request.url[:50]}...")
-        print(f"【UA中间件】域名: {domain} (访问次数: {self.domain_stats.get(domain, 0)})")
-        print(f"【UA中间件】User-Agent: {user_agent[:50]}...")
-        print(f"【UA中间件】特定站点配置: {'是' if site_specific_used else '否'}")
-        print(f"【UA中间件】添加指纹保护: {'是' if use_fingerprint else '否'}")
-        print(f"【UA中间件】添加Referer: {'是' if referer_added else '否'}")
-        print(f"【UA中间件】添加Cookie: {'是' if cookie_added else '否'}")
-        print(f"【UA中间件】AJAX请求: {'是' if is_ajax else '否'}")
-        print(f"【UA中间件】资源请求: {'是' if is_resource else '否'}")
-        print(f"【UA中间件】添加额外headers: {'是' if extra_headers_added else '否'}")
-        
-        # 每50个请求输出一次统计信息
-        request_count = sum(self.domain_stats.values())
-        if request_count % 50 == 0:
-            self._print_stats()
+        if request.meta.get('is_resource', False):
+            merge_headers(request.headers, self.RESOURCE_HEADERS)
+
+        if self.debug:
+            print(f"【UA中间件】{request.url[:50]}... 域名: {domain}, 特定站点配置: {'是' if site_domain else '否'}, "
+                  f"User-Agent: {user_agent[:50]}...")
+            # 每50个请求输出一次统计信息
+            if sum(self.domain_stats.values()) % 50 == 0:
+                self._print_stats()
 
         return None
         
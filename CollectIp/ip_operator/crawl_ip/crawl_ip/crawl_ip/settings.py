@@ -50,6 +50,7 @@ DEFAULT_REQUEST_HEADERS = {
 DOWNLOADER_MIDDLEWARES = {
     'crawl_ip.middlewares.RandomUserAgentMiddleware': 543,
     'crawl_ip.middlewares.DoubanDownloaderMiddleware': 600,
+    'crawl_ip.middlewares.HedgedRequestMiddleware': 700,  # 需要排在ProxyMiddleware之前，HEDGE_ENABLED 开启
     'crawl_ip.middlewares.ProxyMiddleware': 750,
 }
 
@@ -106,9 +107,35 @@ LOG_STDOUT = True
 # 启用代理中间件
 PROXY_ENABLED = True
 PROXY_DEBUG = True  # 启用代理中间件调试信息
+PROXY_FEEDBACK_INTERVAL = 5  # 代理使用反馈批量写回数据库的间隔（秒）
+PROXY_FEEDBACK_MAX_RESCORE = 100  # 每次写回最多并发重新评分的代理数量，其余代理保留原分数
+PROXY_BANDIT_CANDIDATES = 8  # 每次选择代理时从代理池抽取的候选数量，再按目标域名的成败记录做Thompson采样
+PROXY_BANDIT_HALF_LIFE = 600  # 按域名记录的代理成败次数的半衰期（秒）
+PROXY_BANDIT_MAX_PROXIES = 5000  # 每个域名最多保留成败记录的代理数量，超出时丢弃最久未更新的记录
+PROXY_BREAKER_THRESHOLD = 2  # 代理连续连接异常多少次后熔断
+PROXY_BREAKER_BASE_DELAY = 30  # 第一次熔断的时长（秒），之后每次熔断翻倍
+PROXY_BREAKER_MAX_DELAY = 1800  # 熔断时长上限（秒）
+PROXY_BREAKER_RESET = 3600  # 代理最后一次失败后多久清除熔断记录（秒）
+PROXY_REFRESH_INTERVAL = 300  # 后台预取代理池的间隔（秒）
+PROXY_VALIDATE_TOP = 50  # 代理池进入轮换前预检排名前多少个代理，0表示不预检
+PROXY_VALIDATE_TIMEOUT = 3  # 预检TCP连接的超时（秒）
+# 单个代理的在途请求数上限按分数分档，与共享代理池共用 IP_POOL_CONFIG['PROXY_INFLIGHT_TIERS']
+
+# 对冲请求：请求等待超过该域名响应耗时的 p95 后，用另一个代理再发送一次，先返回的响应胜出
+HEDGE_ENABLED = False
+HEDGE_QUANTILE = 0.95  # 触发对冲的响应耗时分位数
+HEDGE_MIN_SAMPLES = 20  # 域名的响应耗时样本少于该数量时不对冲
+HEDGE_MIN_DELAY = 1.0  # 对冲前至少等待的时间（秒）
+HEDGE_BUDGET_RATIO = 0.05  # 对冲请求最多占总请求数的比例
+HEDGE_BUDGET_BURST = 10  # 最多可以连续对冲的次数
+# 对冲请求中落败的一方需要由下载处理器中止传输，其他请求与默认的 HTTP/1.1 下载处理器相同
+DOWNLOAD_HANDLERS = {
+    'http': 'crawl_ip.handlers.HedgeAwareDownloadHandler',
+    'https': 'crawl_ip.handlers.HedgeAwareDownloadHandler',
+}
 
-# 启用请求头中间件调试信息
-UA_DEBUG = True
+# 请求头中间件调试信息，开启后每个请求输出一行
+UA_DEBUG = False
 
 # 增加超时设置，防止爬虫卡住
 DOWNLOAD_TIMEOUT = 30
@@ -0,0 +1,95 @@
+"""
+按目标域名区分的代理健康矩阵与Thompson采样选择
+
+同一个代理对不同网站的表现差别很大：被豆瓣返回403的代理访问其他网站可能完全正常。
+这里为每个 (域名, 代理) 维护 Beta(α, β) 后验:
+- α = 先验α + 按时间衰减的成功次数，β = 先验β + 按时间衰减的失败次数
+- 选择时对每个候选代理从后验中抽样，取抽样值最大的代理（Thompson采样），
+  表现好的代理被优先使用，表现差的代理仍有少量机会被重新尝试
+- 计数按半衰期衰减，被某个网站暂时封禁的代理过一段时间后会重新获得机会
+- 代理离开代理池时调用 forget() 清理记录；每个域名最多保留 max_proxies 个代理，超出时丢弃最久未更新的记录
+  （共享代理池租到的代理不经过本地代理池，只能靠这个上限回收）
+
+候选代理由全局代理池按权重抽取（见 weighted_pool.py），本模块只负责在候选中按域名做最终选择。
+"""
+import math
+import random
+import time
+
+
+class DomainBandit:
+    """(域名, 代理) 健康矩阵上的Thompson采样"""
+
+    def __init__(self, prior=(1.0, 1.0), half_life=600, rng=None, max_proxies=5000):
+        """
+        Args:
+            prior (tuple): Beta先验 (α, β)
+            half_life (float): 成功/失败计数的半衰期（秒）
+            rng (random.Random, optional): 随机数生成器
+            max_proxies (int): 每个域名最多保留记录的代理数量，0表示不限
+        """
+        self.prior = prior
+        self.max_proxies = max_proxies
+        self.decay = math.log(2) / half_life if half_life else 0.0
+        self.rng = rng or random.Random()
+        self.stats = {}  # {domain: {proxy: [成功权重, 失败权重, 更新时间]}}，按更新顺序排列
+
+    def _decayed(self, entry, now):
+        factor = math.exp(-self.decay * max(0.0, now - entry[2]))
+        return entry[0] * factor, entry[1] * factor
+
+    def update(self, domain, proxy, success, now=None):
+        """记录一次 proxy 访问 domain 的结果"""
+        now = time.monotonic() if now is None else now
+        proxies = self.stats.setdefault(domain, {})
+        # 先移除再插入，字典保持按更新时间排列，最久未更新的记录在最前面
+        entry = proxies.pop(proxy, None)
+        if entry is None:
+            successes, failures = 0.0, 0.0
+        else:
+            successes, failures = self._decayed(entry, now)
+        if success:
+            successes += 1
+        else:
+            failures += 1
+        proxies[proxy] = [successes, failures, now]
+        if self.max_proxies and len(proxies) > self.max_proxies:
+            del proxies[next(iter(proxies))]
+
+    def posterior(self, domain, proxy, now=None):
+        """返回 (α, β)"""
+        entry = self.stats.get(domain, {}).get(proxy)
+        if entry is None:
+            return self.prior
+        successes, failures = self._decayed(entry, time.monotonic() if now is None else now)
+        return self.prior[0] + successes, self.prior[1] + failures
+
+    def success_rate(self, domain, proxy):
+        """后验均值，即估计的成功率"""
+        alpha, beta = self.posterior(domain, proxy)
+        return alpha / (alpha + beta)
+
+    def draw(self, domain, proxy):
+        """从后验中抽样一个成功率"""
+        return self.rng.betavariate(*self.posterior(domain, proxy))
+
+    def choose(self, domain, candidates):
+        """在候选代理中选择抽样成功率最高的一个，没有候选时返回None"""
+        best, best_draw = None, -1.0
+        for proxy in candidates:
+            value = self.draw(domain, proxy)
+            if value > best_draw:
+                best, best_draw = proxy, value
+        return best
+
+    def accept(self, domain, proxy):
+        """以抽样成功率为概率接受单个代理，用于只能逐个取得候选的场景（共享代理池租用）"""
+        return self.rng.random() < self.draw(domain, proxy)
+
+    def forget(self, proxy):
+        """代理被全局移除时清理它在所有域名下的记录"""
+        for domain in list(self.stats):
+            proxies = self.stats[domain]
+            proxies.pop(proxy, None)
+            if not proxies:
+                del self.stats[domain]
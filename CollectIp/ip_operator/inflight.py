@@ -0,0 +1,87 @@
+"""
+按代理限制同时在途的请求数
+
+免费代理通常只能承受2~3个并发连接，再多就开始超时，随后被熔断。上限按代理分数分档配置:
+tiers = {最低分数: 上限}，例如 {80: 3, 50: 2, 0: 1} 表示80分及以上的代理最多3个在途请求，
+50~80分最多2个，其余最多1个；上限为0表示不限。
+
+分数低于所有档位的代理使用最低一档的上限，不会比任何档位宽松。
+
+档位只在 IP_POOL_CONFIG['PROXY_INFLIGHT_TIERS'] 定义一次: InflightTracker 记录单个爬虫进程内的在途请求数，
+跨进程的限制由共享代理池的租用脚本按同一份档位完成（见 redis_pool.py）。
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_TIERS = {80: 3, 50: 2, 0: 1}
+
+
+def load_tiers():
+    """读取 IP_POOL_CONFIG['PROXY_INFLIGHT_TIERS']，未配置或Django未配置时使用 DEFAULT_TIERS"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'IP_POOL_CONFIG', {}).get('PROXY_INFLIGHT_TIERS', DEFAULT_TIERS)
+    except ImproperlyConfigured:
+        return DEFAULT_TIERS
+
+
+def parse_tiers(tiers):
+    """把 {最低分数: 上限} 转换为按分数从高到低排列的 [(最低分数, 上限)]，配置中的键可以是字符串"""
+    return sorted(((float(floor), int(limit)) for floor, limit in (tiers or {}).items()), reverse=True)
+
+
+def lowest_limit(tiers):
+    """最低一档的上限，没有档位时返回0（不限）"""
+    return tiers[-1][1] if tiers else 0
+
+
+def tier_limit(tiers, score):
+    """分数所在档位的上限，低于所有档位时使用最低一档
+
+    Args:
+        tiers (list): parse_tiers() 的结果
+        score (float): 代理分数，None视为0
+    """
+    score = score or 0
+    for floor, limit in tiers:
+        if score >= floor:
+            return limit
+    return lowest_limit(tiers)
+
+
+class InflightTracker:
+    """单进程内每个代理的在途请求计数"""
+
+    def __init__(self, tiers=None):
+        """
+        Args:
+            tiers (dict, optional): {最低分数: 上限}，为None时读取 load_tiers()
+        """
+        self.tiers = parse_tiers(load_tiers() if tiers is None else tiers)
+        self.counts = {}
+        self.limits = {}
+
+    def set_scores(self, scores):
+        """按 {proxy: score} 重新计算每个代理的上限，不在其中的代理使用最低一档"""
+        self.limits = {proxy: tier_limit(self.tiers, score) for proxy, score in scores.items()}
+
+    def limit(self, proxy):
+        limit = self.limits.get(proxy)
+        return lowest_limit(self.tiers) if limit is None else limit
+
+    def count(self, proxy):
+        return self.counts.get(proxy, 0)
+
+    def saturated(self, proxy):
+        """在途请求数是否已达到上限"""
+        limit = self.limit(proxy)
+        return limit > 0 and self.counts.get(proxy, 0) >= limit
+
+    def acquire(self, proxy):
+        self.counts[proxy] = self.counts.get(proxy, 0) + 1
+
+    def release(self, proxy):
+        count = self.counts.get(proxy, 0) - 1
+        if count > 0:
+            self.counts[proxy] = count
+        else:
+            self.counts.pop(proxy, None)
@@ -1,8 +1,31 @@
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import time
 import logging
 from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .capability import detect_socks, protocol_capabilities, resolve_socks4_target
+from .probe_cache import PROTOCOLS, load_probe_cache
+from .probe_policy import BAD_STATUS, OK, ProbePlan, classify_exception
+from .probe_server import classify_anonymity
+from .score_kernel import parse_proxy
+
+
+def load_pool_config():
+    """读取 IP_POOL_CONFIG，Django未配置时返回空字典"""
+    try:
+        from django.conf import settings
+        return getattr(settings, 'IP_POOL_CONFIG', {})
+    except ImproperlyConfigured:
+        return {}
+
+
+def load_probe_target():
+    """读取 IP_POOL_CONFIG['PROBE_TARGET'] 探测目标配置"""
+    return load_pool_config().get('PROBE_TARGET') or {}
+
 
 class IPScorer:
     def __init__(self):
@@ -14,109 +37,322 @@ class IPScorer:
             'https://httpbin.org/ip',
             'https://www.httpbin.org/get',
         ]
-        self.timeout = 10  # 超时时间
+        config = load_pool_config()
+        self.timeout = config.get('PROBE_TIMEOUT', 10)  # 全局超时时间，也是自适应超时的上限
+        self.adaptive_timeout = config.get('ADAPTIVE_TIMEOUT', False)  # 是否按历史延迟为每个代理设置超时
+        self.proxy_timeouts = {}  # 每个代理的自适应超时: {server: 秒}
+        self.run_deadline = config.get('SCORE_DEADLINE')  # 整次评分的时间上限（秒），None表示不限
+        self.deadline = None  # 本次评分的截止时间（time.monotonic）
+        self.verify_ssl = True
+        self.use_judge = False  # 是否使用内置探测目标服务器
+        self.real_ip = None  # 本机公网IP，用于判断匿名等级
+        self.anonymity = {}  # 代理匿名等级: transparent / anonymous / elite
+        # 同一代理累计超时多少次后放弃其余URL，见 probe_policy.ProbePlan
+        self.max_timeouts = config.get('PROBE_MAX_TIMEOUTS', 1)
+        # 协议能力验证后在 CAPABILITY_TTL 秒内有效，有效期内只探测代理支持的协议
+        self.capability_ttl = config.get('CAPABILITY_TTL', 86400)
+        self.detect_socks = config.get('DETECT_SOCKS', False)  # 是否额外检测SOCKS4/5
+        self.socks4_target = None  # SOCKS4检测时请求连接的 (ipv4, port)，取自HTTP探测目标
+        # 跨进程共享的探测结果缓存，同一代理的同一协议在 PROBE_CACHE_TTL 秒内只探测一次
+        self.probe_cache = load_probe_cache(config.get('PROBE_CACHE_TTL', 0))
+        self.prefetched_probes = None  # prepare() 批量读取的缓存: {server: {protocol: [probe]}}
+
+        target = load_probe_target()
+        if target.get('HTTP_URL'):
+            self.use_probe_target(
+                target['HTTP_URL'],
+                target.get('HTTPS_URL'),
+                verify_ssl=target.get('VERIFY_SSL', False),
+            )
+
+    def use_probe_target(self, http_url, https_url=None, verify_ssl=False):
+        """改用内置探测目标服务器（见 probe_server.py），每种协议只需一次往返"""
+        self.http_test_urls = [http_url]
+        self.https_test_urls = [https_url] if https_url else []
+        self.verify_ssl = verify_ssl
+        self.use_judge = True
+
+    def detect_real_ip(self):
+        """不经代理直接访问探测目标，获取本机公网IP"""
+        if self.real_ip is None and self.use_judge:
+            try:
+                response = requests.get(self.http_test_urls[0], timeout=self.timeout)
+                self.real_ip = response.json().get('origin')
+            except Exception as e:
+                logging.warning(f"获取本机公网IP失败: {e}")
+                self.real_ip = ''
+        return self.real_ip
+
+    def record_anonymity(self, ip, payload):
+        """根据探测目标的返回内容记录代理匿名等级"""
+        try:
+            self.anonymity[ip] = classify_anonymity(payload, self.real_ip)
+        except (AttributeError, TypeError):
+            pass
+
+    def select_test_urls(self, ssl_support=None):
+        """根据代理的HTTPS支持情况选择要测试的URL
+
+        Args:
+            ssl_support: load_protocol_hints 给出的 True/False/None，
+                或爬取到的SSL文本（含 'not' 表示不支持）；None表示未知，测试所有URL
+        """
+        test_urls = self.http_test_urls.copy()
+        if isinstance(ssl_support, bool):
+            supports_https = ssl_support
+        else:
+            supports_https = ssl_support is None or 'not' not in str(ssl_support).lower()
+        if supports_https:
+            test_urls.extend(self.https_test_urls)
+        return test_urls
+
+    def load_protocol_hints(self, ip_list):
+        """从数据库批量读取代理是否需要探测HTTPS
+
+        CONNECT能力在有效期内已验证的代理直接使用验证结果，否则回退到爬取到的SSL文本。
+
+        Returns:
+            dict: {server: True/False/None}
+        """
+        # 动态获取IpData模型
+        IpData = apps.get_model('index', 'IpData')
+        now = timezone.now()
+        hints = {}
+        rows = IpData.objects.filter(server__in=ip_list).values_list(
+            'server', 'ssl', 'supports_connect', 'capability_checked_at')
+        for server, ssl_text, supports_connect, checked_at in rows:
+            if (supports_connect is not None and checked_at is not None
+                    and (now - checked_at).total_seconds() < self.capability_ttl):
+                hints[server] = supports_connect
+            else:
+                hints[server] = None if ssl_text is None or 'not' not in ssl_text.lower() else False
+        return hints
+
+    def load_adaptive_timeouts(self, ip_list):
+        """从评分历史计算每个代理的自适应超时"""
+        from .services.score_model import compute_adaptive_timeouts
+        return compute_adaptive_timeouts(ip_list, cap=self.timeout)
+
+    def remaining_time(self):
+        """距本次评分截止时间的剩余秒数，没有截止时间时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def start_deadline(self):
+        """开始计算本次评分的截止时间，已经开始计时的不重置
+
+        probe_servers 在TCP预筛选之前调用，预筛选的耗时也计入 SCORE_DEADLINE
+        """
+        if self.run_deadline and self.deadline is None:
+            self.deadline = time.monotonic() + self.run_deadline
+
+    def timeout_for(self, ip):
+        """单次请求的超时：自适应超时与全局超时取小，且不超过评分截止时间"""
+        timeout = min(self.timeout, self.proxy_timeouts.get(ip, self.timeout))
+        remaining = self.remaining_time()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        return max(timeout, 0.1)
+
+    def latency_score(self, elapsed_time):
+        """单次成功请求的得分：耗时越接近全局超时得分越低"""
+        return max(0, min(100, (self.timeout - elapsed_time) / self.timeout * 100))
+
+    def cached_probes(self, ip, test_urls):
+        """读取 test_urls 涉及的协议在缓存中的探测明细，返回 {protocol: [probe]}"""
+        if self.probe_cache is None:
+            return {}
+        protocols = {url.split(':', 1)[0] for url in test_urls}
+        if self.prefetched_probes is not None:
+            cached = self.prefetched_probes.get(ip, {})
+        else:
+            cached = self.probe_cache.get(ip, sorted(protocols))
+        return {protocol: probes for protocol, probes in cached.items() if protocol in protocols}
+
+    def start_plan(self, ip, test_urls, metrics, scores, latencies):
+        """创建探测计划：缓存中已有结果的协议直接计入，只探测其余URL
+
+        缓存的失败同样参与短路判断，例如缓存的HTTP探测连接被拒绝时不再探测HTTPS。
+        """
+        cached = self.cached_probes(ip, test_urls)
+        plan = ProbePlan(
+            [url for url in test_urls if url.split(':', 1)[0] not in cached],
+            max_timeouts=self.max_timeouts,
+        )
+        for protocol, probes in cached.items():
+            for probe in probes:
+                metrics['probes'].append(dict(probe, cached=True))
+                metrics['cached'] += 1
+                if probe.get('success') and probe.get('latency') is not None:
+                    scores.append(self.latency_score(probe['latency']))
+                    latencies.append(probe['latency'])
+                plan.record(f'{protocol}:', probe.get('outcome'))
+        return plan
+
+    def store_probes(self, ip, metrics):
+        """把本次实际发出的探测明细写入缓存"""
+        if self.probe_cache is None or not metrics:
+            return
+        probes = [probe for probe in metrics.get('probes', ()) if not probe.get('cached')]
+        self.probe_cache.set(ip, probes)
 
     def test_single_ip(self, ip, ssl_support=None):
         """测试单个IP的性能
         
         Args:
             ip (str): IP地址和端口，格式为 ip:port
-            ssl_support (str, optional): 数据库中的SSL支持状态，如果为None则会测试所有URL
+            ssl_support (optional): 代理的HTTPS支持情况，见 select_test_urls，为None时测试所有URL
+        """
+        return self.probe_single_ip(ip, ssl_support)[0]
+
+    def probe_single_ip(self, ip, ssl_support=None):
+        """测试单个IP，返回 (score, metrics)
+        
+        metrics 包含 latency（成功请求的平均耗时，秒）、attempts、successes、anonymity、
+        skipped（因失败短路省下的请求数）、cached（直接使用缓存结果的探测数），以及每次请求的明细
+        probes: [{'protocol', 'success', 'latency', 'outcome'}]，来自缓存的明细带 cached=True
         """
         scores = []
-        if ':' not in ip:
+        latencies = []
+        metrics = {'latency': None, 'attempts': 0, 'successes': 0, 'anonymity': None, 'skipped': 0, 'cached': 0,
+                   'probes': []}
+        if parse_proxy(ip) is None:
             logging.warning(f"IP格式不正确: {ip}")
-            return 0
+            return 0, metrics
             
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        # 根据SSL支持情况选择要测试的URL
-        test_urls = self.http_test_urls.copy()
-        if ssl_support is None or 'not' not in str(ssl_support).lower():
-            test_urls.extend(self.https_test_urls)
-            # 支持HTTPS
-            proxies = {
-                'http': f'http://{ip}',
-                'https': f'https://{ip}'
-            }
-        else:
-            # 不支持HTTPS，只使用HTTP代理
-            proxies = {
-                'http': f'http://{ip}',
-                'https': f'http://{ip}'  # 使用HTTP代理尝试处理HTTPS请求
-            }
-            
+        # 根据HTTPS支持情况选择要测试的URL
+        test_urls = self.select_test_urls(ssl_support)
+        # 免费代理都是明文HTTP代理，HTTPS请求通过 CONNECT 隧道转发，而不是和代理本身建立TLS连接
+        proxies = {
+            'http': f'http://{ip}',
+            'https': f'http://{ip}'
+        }
+
         logging.info(f"测试IP: {ip}, SSL支持: {ssl_support}, 测试URL数量: {len(test_urls)}")
 
-        success_count = 0
-        for url in test_urls:
+        plan = self.start_plan(ip, test_urls, metrics, scores, latencies)
+        for url in plan:
+            metrics['attempts'] += 1
+            probe = {'protocol': url.split(':', 1)[0], 'success': False, 'latency': None, 'outcome': BAD_STATUS}
+            metrics['probes'].append(probe)
             try:
                 start_time = time.time()
-                response = requests.get(url, proxies=proxies, timeout=self.timeout, headers=headers)
+                response = requests.get(url, proxies=proxies, timeout=self.timeout_for(ip), headers=headers,
+                                        verify=self.verify_ssl)
                 elapsed_time = time.time() - start_time
                 
                 if response.status_code in [200, 301, 302]:
-                    score = max(0, min(100, (self.timeout - elapsed_time) / self.timeout * 100))
+                    if self.use_judge:
+                        self.record_anonymity(ip, response.json())
+                    score = self.latency_score(elapsed_time)
                     scores.append(score)
-                    success_count += 1
+                    latencies.append(elapsed_time)
+                    probe.update(success=True, latency=elapsed_time, outcome=OK)
                     logging.info(f"IP: {ip} 访问 {url} 成功，得分: {score:.2f}，耗时: {elapsed_time:.2f}秒")
             except Exception as e:
-                logging.warning(f"IP: {ip} 访问 {url} 异常: {str(e)}")
-                continue
+                probe['outcome'] = classify_exception(e, url)
+                logging.warning(f"IP: {ip} 访问 {url} 异常({probe['outcome']}): {str(e)}")
+            finally:
+                plan.record(url, probe['outcome'])
 
-        # 只要有超过一半的URL测试成功就计算平均分
-        min_success = 1  # 至少成功1个URL
-        if success_count >= min_success:
-            return sum(scores) / len(scores)
-        return 0
+        metrics['skipped'] = plan.skipped
+        self.store_probes(ip, metrics)
+        if self.detect_socks:
+            metrics['socks'] = detect_socks(ip, self.socks4_target, timeout=min(3, self.timeout_for(ip)))
+        return self.summarize(ip, scores, latencies, metrics)
 
-    def score_ip_pool(self, ip_list):
-        """为IP池中的所有IP打分"""
+    def summarize(self, ip, scores, latencies, metrics):
+        """汇总单个IP各次请求的结果，至少成功1个URL才计算平均分"""
+        metrics['successes'] = len(scores)
+        metrics['anonymity'] = self.anonymity.get(ip)
+        capabilities = protocol_capabilities(metrics['probes'])
+        capabilities.update(metrics.pop('socks', None) or {})
+        metrics['capabilities'] = capabilities
+        if latencies:
+            metrics['latency'] = sum(latencies) / len(latencies)
+        if scores:
+            return sum(scores) / len(scores), metrics
+        return 0, metrics
+
+    def prepare(self, ip_list):
+        """评分前的准备工作：读取协议能力和自适应超时，检测本机公网IP，设置评分截止时间
+
+        Returns:
+            dict: {server: True/False/None}，读取失败时返回空字典，回退到测试所有URL
+        """
         try:
-            # 动态获取IpData模型
-            IpData = apps.get_model('index', 'IpData')
+            protocol_hints = self.load_protocol_hints(ip_list)
+        except Exception as e:
+            logging.error(f"获取IP协议能力信息时出错: {e}")
+            protocol_hints = {}
+        if self.adaptive_timeout:
+            try:
+                self.proxy_timeouts = self.load_adaptive_timeouts(ip_list)
+            except Exception as e:
+                logging.error(f"计算自适应超时时出错: {e}")
+                self.proxy_timeouts = {}
+        if self.probe_cache is not None:
+            # 一次批量读取所有代理的缓存，探测时不再逐个访问Redis
+            self.prefetched_probes = self.probe_cache.get_many(ip_list, PROTOCOLS)
+            logging.info(f"探测结果缓存命中 {len(self.prefetched_probes)} 个IP")
+        if self.detect_socks and self.socks4_target is None:
+            self.socks4_target = resolve_socks4_target(self.http_test_urls[0])
+        self.detect_real_ip()
+        self.start_deadline()
+        return protocol_hints
+
+    def iter_scores(self, ip_list, on_idle=None, idle_interval=1.0):
+        """按探测完成的顺序逐个产出 (server, score, metrics)
+
+        on_idle 不为None时，等待探测结果期间每隔 idle_interval 秒在调用线程中调用一次，
+        探测停滞时写回阶段也能按时写入已缓冲的结果。
+        """
+        protocol_hints = self.prepare(ip_list)
+
+        executor = ThreadPoolExecutor(max_workers=10)
+        try:
+            future_to_ip = {
+                executor.submit(
+                    self.probe_single_ip, 
+                    ip, 
+                    protocol_hints.get(ip)
+                ): ip for ip in ip_list
+            }
             
-            # 获取所有IP的SSL支持信息
-            ip_ssl_info = {}
-            for ip_obj in IpData.objects.filter(server__in=ip_list):
-                ip_ssl_info[ip_obj.server] = ip_obj.ssl
-                
-            results = {}
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_ip = {
-                    executor.submit(
-                        self.test_single_ip, 
-                        ip, 
-                        ip_ssl_info.get(ip)
-                    ): ip for ip in ip_list
-                }
-                
-                for future in future_to_ip:
+            pending = set(future_to_ip)
+            while pending:
+                remaining = self.remaining_time()
+                if remaining == 0:
+                    # 到达评分截止时间，未完成的代理保留原分数，留待下次评分
+                    logging.warning(f"评分到达截止时间，放弃 {len(pending)} 个未完成的IP")
+                    break
+                wait_for = [t for t in (remaining, idle_interval if on_idle else None) if t is not None]
+                done, pending = wait(pending, timeout=min(wait_for, default=None), return_when=FIRST_COMPLETED)
+                if not done and on_idle:
+                    on_idle()
+                for future in done:
                     ip = future_to_ip[future]
                     try:
-                        score = future.result()
-                        results[ip] = score
+                        score, metrics = future.result()
                         logging.info(f"IP {ip} 最终得分: {score:.2f}")
                     except Exception as e:
                         logging.error(f"IP {ip} 测试失败: {e}")
-                        results[ip] = 0
-            
-            return results
-        except Exception as e:
-            logging.error(f"获取IP SSL信息时出错: {e}")
-            # 回退到不考虑SSL支持的测试
-            results = {}
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_ip = {executor.submit(self.test_single_ip, ip): ip for ip in ip_list}
-                for future in future_to_ip:
-                    ip = future_to_ip[future]
-                    try:
-                        score = future.result()
-                        results[ip] = score
-                    except Exception as e:
-                        logging.error(f"IP {ip} 测试失败: {e}")
-                        results[ip] = 0
-            
-            return results
+                        score, metrics = 0, {}
+                    yield ip, score, metrics
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的探测
+            executor.shutdown(wait=False, cancel_futures=True)
+            # 本次评分结束，下次评分重新计时
+            self.deadline = None
+
+    def score_ip_pool(self, ip_list):
+        """为IP池中的所有IP打分"""
+        results = {}
+        for ip, score, _ in self.iter_scores(ip_list):
+            results[ip] = score
+        return results
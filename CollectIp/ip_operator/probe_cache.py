@@ -0,0 +1,102 @@
+"""
+探测结果缓存
+
+评分器（包括所有Celery worker）和爬虫的 ProxyMiddleware 共享Redis中的探测结果，
+同一个代理的同一种协议在 TTL 内只探测一次:
+- 键: probe:{server}:{protocol}，protocol 为 http / https
+- 值: 该协议本次所有探测的明细 [{'protocol', 'success', 'latency', 'outcome'}]，JSON格式
+
+Redis不可用时所有读取视为未命中、写入直接忽略，并在 retry_after 秒内不再访问Redis，不影响评分。
+"""
+import json
+import logging
+import time
+
+import redis
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger('ip_operator')
+
+KEY_PREFIX = 'probe'
+PROTOCOLS = ('http', 'https')
+
+
+class ProbeCache:
+    """按 (代理, 协议) 缓存探测明细"""
+
+    def __init__(self, client, ttl=300, prefix=KEY_PREFIX, retry_after=60):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.retry_after = retry_after  # Redis出错后暂停使用缓存的时间（秒）
+        self.disabled_until = 0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.disabled_until
+
+    def _disable(self, action, error):
+        self.disabled_until = time.monotonic() + self.retry_after
+        logger.warning(f"{action}探测结果缓存失败，{self.retry_after}秒内不再使用缓存: {error}")
+
+    def key(self, server, protocol):
+        return f'{self.prefix}:{server}:{protocol}'
+
+    def get(self, server, protocols=PROTOCOLS):
+        """读取单个代理的缓存，返回 {protocol: [probe]}，未命中的协议不出现在结果中"""
+        return self.get_many([server], protocols).get(server, {})
+
+    def get_many(self, servers, protocols=PROTOCOLS, chunk_size=1000):
+        """批量读取缓存，每 chunk_size 个键一次 MGET
+
+        Returns:
+            dict: {server: {protocol: [probe]}}
+        """
+        cached = {}
+        if not self.available:
+            return cached
+        pairs = [(server, protocol) for server in servers for protocol in protocols]
+        try:
+            for i in range(0, len(pairs), chunk_size):
+                chunk = pairs[i:i + chunk_size]
+                values = self.client.mget([self.key(server, protocol) for server, protocol in chunk])
+                for (server, protocol), value in zip(chunk, values):
+                    if value is not None:
+                        cached.setdefault(server, {})[protocol] = json.loads(value)
+        except (redis.RedisError, ValueError) as e:
+            self._disable('读取', e)
+        return cached
+
+    def set(self, server, probes):
+        """按协议写入一个代理本次的探测明细"""
+        by_protocol = {}
+        for probe in probes:
+            by_protocol.setdefault(probe.get('protocol'), []).append(probe)
+        if not by_protocol or not self.available:
+            return
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for protocol, items in by_protocol.items():
+                    pipe.set(self.key(server, protocol), json.dumps(items), ex=self.ttl)
+                pipe.execute()
+        except redis.RedisError as e:
+            self._disable('写入', e)
+
+
+def load_probe_cache(ttl):
+    """按Django配置（REDIS_HOST 等）创建探测结果缓存，ttl 为0或Django未配置时返回None"""
+    if not ttl:
+        return None
+    try:
+        from django.conf import settings
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=1,
+            socket_connect_timeout=1,
+        )
+    except (ImproperlyConfigured, AttributeError):
+        return None
+    return ProbeCache(client, ttl)
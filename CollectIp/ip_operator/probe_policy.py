@@ -0,0 +1,160 @@
+"""
+探测失败分类与短路策略
+
+把每次探测的异常归类为 拒绝连接 / 连接重置 / 超时 / TLS失败 / CONNECT被拒 / DNS失败 / 状态码异常，
+并据此决定是否还有必要继续探测同一个代理的其余URL：
+- 拒绝连接、DNS失败: 代理端口不可用，后续所有探测必然失败，立即停止
+- 超时: 累计超时达到 max_timeouts 次后停止，避免每个URL都等满超时时间
+- TLS失败、CONNECT被拒: 代理不支持HTTPS隧道，跳过剩余的HTTPS探测
+- 连接重置、状态码异常、其他错误: 可能是偶发问题，继续探测
+"""
+import asyncio
+import socket
+import ssl
+from collections import Counter
+
+OK = 'ok'
+REFUSED = 'refused'
+RESET = 'reset'
+TIMEOUT = 'timeout'
+TLS = 'tls'
+CONNECT_REJECTED = 'connect_rejected'
+DNS = 'dns'
+BAD_STATUS = 'bad_status'
+ERROR = 'error'
+
+FATAL = frozenset({REFUSED, DNS})
+HTTPS_BLOCKING = frozenset({TLS, CONNECT_REJECTED})
+
+
+def _iter_causes(exc, depth=6):
+    """沿异常链遍历：__cause__/__context__，以及 requests/urllib3/aiohttp 包装的内部异常"""
+    seen = set()
+    stack = [exc]
+    while stack and len(seen) < depth * 4:
+        current = stack.pop()
+        if not isinstance(current, BaseException) or id(current) in seen:
+            continue
+        seen.add(id(current))
+        yield current
+        stack.extend((current.__cause__, current.__context__,
+                      getattr(current, 'reason', None), getattr(current, 'os_error', None)))
+        stack.extend(arg for arg in getattr(current, 'args', ()) if isinstance(arg, BaseException))
+
+
+# aiohttp 的TLS异常（ClientSSLError 及其子类 ClientConnectorSSLError 等）
+_AIOHTTP_TLS_ERRORS = frozenset({'ClientSSLError', 'ClientConnectorSSLError', 'ClientConnectorCertificateError'})
+
+
+def _classify_one(cause):
+    name = type(cause).__name__
+    if isinstance(cause, ConnectionRefusedError):
+        return REFUSED
+    if isinstance(cause, socket.gaierror) or 'NameResolution' in name:
+        return DNS
+    if name == 'ClientHttpProxyError' or 'Tunnel connection failed' in str(cause):
+        return CONNECT_REJECTED
+    if isinstance(cause, (ssl.SSLError, ssl.CertificateError)) or name in _AIOHTTP_TLS_ERRORS or 'SSL' in name:
+        return TLS
+    if isinstance(cause, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)) \
+            or 'Disconnected' in name:
+        return RESET
+    if isinstance(cause, (TimeoutError, asyncio.TimeoutError)) or 'Timeout' in name:
+        return TIMEOUT
+    return None
+
+
+# 异常链中同时出现多种原因时，按此顺序取最具体的一种
+_PRIORITY = (REFUSED, DNS, CONNECT_REJECTED, TLS, RESET, TIMEOUT)
+
+
+def _reset_in_tls_handshake(causes):
+    """aiohttp 经代理访问HTTPS时，CONNECT 隧道建立后的TLS握手被重置，
+    抛出的是包装 ConnectionResetError 的 ClientConnectorError（不是SSL异常）。
+
+    连接代理本身失败是其子类 ClientProxyConnectionError，读取 CONNECT 响应时断开是
+    ServerDisconnectedError，两者都不属于TLS握手阶段。
+    """
+    return any(type(cause).__name__ == 'ClientConnectorError' for cause in causes)
+
+
+def classify_exception(exc, url=None):
+    """把探测异常归类为上面定义的失败类型之一
+
+    Args:
+        exc: 探测抛出的异常
+        url (str, optional): 探测的URL；https URL 在收到任何响应之前、TLS握手阶段被重置时归类为TLS失败
+    """
+    causes = list(_iter_causes(exc))
+    found = {_classify_one(cause) for cause in causes}
+    if RESET in found and url and url.startswith('https:') and _reset_in_tls_handshake(causes):
+        found.add(TLS)
+    for outcome in _PRIORITY:
+        if outcome in found:
+            return outcome
+    return ERROR
+
+
+class ProbePlan:
+    """单个代理的探测计划：按顺序给出待探测URL，根据每次的结果决定是否提前结束
+
+    用法:
+        plan = ProbePlan(test_urls, max_timeouts=1)
+        for url in plan:
+            ...
+            plan.record(url, outcome)
+    """
+
+    def __init__(self, test_urls, max_timeouts=1):
+        self.test_urls = list(test_urls)
+        self.max_timeouts = max(1, max_timeouts)
+        self.timeouts = 0
+        self.stopped = False
+        self.https_blocked = False
+        self.skipped = 0  # 因短路而省下的探测次数
+        self.outcomes = []
+
+    def __iter__(self):
+        for index, url in enumerate(self.test_urls):
+            if self.stopped:
+                self.skipped += len(self.test_urls) - index
+                return
+            if self.https_blocked and url.startswith('https:'):
+                self.skipped += 1
+                continue
+            yield url
+
+    def record(self, url, outcome):
+        """记录一次探测结果，并更新后续探测的决策"""
+        self.outcomes.append(outcome)
+        if outcome in FATAL:
+            self.stopped = True
+        elif outcome == TIMEOUT:
+            self.timeouts += 1
+            if self.timeouts >= self.max_timeouts:
+                self.stopped = True
+        elif outcome in HTTPS_BLOCKING and url.startswith('https:'):
+            self.https_blocked = True
+
+
+class ProbeStats:
+    """汇总一次评分运行中所有代理的失败类型和短路节省的探测次数"""
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.attempts = 0
+        self.skipped = 0
+        self.cached = 0
+
+    def add(self, metrics):
+        if not metrics:
+            return
+        self.attempts += metrics.get('attempts', 0)
+        self.skipped += metrics.get('skipped', 0)
+        self.cached += metrics.get('cached', 0)
+        self.outcomes.update(probe.get('outcome') for probe in metrics.get('probes', ()) if probe.get('outcome'))
+
+    def summary(self):
+        outcomes = ', '.join(f"{name}={count}" for name, count in self.outcomes.most_common())
+        return (f"实际探测 {self.attempts} 次, 短路节省 {self.skipped} 次, 缓存命中 {self.cached} 次; "
+                f"结果分布: {outcomes or '无'}")
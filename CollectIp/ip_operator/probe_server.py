@@ -0,0 +1,225 @@
+"""
+内置探测目标服务器（judge server）
+
+替代 httpbin.org 作为代理评分的探测目标：返回客户端IP和收到的请求头，
+一次往返即可同时得到连通性、延迟和匿名等级。
+
+HTTPS探测时代理通过 CONNECT 隧道连接到本服务的TLS端口，TLS握手在评分端
+与本服务之间端到端完成，因此只需提供证书即可同时覆盖 HTTP 和 CONNECT/HTTPS。
+
+用法:
+    python -m ip_operator.probe_server --port 8899 --tls-port 8443 \\
+        --certfile server.crt --keyfile server.key
+"""
+import argparse
+import asyncio
+import json
+import logging
+import ssl
+import threading
+
+logger = logging.getLogger('ip_operator')
+
+# 代理可能附加的、会暴露代理存在或真实IP的请求头
+PROXY_HEADERS = (
+    'via',
+    'x-forwarded-for',
+    'forwarded',
+    'x-real-ip',
+    'client-ip',
+    'x-client-ip',
+    'x-proxy-id',
+    'proxy-connection',
+    'x-forwarded-host',
+    'x-forwarded-proto',
+)
+
+MAX_HEADER_BYTES = 16 * 1024
+
+
+def classify_anonymity(payload, real_ip=None):
+    """根据探测目标返回的内容判断代理匿名等级
+
+    Args:
+        payload (dict): 探测目标返回的JSON，包含 origin 和 headers
+        real_ip (str, optional): 本机公网IP，未知时只根据代理头判断
+
+    Returns:
+        str: transparent（暴露真实IP）、anonymous（暴露代理身份）或 elite（高匿）
+    """
+    headers = {k.lower(): str(v) for k, v in (payload.get('headers') or {}).items()}
+    origin = str(payload.get('origin', ''))
+
+    if real_ip:
+        if real_ip in origin or any(real_ip in headers.get(h, '') for h in PROXY_HEADERS):
+            return 'transparent'
+    if any(h in headers for h in PROXY_HEADERS):
+        return 'anonymous'
+    return 'elite'
+
+
+class ProbeServer:
+    """轻量级异步探测目标服务器
+
+    对任意路径的 GET/HEAD 请求返回 JSON:
+        {"origin": 客户端IP, "method": ..., "path": ..., "headers": {...}}
+    """
+
+    def __init__(self, host='0.0.0.0', port=8899, tls_port=None, certfile=None, keyfile=None,
+                 read_timeout=10):
+        self.host = host
+        self.port = port
+        self.tls_port = tls_port
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.read_timeout = read_timeout
+        self._servers = []
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def http_url(self):
+        """HTTP探测地址"""
+        return f'http://{self._public_host()}:{self.port}/judge'
+
+    @property
+    def https_url(self):
+        """HTTPS探测地址，未启用TLS时为None"""
+        if self.tls_port is None:
+            return None
+        return f'https://{self._public_host()}:{self.tls_port}/judge'
+
+    def _public_host(self):
+        return '127.0.0.1' if self.host in ('0.0.0.0', '') else self.host
+
+    def _ssl_context(self):
+        if self.tls_port is None or not self.certfile:
+            return None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.certfile, self.keyfile)
+        return context
+
+    async def _read_request(self, reader):
+        """读取请求行和请求头，返回 (method, path, headers)"""
+        data = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.read_timeout)
+        if len(data) > MAX_HEADER_BYTES:
+            raise ValueError('请求头过大')
+
+        lines = data.decode('latin-1').split('\r\n')
+        method, path, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip()] = value.strip()
+        return method.upper(), path, headers
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            method, path, headers = await self._read_request(reader)
+            if method in ('GET', 'HEAD'):
+                status = '200 OK'
+                body = json.dumps({
+                    'origin': peer[0],
+                    'method': method,
+                    'path': path,
+                    'headers': headers,
+                }).encode('utf-8')
+            else:
+                status = '405 Method Not Allowed'
+                body = b'{}'
+
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Cache-Control: no-store\r\n'
+                f'Connection: close\r\n\r\n'.encode('latin-1')
+            )
+            if method != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError, ssl.SSLError) as e:
+            logger.debug(f"探测目标处理 {peer[0]} 的请求失败: {type(e).__name__}")
+        finally:
+            writer.close()
+
+    async def start(self):
+        """在当前事件循环中启动监听"""
+        self._servers.append(
+            await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        )
+        if self.port == 0:
+            self.port = self._servers[-1].sockets[0].getsockname()[1]
+
+        context = self._ssl_context()
+        if context is not None:
+            self._servers.append(
+                await asyncio.start_server(self._handle, self.host, self.tls_port, ssl=context,
+                                           limit=MAX_HEADER_BYTES)
+            )
+            if self.tls_port == 0:
+                self.tls_port = self._servers[-1].sockets[0].getsockname()[1]
+
+        logger.info(f"探测目标服务器已启动: {self.http_url} {self.https_url or ''}")
+
+    async def close(self):
+        """关闭所有监听"""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            await self.close()
+
+    def start_in_thread(self):
+        """在后台线程中运行，供本地测试和基准测试使用，返回自身"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            self._ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='probe-server', daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self
+
+    def stop(self):
+        """停止后台线程中的服务器"""
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='代理评分探测目标服务器')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=8899, help='HTTP端口')
+    parser.add_argument('--tls-port', type=int, default=None, help='HTTPS端口（需要证书）')
+    parser.add_argument('--certfile', default=None, help='TLS证书文件')
+    parser.add_argument('--keyfile', default=None, help='TLS私钥文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = ProbeServer(args.host, args.port, args.tls_port, args.certfile, args.keyfile)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+本地模拟代理集群（fake proxy farm）
+
+在本机启动N个asyncio正向代理，用于在不访问真实免费代理和httpbin的情况下，
+可重复地测量评分引擎的吞吐量。每个代理可以配置延迟分布和故障模式:
+- ok: 正常转发，支持绝对URI的 GET 和 CONNECT 隧道
+- refuse: 端口未监听，连接被拒绝
+- hang: 接受连接但永不响应
+- reset: 读完请求头后直接重置连接
+- bad_tls: HTTP正常转发，CONNECT 回复200后发送垃圾数据，TLS握手失败
+- error_5xx: 回复 502 Bad Gateway
+
+用法:
+    farm = ProxyFarm(100, modes={'ok': 0.6, 'refuse': 0.2, 'hang': 0.1, 'reset': 0.1}).start_in_thread()
+    servers = farm.servers   # ['127.0.0.1:port', ...]
+    ...
+    farm.stop()
+
+基准测试见 utlis/bench_scorer.py
+"""
+import asyncio
+import logging
+import random
+import socket
+import threading
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('ip_operator')
+
+MODES = ('ok', 'refuse', 'hang', 'reset', 'bad_tls', 'error_5xx')
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class FakeProxy:
+    """单个模拟代理的行为配置"""
+
+    def __init__(self, mode='ok', latency_median=0.05, latency_sigma=0.5, rng=None):
+        if mode not in MODES:
+            raise ValueError(f'未知的代理模式: {mode}')
+        self.mode = mode
+        self.latency_median = latency_median  # 延迟中位数（秒），服从对数正态分布
+        self.latency_sigma = latency_sigma
+        self.rng = rng or random.Random()
+        self.port = None
+        self.open_connections = 0  # 当前保持着的客户端连接数，用于检查客户端是否关闭了连接
+
+    def sample_latency(self):
+        if self.latency_median <= 0:
+            return 0.0
+        return self.latency_median * self.rng.lognormvariate(0, self.latency_sigma)
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, reader, writer):
+        self.open_connections += 1
+        try:
+            # 非HTTP的首字节（例如直接发来的TLS握手）立即断开，和真实的明文代理一样快速失败
+            first = await reader.read(1)
+            if not first or not first.isalpha():
+                return
+            head = first + await reader.readuntil(b'\r\n\r\n')
+
+            if self.mode == 'hang':
+                await reader.read()  # 一直等到客户端放弃
+                return
+            if self.mode == 'reset':
+                writer.transport.abort()
+                return
+
+            await asyncio.sleep(self.sample_latency())
+            if self.mode == 'error_5xx':
+                writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                await writer.drain()
+                return
+
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, version = lines[0].split(' ', 2)
+            if method.upper() == 'CONNECT':
+                host, _, port = target.rpartition(':')
+                if self.mode == 'bad_tls':
+                    writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                    writer.write(b'this is not a tls server hello\r\n' * 4)
+                    await writer.drain()
+                    return
+                upstream_reader, upstream_writer = await asyncio.open_connection(host, int(port))
+                writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                await writer.drain()
+            else:
+                url = urlsplit(target)
+                upstream_reader, upstream_writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                path = url.path or '/'
+                if url.query:
+                    path += '?' + url.query
+                lines[0] = f'{method} {path} {version}'
+                headers = [line for line in lines[1:] if not line.lower().startswith('proxy-')]
+                upstream_writer.write('\r\n'.join([lines[0]] + headers).encode('latin-1'))
+                await upstream_writer.drain()
+
+            await asyncio.gather(self._pipe(reader, upstream_writer), self._pipe(upstream_reader, writer))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+
+class ProxyFarm:
+    """一组监听在本机不同端口上的模拟代理"""
+
+    def __init__(self, count, modes=None, latency_median=0.05, latency_sigma=0.5, host='127.0.0.1', seed=0):
+        """
+        Args:
+            count (int): 代理数量
+            modes (dict, optional): {模式: 比例}，默认全部为 ok
+            latency_median (float): 延迟中位数（秒）
+            latency_sigma (float): 对数正态分布的σ，越大长尾越明显
+            host (str): 监听地址
+            seed (int): 随机种子，保证每次生成的代理集群相同
+        """
+        self.host = host
+        self.rng = random.Random(seed)
+        modes = modes or {'ok': 1.0}
+        names, weights = zip(*modes.items())
+        self.proxies = [
+            FakeProxy(self.rng.choices(names, weights)[0], latency_median, latency_sigma,
+                      random.Random(self.rng.random()))
+            for _ in range(count)
+        ]
+        self._servers = []
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def servers(self):
+        """所有代理的 ip:port 列表"""
+        return [f'{self.host}:{proxy.port}' for proxy in self.proxies]
+
+    def server_modes(self):
+        """{ip:port: 模式}"""
+        return {f'{self.host}:{proxy.port}': proxy.mode for proxy in self.proxies}
+
+    def _unused_port(self):
+        """取得一个当前没有监听的端口，用于 refuse 模式"""
+        with socket.socket() as sock:
+            sock.bind((self.host, 0))
+            return sock.getsockname()[1]
+
+    async def start(self):
+        """在当前事件循环中启动所有代理"""
+        for proxy in self.proxies:
+            if proxy.mode == 'refuse':
+                proxy.port = self._unused_port()
+                continue
+            server = await asyncio.start_server(proxy.handle, self.host, 0, limit=MAX_HEADER_BYTES, backlog=512)
+            proxy.port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+        logger.info(f"模拟代理集群已启动: {len(self.proxies)} 个代理")
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def start_in_thread(self):
+        """在后台线程中运行，返回自身"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            self._ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='proxy-farm', daemon=True)
+        self._thread.start()
+        self._ready.wait(60)
+        return self
+
+    def stop(self):
+        """停止后台线程中的代理集群"""
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+            self._thread = None
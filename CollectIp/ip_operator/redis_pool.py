@@ -0,0 +1,228 @@
+"""
+跨进程共享的Redis代理池
+
+评分完成后由评分器发布（见 services/proxy_pool.py），所有爬虫进程从同一个池中租用代理，
+请求结束后归还并报告结果，健康状态在所有进程之间共享:
+- {prefix}:http / {prefix}:https  有序集合，成员为代理，分值为选择权重；https 池只包含支持CONNECT
+  （或能力未知）的代理
+- {prefix}:inflight:{server}      代理当前被租用的次数，每次租用刷新过期时间，
+  爬虫进程崩溃未归还的租约在 lease_ttl 秒后自动失效
+- {prefix}:limits                 哈希，代理按分数档位（inflight_tiers，与本地代理池共用）确定的在途上限，
+  不在其中的代理使用最低一档的上限
+
+租用和归还都由Lua脚本在Redis中原子完成:
+- lease: 在权重最高的 top_n 个代理中排除在途请求已达各自上限的代理，按权重随机选择一个并增加在途计数
+- release: 减少在途计数；报告了结果时，成功则权重向按耗时得出的目标值靠拢，失败时权重减半，
+  低于 min_weight 的代理从池中移除
+脚本在内部拼接 inflight 键名，只适用于单机Redis（非集群模式）。
+"""
+import logging
+import random
+
+import redis
+from django.core.exceptions import ImproperlyConfigured
+
+from .inflight import load_tiers, lowest_limit, parse_tiers, tier_limit
+
+logger = logging.getLogger('ip_operator')
+
+KEY_PREFIX = 'proxy_pool'
+SCHEMES = ('http', 'https')
+
+LEASE_SCRIPT = """
+local candidates = redis.call('ZREVRANGE', KEYS[1], 0, tonumber(ARGV[2]) - 1, 'WITHSCORES')
+local default_limit = tonumber(ARGV[1])
+local eligible = {}
+local total = 0
+for i = 1, #candidates, 2 do
+    local member = candidates[i]
+    local weight = tonumber(candidates[i + 1])
+    local inflight = tonumber(redis.call('GET', ARGV[5] .. member) or '0')
+    local limit = tonumber(redis.call('HGET', KEYS[2], member) or default_limit)
+    if weight > 0 and (limit <= 0 or inflight < limit) then
+        total = total + weight
+        eligible[#eligible + 1] = {member, total}
+    end
+end
+if #eligible == 0 then
+    return false
+end
+local target = tonumber(ARGV[3]) * total
+local chosen = eligible[#eligible][1]
+for _, item in ipairs(eligible) do
+    if target < item[2] then
+        chosen = item[1]
+        break
+    end
+end
+local key = ARGV[5] .. chosen
+redis.call('INCR', key)
+redis.call('EXPIRE', key, tonumber(ARGV[4]))
+return chosen
+"""
+
+RELEASE_SCRIPT = """
+local member = ARGV[1]
+local key = ARGV[6] .. member
+if tonumber(redis.call('DECR', key)) <= 0 then
+    redis.call('DEL', key)
+end
+if ARGV[2] == '' then
+    return 1
+end
+local success = ARGV[2] == '1'
+local target = tonumber(ARGV[3])
+local min_weight = tonumber(ARGV[4])
+local alpha = tonumber(ARGV[5])
+for i = 1, #KEYS do
+    local weight = redis.call('ZSCORE', KEYS[i], member)
+    if weight then
+        weight = tonumber(weight)
+        if success then
+            weight = (1 - alpha) * weight + alpha * target
+        else
+            weight = weight / 2
+        end
+        if weight < min_weight then
+            redis.call('ZREM', KEYS[i], member)
+        else
+            redis.call('ZADD', KEYS[i], weight, member)
+        end
+    end
+end
+return 1
+"""
+
+
+class RedisProxyPool:
+    """Redis有序集合实现的共享代理池"""
+
+    def __init__(self, client, prefix=KEY_PREFIX, lease_ttl=300, top_n=50,
+                 min_weight=5, alpha=0.3, timeout=30, inflight_tiers=None):
+        """
+        Args:
+            client (redis.Redis): Redis连接
+            prefix (str): 键名前缀
+            inflight_tiers (dict, optional): 按发布时的分数分档的在途上限 {最低分数: 上限}，
+                为None时读取 inflight.load_tiers()
+            lease_ttl (int): 在途计数的过期时间（秒）
+            top_n (int): 每次租用时参与随机选择的候选代理数量
+            min_weight (float): 权重低于该值的代理从池中移除
+            alpha (float): 请求成功时权重向目标值靠拢的比例
+            timeout (float): 计算权重时的响应耗时上限（秒）
+        """
+        self.client = client
+        self.prefix = prefix
+        self.lease_ttl = lease_ttl
+        self.top_n = top_n
+        self.min_weight = min_weight
+        self.alpha = alpha
+        self.timeout = timeout
+        self.inflight_tiers = parse_tiers(load_tiers() if inflight_tiers is None else inflight_tiers)
+        self.default_limit = lowest_limit(self.inflight_tiers)  # 不在 limits 哈希中的代理的上限
+        self._lease = client.register_script(LEASE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def key(self, scheme):
+        return f'{self.prefix}:{scheme}'
+
+    @property
+    def limits_key(self):
+        return f'{self.prefix}:limits'
+
+    @property
+    def inflight_prefix(self):
+        return f'{self.prefix}:inflight:'
+
+    def publish(self, rows):
+        """用评分结果整体替换代理池
+
+        Args:
+            rows (iterable): (server, weight, supports_connect)，weight 为分数，同时用于确定在途上限的档位；
+                supports_connect 为False的代理不进入 https 池
+        """
+        pools = {'http': {}, 'https': {}}
+        limits = {}
+        for server, weight, supports_connect in rows:
+            if self.inflight_tiers:
+                limits[server] = tier_limit(self.inflight_tiers, weight)
+            weight = max(float(weight or 0), self.min_weight)
+            pools['http'][server] = weight
+            if supports_connect is not False:
+                pools['https'][server] = weight
+        with self.client.pipeline(transaction=True) as pipe:
+            staging = f'{self.limits_key}:staging'
+            pipe.delete(staging)
+            if limits:
+                pipe.hset(staging, mapping=limits)
+                pipe.rename(staging, self.limits_key)
+            else:
+                pipe.delete(self.limits_key)
+            for scheme, members in pools.items():
+                # 先写入临时键再 RENAME，爬虫进程不会看到写了一半的池
+                staging = f'{self.key(scheme)}:staging'
+                pipe.delete(staging)
+                if members:
+                    pipe.zadd(staging, members)
+                    pipe.rename(staging, self.key(scheme))
+                else:
+                    pipe.delete(self.key(scheme))
+            pipe.execute()
+        return len(pools['http'])
+
+    def lease(self, scheme='http'):
+        """租用一个代理，没有可用代理时返回None"""
+        scheme = scheme if scheme in SCHEMES else 'http'
+        result = self._lease(
+            keys=[self.key(scheme), self.limits_key],
+            args=[self.default_limit, self.top_n, random.random(), self.lease_ttl, self.inflight_prefix],
+        )
+        return result.decode() if isinstance(result, bytes) else result
+
+    def release(self, server, success, latency=None):
+        """归还租用的代理并报告结果
+
+        Args:
+            server (str): 代理
+            success (bool): 请求是否成功，None表示只归还、不调整权重
+            latency (float, optional): 请求耗时（秒）
+        """
+        target = 100 * max(0.05, 1 - (latency or 0) / self.timeout)
+        outcome = '' if success is None else int(bool(success))
+        self._release(
+            keys=[self.key(scheme) for scheme in SCHEMES],
+            args=[server, outcome, target, self.min_weight, self.alpha, self.inflight_prefix],
+        )
+
+    def size(self, scheme='http'):
+        return self.client.zcard(self.key(scheme))
+
+    def inflight(self, server):
+        return int(self.client.get(self.inflight_prefix + server) or 0)
+
+
+def load_redis_pool(**options):
+    """按Django配置（REDIS_HOST 等和 IP_POOL_CONFIG['REDIS_POOL_*']）创建共享代理池，
+    未启用或Django未配置时返回None"""
+    try:
+        from django.conf import settings
+        config = getattr(settings, 'IP_POOL_CONFIG', {})
+        if not config.get('REDIS_POOL_ENABLED', False):
+            return None
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=1,
+            socket_connect_timeout=1,
+        )
+    except (ImproperlyConfigured, AttributeError):
+        return None
+    defaults = {
+        'lease_ttl': config.get('REDIS_POOL_LEASE_TTL', 300),
+        'top_n': config.get('REDIS_POOL_TOP_N', 50),
+        'min_weight': config.get('REDIS_POOL_MIN_WEIGHT', 5),
+    }
+    defaults.update(options)
+    return RedisProxyPool(client, **defaults)
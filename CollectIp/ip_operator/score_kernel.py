@@ -0,0 +1,94 @@
+"""
+评分计算内核
+评分流程中纯CPU计算的部分：代理地址解析校验、评分历史的时间衰减聚合、延迟分位数。
+_score_kernel.pyx 是同一组函数的Cython实现，编译后（python utlis/setup.py build_ext --inplace）
+自动替换下面的纯Python实现；未编译时使用纯Python实现，结果完全一致。
+"""
+import math
+
+
+def parse_proxy(value):
+    """解析 'a.b.c.d:port' 格式的代理地址
+
+    Returns:
+        tuple: 合法时返回 (host, port)，否则返回None
+    """
+    host, sep, port = value.rpartition(':')
+    if not sep or not port.isascii() or not port.isdigit() or len(port) > 5:
+        return None
+    port = int(port)
+    if not 0 < port < 65536:
+        return None
+    octets = host.split('.')
+    if len(octets) != 4:
+        return None
+    for octet in octets:
+        if not octet.isascii() or not octet.isdigit() or len(octet) > 3 or int(octet) > 255:
+            return None
+    return host, port
+
+
+def decayed_scores(rows, half_life, prior_a, prior_b, timeout):
+    """按时间衰减聚合评分历史，计算每个代理的分数
+
+    分数 = 100 × Beta(prior_a + 成功权重, prior_b + 失败权重) 的均值 × max(0, 1 - 加权平均延迟 / timeout)，
+    每条记录的权重为 exp(-ln2 × age / half_life)。没有成功记录的代理得0分。
+
+    Args:
+        rows (iterable): (server, success, latency_ms, age_seconds)，latency_ms 可以为None
+        half_life (float): 半衰期（秒）
+        prior_a (float): 成功率Beta先验 α
+        prior_b (float): 成功率Beta先验 β
+        timeout (float): 探测超时（秒）
+
+    Returns:
+        dict: {server: score}
+    """
+    decay = math.log(2) / half_life
+    stats = {}
+    for server, success, latency_ms, age in rows:
+        entry = stats.get(server)
+        if entry is None:
+            entry = stats[server] = [0.0, 0.0, 0.0, 0.0]  # 成功权重, 失败权重, 延迟加权和, 延迟权重
+        weight = math.exp(-decay * max(age, 0.0))
+        if success:
+            entry[0] += weight
+            if latency_ms is not None:
+                entry[2] += weight * latency_ms / 1000
+                entry[3] += weight
+        else:
+            entry[1] += weight
+
+    scores = {}
+    for server, (success_weight, failure_weight, latency_sum, latency_weight) in stats.items():
+        if latency_weight <= 0:
+            scores[server] = 0.0
+            continue
+        alpha = prior_a + success_weight
+        beta = prior_b + failure_weight
+        latency_score = max(0.0, 1 - latency_sum / latency_weight / timeout)
+        scores[server] = 100 * alpha / (alpha + beta) * latency_score
+    return scores
+
+
+def latency_quantile(values, quantile):
+    """最近秩法计算延迟分位数，values 为空时返回NaN"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(1, math.ceil(quantile * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+# 保留纯Python实现的引用，供基准测试对比
+python_parse_proxy = parse_proxy
+python_decayed_scores = decayed_scores
+python_latency_quantile = latency_quantile
+
+COMPILED = False
+
+try:
+    from ._score_kernel import decayed_scores, latency_quantile, parse_proxy  # noqa: F811
+    COMPILED = True
+except ImportError:
+    pass
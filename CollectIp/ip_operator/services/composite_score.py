@@ -0,0 +1,231 @@
+"""
+综合评分模型
+把整个IP池的指标一次性读入NumPy数组，在一次向量化计算中得到所有代理的综合分数:
+- latency: 探测延迟（评分历史中成功探测的平均延迟，没有历史时使用爬取到的 ping）
+- success: 评分历史的成功率（Beta先验平滑）
+- speed: 来源站点给出的速度（响应耗时，与其他地方 speed ASC 的排序一致，越小越好），按池内百分位排名归一化
+  （只计算部分代理时仍以整个IP池的速度分布为参照）
+- uptime: 来源站点给出的在线率（uptime1/uptime2）
+- freshness: 最近一次评分距今的时间，按半衰期指数衰减；只在计算整个IP池时参与加权
+某个指标缺失时该项不参与加权，其余项的权重按比例放大。
+"""
+import logging
+import math
+import re
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from index.models import IpData, ScoreHistory
+from .score_model import get_history_config
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+DEFAULT_WEIGHTS = {
+    'latency': 0.35,
+    'success': 0.30,
+    'speed': 0.10,
+    'uptime': 0.15,
+    'freshness': 0.10,
+}
+COMPONENTS = tuple(DEFAULT_WEIGHTS)
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+METRICS_CHUNK_SIZE = 2000  # 指定代理读取指标时每条查询的代理数量
+
+
+def get_composite_config():
+    """读取综合评分配置"""
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(config.get('COMPOSITE_WEIGHTS') or {})
+    return {
+        'weights': weights,
+        'freshness_half_life': config.get('COMPOSITE_FRESHNESS_HALF_LIFE', 86400),
+        'timeout': config.get('PROBE_TIMEOUT', 10),
+    }
+
+
+def parse_uptime(value):
+    """把来源站点的在线率文本解析为 0~1 的小数，无法解析时返回NaN
+
+    支持 '95%'、'95'（百分比）和 '12/3'（成功/失败次数）三种格式
+    """
+    if not value:
+        return math.nan
+    numbers = _NUMBER.findall(value)
+    if '/' in value and len(numbers) == 2:
+        ok, bad = float(numbers[0]), float(numbers[1])
+        return ok / (ok + bad) if ok + bad > 0 else math.nan
+    if len(numbers) == 1:
+        return min(float(numbers[0]), 100.0) / 100
+    return math.nan
+
+
+def load_pool_metrics(servers=None, now=None):
+    """读取代理的原始指标，返回以数组组织的指标表
+
+    Args:
+        servers (list, optional): 只读取这些代理，为None时读取整个IP池
+        now (datetime, optional): 当前时间
+
+    Returns:
+        dict: server（列表）以及 ping_ms / speed / uptime / age / attempts / successes / latency 数组，
+            缺失值为NaN
+    """
+    now = now or timezone.now()
+    history_config = get_history_config()
+    # 指定代理时分块查询，避免全量评分后写回的代理过多、IN 列表过长
+    server_chunks = [None] if servers is None else [
+        servers[i:i + METRICS_CHUNK_SIZE] for i in range(0, len(servers), METRICS_CHUNK_SIZE)
+    ]
+    rows = []
+    history = {}
+    for chunk in server_chunks:
+        queryset = IpData.objects.all()
+        history_queryset = ScoreHistory.objects.filter(
+            probed_at__gte=now - timedelta(seconds=history_config['window']),
+        )
+        if chunk is not None:
+            queryset = queryset.filter(server__in=chunk)
+            history_queryset = history_queryset.filter(server__in=chunk)
+        rows.extend(queryset.values_list('server', 'ping', 'speed', 'uptime1', 'uptime2', 'last_scored_at'))
+        history.update(
+            (row['server'], row) for row in history_queryset.values('server').annotate(
+                attempts=Count('id'),
+                successes=Count('id', filter=Q(success=True)),
+                latency_ms=Avg('latency_ms', filter=Q(success=True)),
+            )
+        )
+
+    count = len(rows)
+    metrics = {
+        'server': [row[0] for row in rows],
+        'ping_ms': np.full(count, np.nan),
+        'speed': np.full(count, np.nan),
+        'uptime': np.full(count, np.nan),
+        'age': np.full(count, np.nan),
+        'attempts': np.zeros(count),
+        'successes': np.zeros(count),
+        'latency': np.full(count, np.nan),
+    }
+    for i, (server, ping, speed, uptime1, uptime2, last_scored_at) in enumerate(rows):
+        if ping is not None:
+            metrics['ping_ms'][i] = float(ping)
+        if speed is not None:
+            metrics['speed'][i] = float(speed)
+        uptimes = [u for u in (parse_uptime(uptime1), parse_uptime(uptime2)) if not math.isnan(u)]
+        if uptimes:
+            metrics['uptime'][i] = sum(uptimes) / len(uptimes)
+        if last_scored_at is not None:
+            metrics['age'][i] = (now - last_scored_at).total_seconds()
+        stats = history.get(server)
+        if stats:
+            metrics['attempts'][i] = stats['attempts']
+            metrics['successes'][i] = stats['successes']
+            if stats['latency_ms'] is not None:
+                metrics['latency'][i] = stats['latency_ms'] / 1000
+    return metrics
+
+
+def load_speed_reference():
+    """读取整个IP池已知的速度并排序，作为速度百分位排名的参照
+
+    只读取一列，不聚合评分历史，也不写回分数；直接用游标读取，避免ORM逐行转换为Decimal。
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {qn('speed')} FROM {qn(IpData._meta.db_table)} WHERE {qn('speed')} IS NOT NULL"
+        )
+        speeds = np.array([row[0] for row in cursor.fetchall()], dtype=float)
+    return np.sort(speeds)
+
+
+def composite_scores(metrics, weights=None, timeout=10, freshness_half_life=86400, prior=(1.0, 1.0),
+                     speed_reference=None):
+    """对指标数组做一次向量化计算，返回 0~100 的综合分数数组
+
+    Args:
+        metrics (dict): load_pool_metrics 的返回值
+        weights (dict, optional): 各项权重，默认 DEFAULT_WEIGHTS
+        timeout (float): 探测超时（秒），延迟达到该值时延迟得分为0
+        freshness_half_life (float): 新鲜度半衰期（秒）
+        prior (tuple): 成功率的Beta先验 (α, β)
+        speed_reference (ndarray, optional): 已排序的速度参照（见 load_speed_reference），
+            为None时在 metrics 内部排名
+    """
+    weights = weights or DEFAULT_WEIGHTS
+
+    # 延迟：优先使用实测延迟，没有时退回爬取到的ping
+    latency = np.where(np.isnan(metrics['latency']), metrics['ping_ms'] / 1000, metrics['latency'])
+    latency_score = np.clip(1 - latency / timeout, 0, 1)
+
+    # 成功率：没有探测记录的代理为NaN，不参与加权
+    attempts = metrics['attempts']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        success_score = np.where(
+            attempts > 0,
+            (metrics['successes'] + prior[0]) / (attempts + prior[0] + prior[1]),
+            np.nan,
+        )
+
+    # 速度：越小越快，得分为池内不快于该代理的比例（最快为1），NaN保持为NaN
+    speed = metrics['speed']
+    speed_score = np.full(speed.shape, np.nan)
+    known = ~np.isnan(speed)
+    if known.any() and speed_reference is not None and len(speed_reference):
+        faster = np.searchsorted(speed_reference, speed[known], side='left')
+        speed_score[known] = 1 - faster / len(speed_reference)
+    elif known.any():
+        ranks = speed[known].argsort().argsort()
+        speed_score[known] = 1 - ranks / known.sum()
+
+    freshness_score = np.exp(-math.log(2) * metrics['age'] / freshness_half_life)
+
+    components = np.vstack([
+        latency_score, success_score, speed_score, metrics['uptime'], freshness_score,
+    ])
+    weight_vector = np.array([weights.get(name, 0.0) for name in COMPONENTS])[:, None]
+
+    available = ~np.isnan(components)
+    weight_sum = (weight_vector * available).sum(axis=0)
+    weighted = np.where(available, components, 0.0) * weight_vector
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(weight_sum > 0, weighted.sum(axis=0) / weight_sum, 0.0)
+    return np.rint(scores * 100)
+
+
+def compute_composite_scores(servers=None, timeout=None, now=None):
+    """计算代理的综合分数
+
+    Args:
+        servers (list, optional): 只计算这些代理（例如本次评分写回的代理，不计新鲜度），为None时计算整个IP池
+        timeout (float, optional): 探测超时（秒），默认读取 PROBE_TIMEOUT
+        now (datetime, optional): 当前时间
+
+    Returns:
+        dict: {server: score}
+    """
+    config = get_composite_config()
+    metrics = load_pool_metrics(servers, now=now)
+    if not metrics['server']:
+        return {}
+    weights = config['weights']
+    if servers is not None:
+        # 指定的代理是刚写回的代理，新鲜度恒为1，参与加权只会稀释其他指标
+        weights = dict(weights, freshness=0.0)
+    scores = composite_scores(
+        metrics,
+        weights=weights,
+        timeout=timeout or config['timeout'],
+        freshness_half_life=config['freshness_half_life'],
+        prior=get_history_config()['prior'],
+        speed_reference=None if servers is None else load_speed_reference(),
+    )
+    return dict(zip(metrics['server'], scores.astype(int).tolist()))
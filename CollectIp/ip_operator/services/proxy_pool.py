@@ -0,0 +1,67 @@
+"""
+代理池的发布
+每次评分结束后:
+- 把高分代理按排名物化到 hot_pool 表，爬虫中间件按排名做索引范围读取，不再扫描整个 index_ipdata
+- 把分数达标的代理发布到Redis有序集合（见 ip_operator/redis_pool.py），爬虫进程从中租用代理
+"""
+import logging
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from index.models import HotProxy, IpData
+from ..redis_pool import load_redis_pool
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+
+def refresh_hot_pool(now=None):
+    """按分数、延迟、速度重新物化 hot_pool 表，返回写入的代理数量
+
+    只保留最近 HOT_POOL_MAX_AGE 秒内更新过、分数不低于 HOT_POOL_MIN_SCORE 的前 HOT_POOL_SIZE 个代理，
+    删除和写入在同一个事务中完成，爬虫中间件不会读到空表。
+    """
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    now = now or timezone.now()
+    rows = (
+        IpData.objects
+        .filter(score__gte=config.get('HOT_POOL_MIN_SCORE', 50),
+                updated_at__gte=now - timedelta(seconds=config.get('HOT_POOL_MAX_AGE', 7200)))
+        .order_by('-score', 'ping', 'speed')
+        .values_list('server', 'score', 'ping', 'speed', 'country', 'supports_connect', 'updated_at')
+        [:config.get('HOT_POOL_SIZE', 500)]
+    )
+    hot = [
+        HotProxy(pool_rank=rank, server=server, score=score, ping=ping, speed=speed, country=country,
+                 supports_connect=supports_connect, updated_at=updated_at, refreshed_at=now)
+        for rank, (server, score, ping, speed, country, supports_connect, updated_at) in enumerate(rows, 1)
+    ]
+    with transaction.atomic():
+        HotProxy.objects.all().delete()
+        HotProxy.objects.bulk_create(hot, batch_size=500)
+    logger.info(f"热门代理池已更新: {len(hot)} 个代理")
+    return len(hot)
+
+
+def publish_proxy_pool(pool=None):
+    """按当前分数重建共享代理池，返回发布的代理数量；未启用共享代理池时返回0"""
+    pool = pool or load_redis_pool()
+    if pool is None:
+        return 0
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    rows = (
+        IpData.objects
+        .filter(score__gte=config.get('REDIS_POOL_MIN_SCORE', 60))
+        .order_by('-score')
+        .values_list('server', 'score', 'supports_connect')[:config.get('REDIS_POOL_SIZE', 2000)]
+    )
+    try:
+        count = pool.publish(rows)
+    except redis.RedisError as e:
+        logger.error(f"发布共享代理池失败: {e}")
+        return 0
+    logger.info(f"共享代理池已更新: {count} 个代理")
+    return count
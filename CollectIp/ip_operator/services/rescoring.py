@@ -0,0 +1,79 @@
+"""
+增量重评分服务
+按陈旧程度、历史可靠性和使用需求为代理排优先级，每次只重评最值得检查的N个代理
+"""
+import heapq
+import logging
+import math
+
+from django.conf import settings
+from django.utils import timezone
+from index.models import IpData
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+
+def get_rescore_config():
+    """读取增量重评分配置"""
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    return {
+        'batch_size': config.get('RESCORE_BATCH_SIZE', 500),
+        'base_interval': config.get('RESCORE_BASE_INTERVAL', config.get('SCORE_INTERVAL', 1800)),
+        'max_backoff': config.get('RESCORE_MAX_BACKOFF', 6),
+    }
+
+
+def rescore_priority(now, last_scored_at, score, fail_count, use_count, base_interval, max_backoff):
+    """计算单个代理的重评分优先级，小于1表示尚未到期
+
+    - 陈旧程度: 距上次评分的时间 / 期望重评间隔
+    - 可靠性: 连续失败的代理按 2^fail_count 指数退避，分数越高越值得保持新鲜
+    - 使用需求: 被爬虫使用得越多，越需要及时发现它失效
+    """
+    if last_scored_at is None:
+        return math.inf  # 从未评分的新代理最优先
+
+    interval = base_interval * (2 ** min(fail_count, max_backoff))
+    staleness = (now - last_scored_at).total_seconds() / interval
+    if staleness < 1:
+        return staleness
+
+    reliability = 0.5 + max(0, min(score, 100)) / 200
+    demand = 1 + math.log1p(max(use_count, 0))
+    return staleness * reliability * demand
+
+
+def select_rescore_batch(limit=None, now=None):
+    """选出下一批需要重评分的代理
+
+    Args:
+        limit (int, optional): 本次最多重评分的代理数量，默认读取 RESCORE_BATCH_SIZE
+        now (datetime, optional): 当前时间
+
+    Returns:
+        list: 按优先级从高到低排列的代理地址，只包含已到期的代理
+    """
+    config = get_rescore_config()
+    limit = limit or config['batch_size']
+    now = now or timezone.now()
+
+    # 维护一个大小为limit的最小堆，堆顶是当前入选代理中优先级最低的
+    heap = []
+    rows = IpData.objects.values_list('server', 'score', 'last_scored_at', 'fail_count', 'use_count')
+    for server, score, last_scored_at, fail_count, use_count in rows.iterator(chunk_size=2000):
+        priority = rescore_priority(
+            now, last_scored_at, score, fail_count, use_count,
+            config['base_interval'], config['max_backoff'],
+        )
+        if priority < 1:
+            continue
+        if len(heap) < limit:
+            heapq.heappush(heap, (priority, server))
+        elif priority > heap[0][0]:
+            heapq.heapreplace(heap, (priority, server))
+
+    batch = sorted(heap, reverse=True)
+
+    logger.info(f"增量重评分: 选出 {len(batch)} 个到期代理（上限 {limit}）")
+    return [server for _, server in batch]
@@ -0,0 +1,136 @@
+"""
+基于评分历史的统计评分模型
+
+单次探测的结果波动很大，直接用它覆盖 IpData.score 会让代理在保留和删除之间来回摇摆。
+这里把每个代理窗口期内的所有探测记录按时间衰减加权：
+- 成功率: Beta(α, β) 后验均值，α/β 为先验加上衰减加权后的成功/失败次数
+- 延迟: 成功探测延迟的时间衰减加权平均（按探测时间的EWMA）
+最终分数 = 100 × 成功率 × 延迟得分，延迟得分 = max(0, 1 - 延迟 / 超时时间)
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from index.models import ScoreHistory
+from ..score_kernel import decayed_scores, latency_quantile
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+
+def get_history_config():
+    """读取评分历史相关配置"""
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    return {
+        'half_life': config.get('HISTORY_HALF_LIFE', 6 * 3600),
+        'window': config.get('HISTORY_WINDOW', 3 * 86400),
+        'retention': config.get('HISTORY_RETENTION', 7 * 86400),
+        'prior': config.get('HISTORY_PRIOR', (1.0, 1.0)),
+    }
+
+
+def record_history(results, now=None):
+    """批量写入探测明细
+
+    Args:
+        results (dict): {server: metrics}，metrics['probes'] 为每次请求的明细，
+            来自探测结果缓存的明细（cached=True）已经记录过，不再重复写入
+        now (datetime, optional): 探测时间
+    """
+    now = now or timezone.now()
+    rows = []
+    for server, metrics in results.items():
+        probes = (metrics or {}).get('probes') or [{'protocol': 'http', 'success': False, 'latency': None}]
+        for probe in probes:
+            if probe.get('cached'):
+                continue
+            latency = probe.get('latency')
+            rows.append(ScoreHistory(
+                server=server,
+                protocol=probe.get('protocol', 'http')[:8],
+                success=bool(probe.get('success')),
+                latency_ms=int(latency * 1000) if latency is not None else None,
+                probed_at=now,
+            ))
+    ScoreHistory.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def compute_history_scores(servers, timeout=10, now=None):
+    """根据评分历史批量计算代理分数
+
+    Args:
+        servers (list): 代理地址列表
+        timeout (float): 探测超时时间（秒），用于把延迟换算为得分
+        now (datetime, optional): 当前时间
+
+    Returns:
+        dict: {server: score}，窗口期内没有历史记录的代理不会出现在结果中
+    """
+    config = get_history_config()
+    now = now or timezone.now()
+
+    rows = ScoreHistory.objects.filter(
+        server__in=servers,
+        probed_at__gte=now - timedelta(seconds=config['window']),
+    ).values_list('server', 'success', 'latency_ms', 'probed_at')
+
+    prior_a, prior_b = config['prior']
+    return decayed_scores(
+        ((server, success, latency_ms, (now - probed_at).total_seconds())
+         for server, success, latency_ms, probed_at in rows.iterator(chunk_size=2000)),
+        config['half_life'], prior_a, prior_b, timeout,
+    )
+
+
+def compute_adaptive_timeouts(servers, cap, now=None):
+    """根据最近成功探测的延迟百分位数，为每个代理计算探测超时时间
+
+    超时 = 延迟的 TIMEOUT_PERCENTILE 分位数 × TIMEOUT_MULTIPLIER，限制在 [TIMEOUT_FLOOR, cap] 之间。
+    成功样本少于 TIMEOUT_MIN_SAMPLES 个的代理不在结果中，沿用全局超时。
+
+    Args:
+        servers (list): 代理地址列表
+        cap (float): 超时上限（秒），即评分器的全局超时
+        now (datetime, optional): 当前时间
+
+    Returns:
+        dict: {server: 超时秒数}
+    """
+    pool_config = getattr(settings, 'IP_POOL_CONFIG', {})
+    config = get_history_config()
+    now = now or timezone.now()
+    percentile = pool_config.get('TIMEOUT_PERCENTILE', 0.95)
+    multiplier = pool_config.get('TIMEOUT_MULTIPLIER', 3)
+    floor = pool_config.get('TIMEOUT_FLOOR', 1)
+    min_samples = pool_config.get('TIMEOUT_MIN_SAMPLES', 3)
+
+    latencies = {}
+    rows = ScoreHistory.objects.filter(
+        server__in=servers,
+        success=True,
+        latency_ms__isnull=False,
+        probed_at__gte=now - timedelta(seconds=config['window']),
+    ).values_list('server', 'latency_ms')
+    for server, latency_ms in rows.iterator(chunk_size=2000):
+        latencies.setdefault(server, []).append(latency_ms / 1000)
+
+    timeouts = {}
+    for server, values in latencies.items():
+        if len(values) < min_samples:
+            continue
+        timeouts[server] = min(cap, max(floor, latency_quantile(values, percentile) * multiplier))
+    return timeouts
+
+
+def prune_history(now=None):
+    """删除超过保留期的评分历史"""
+    config = get_history_config()
+    now = now or timezone.now()
+    deleted = ScoreHistory.objects.filter(
+        probed_at__lt=now - timedelta(seconds=config['retention'])
+    ).delete()[0]
+    if deleted:
+        logger.info(f"已清理 {deleted} 条过期评分历史")
+    return deleted
@@ -0,0 +1,235 @@
+"""
+评分结果批量写回
+评分探测在事务之外完成，结果按块用多行 UPDATE / DELETE 写回，每条语句最多处理 chunk_size 个代理
+"""
+import logging
+import time
+
+from django.db import connection
+from django.utils import timezone
+from index.models import IpData
+from .score_model import compute_history_scores, record_history
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+WRITE_CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _build_update_sql(chunk, now, failed):
+    """构造一条多行 UPDATE 语句: score 用 CASE server WHEN ... 逐行赋值
+
+    不使用ORM的 Case/When 表达式，避免每块数百个表达式对象在Python端解析编译的开销。
+    now 为None时只更新 score，不改动评分时间和连续失败次数。
+    """
+    qn = connection.ops.quote_name
+    table = qn(IpData._meta.db_table)
+    server_col, score_col = qn('server'), qn('score')
+    fail_col, scored_col = qn('fail_count'), qn('last_scored_at')
+
+    servers = [server for server, _ in chunk]
+    failed = [server for server, _ in chunk if server in failed]
+    in_list = ', '.join(['%s'] * len(servers))
+
+    params = []
+    for server, score in chunk:
+        params.extend((server, score))
+    score_sql = f"{score_col} = CASE {server_col} {' '.join(['WHEN %s THEN %s'] * len(chunk))} ELSE {score_col} END"
+    if now is None:
+        params.extend(servers)
+        return f"UPDATE {table} SET {score_sql} WHERE {server_col} IN ({in_list})", params
+    params.append(connection.ops.adapt_datetimefield_value(now))
+
+    if failed:
+        failed_list = ', '.join(['%s'] * len(failed))
+        fail_expr = f"CASE WHEN {server_col} IN ({failed_list}) THEN {fail_col} + 1 ELSE 0 END"
+        params.extend(failed)
+    else:
+        fail_expr = '0'
+    params.extend(servers)
+
+    sql = (
+        f"UPDATE {table} SET "
+        f"{score_sql}, "
+        f"{scored_col} = %s, "
+        f"{fail_col} = {fail_expr} "
+        f"WHERE {server_col} IN ({in_list})"
+    )
+    return sql, params
+
+
+def write_scores(scores, min_score, now=None, chunk_size=WRITE_CHUNK_SIZE, failed=None):
+    """批量写回评分结果，删除低于最低分数的代理
+
+    Args:
+        scores (dict): {server: score}
+        min_score (int): 最低分数，低于该分数的代理会被删除
+        now (datetime, optional): 评分时间
+        chunk_size (int): 每条SQL语句处理的代理数量
+        failed (set, optional): 本次探测全部失败的代理，累加 fail_count；默认为分数为0的代理
+
+    Returns:
+        tuple: (更新数量, 删除数量)
+    """
+    now = now or timezone.now()
+    if failed is None:
+        failed = {server for server, score in scores.items() if score <= 0}
+    low_score_servers = [server for server, score in scores.items() if score < min_score]
+    keep = [(server, int(score)) for server, score in scores.items() if score >= min_score]
+
+    deleted_count = 0
+    for chunk in _chunks(low_score_servers, chunk_size):
+        deleted_count += IpData.objects.filter(server__in=chunk).delete()[0]
+
+    updated_count = 0
+    with connection.cursor() as cursor:
+        for chunk in _chunks(keep, chunk_size):
+            sql, params = _build_update_sql(chunk, now, failed)
+            cursor.execute(sql, params)
+            updated_count += cursor.rowcount
+
+    return updated_count, deleted_count
+
+
+def update_score_values(scores, chunk_size=WRITE_CHUNK_SIZE):
+    """只批量更新分数，不删除代理，也不改动评分时间和连续失败次数
+
+    Returns:
+        int: 更新数量
+    """
+    updated_count = 0
+    items = [(server, int(score)) for server, score in scores.items()]
+    with connection.cursor() as cursor:
+        for chunk in _chunks(items, chunk_size):
+            sql, params = _build_update_sql(chunk, None, ())
+            cursor.execute(sql, params)
+            updated_count += cursor.rowcount
+    return updated_count
+
+
+CAPABILITY_FIELDS = {
+    'http': 'supports_http',
+    'connect': 'supports_connect',
+    'socks4': 'supports_socks4',
+    'socks5': 'supports_socks5',
+}
+
+
+def write_capabilities(metrics, now=None, chunk_size=WRITE_CHUNK_SIZE):
+    """写回本次探测得出的协议能力
+
+    只写入探测到的能力（True/False），没有探测的协议保留原值。能力相同的代理合并为一条
+    UPDATE，免费代理的能力组合只有少数几种，因此每块只需要几条语句。
+
+    capability_checked_at 是CONNECT能力的验证时间（见 IPScorer.load_protocol_hints），
+    只在本次得出了CONNECT结果时刷新；否则不支持CONNECT的代理每次评分都因为其他协议的探测
+    刷新时间，有效期永远不会过去，HTTPS 再也不会被重新探测。
+
+    Args:
+        metrics (dict): {server: metrics}，metrics['capabilities'] 来自评分器的 summarize
+
+    Returns:
+        int: 更新数量
+    """
+    now = now or timezone.now()
+    groups = {}
+    for server, server_metrics in metrics.items():
+        capabilities = (server_metrics or {}).get('capabilities') or {}
+        values = tuple(sorted(
+            (field, capabilities[key]) for key, field in CAPABILITY_FIELDS.items()
+            if capabilities.get(key) is not None
+        ))
+        if values:
+            groups.setdefault(values, []).append(server)
+
+    updated_count = 0
+    for values, servers in groups.items():
+        fields = dict(values)
+        if 'supports_connect' in fields:
+            fields['capability_checked_at'] = now
+        for chunk in _chunks(servers, chunk_size):
+            updated_count += IpData.objects.filter(server__in=chunk).update(**fields)
+    return updated_count
+
+
+class ScoreWriter:
+    """评分结果的流式写回阶段
+
+    评分器每完成一个代理就调用 add()，结果先放入缓冲区，缓冲区达到 batch_size 个
+    或距上次写回超过 flush_interval 秒时批量写入数据库。这样中途崩溃或超时只会丢失
+    最后一小批结果，爬虫中间件也能在几秒内看到最新分数。
+
+    use_history=True 时先把探测明细写入评分历史，再用 score_model 的时间衰减统计分数
+    代替本次探测的分数写回。保留下来的代理同时写回探测得出的协议能力。
+
+    用法:
+        with ScoreWriter(min_score) as writer:
+            for server, score, metrics in scorer.iter_scores(ip_list, on_idle=writer.flush_if_due):
+                writer.add(server, score, metrics)
+    """
+
+    def __init__(self, min_score, batch_size=50, flush_interval=2.0, chunk_size=WRITE_CHUNK_SIZE,
+                 use_history=False, timeout=10):
+        self.min_score = min_score
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.use_history = use_history  # 是否记录探测明细并用历史统计分数代替单次分数
+        self.timeout = timeout
+        self.buffer = {}
+        self.metrics = {}
+        self.updated_count = 0
+        self.deleted_count = 0
+        self.kept_servers = set()  # 已写回且未被删除的代理，评分收尾时只对这些代理重算综合分数
+        self.last_flush = time.monotonic()
+
+    def add(self, server, score, metrics=None):
+        """加入一个评分结果，满足条件时立即写回"""
+        self.buffer[server] = score
+        self.metrics[server] = metrics
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """距上次写回超过 flush_interval 秒时写回缓冲区
+
+        探测停滞时 add() 不会被调用，评分器等待结果期间也定期调用本方法（见 iter_scores 的 on_idle）
+        """
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的结果写入数据库"""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, {}
+        metrics, self.metrics = self.metrics, {}
+        failed = {server for server, score in buffer.items() if score <= 0}
+        if self.use_history:
+            record_history(metrics)
+            buffer.update(compute_history_scores(list(buffer), timeout=self.timeout))
+        updated, deleted = write_scores(buffer, self.min_score, chunk_size=self.chunk_size, failed=failed)
+        write_capabilities(
+            {server: metrics.get(server) for server, score in buffer.items() if score >= self.min_score},
+            chunk_size=self.chunk_size,
+        )
+        self.updated_count += updated
+        self.deleted_count += deleted
+        self.kept_servers.update(server for server, score in buffer.items() if score >= self.min_score)
+        logger.debug(f"写回 {len(buffer)} 个评分结果: 更新 {updated}, 删除 {deleted}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 即使评分中途出错，也把已经完成的结果写回
+        self.flush()
+        return False
@@ -1,55 +1,204 @@
 import logging
-from django.db import transaction
+import math
+import sys
 from index.models import IpData
 from ..ip_scorer import IPScorer
+from ..probe_policy import ProbeStats
+from ..tcp_prefilter import tcp_prefilter
+from .proxy_pool import publish_proxy_pool, refresh_hot_pool
+from .rescoring import select_rescore_batch
+from .score_model import prune_history
+from .score_writer import WRITE_CHUNK_SIZE, ScoreWriter, update_score_values
 from django.conf import settings
 
 # 设置日志
 logger = logging.getLogger('ip_operator')
 
 
-def start_score():
-    """评分服务"""
+def get_scorer(engine=None):
+    """根据 IP_POOL_CONFIG['SCORER_ENGINE'] 选择评分引擎
+
+    Args:
+        engine (str, optional): 'thread' 使用线程池评分，'async' 使用asyncio评分，
+            为None时读取配置
+    """
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    engine = engine or config.get('SCORER_ENGINE', 'thread')
+
+    if engine == 'async':
+        from ..async_scorer import AsyncIPScorer
+        return AsyncIPScorer(concurrency=config.get('SCORER_CONCURRENCY', 500))
+    if engine != 'thread':
+        logger.warning(f"未知的评分引擎: {engine}，使用线程池评分")
+    return IPScorer()
+
+
+def select_servers(mode=None):
+    """选出本次需要评分的代理
+
+    Args:
+        mode (str, optional): 'full' 重评整个IP池，'incremental' 只重评优先级最高的到期代理，
+            为None时读取 IP_POOL_CONFIG['RESCORE_MODE']
+    """
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    mode = mode or config.get('RESCORE_MODE', 'full')
+    if mode == 'incremental':
+        # 按陈旧程度、可靠性和使用需求挑选到期代理
+        return select_rescore_batch()
+    # 获取所有IP
+    return list(IpData.objects.values_list('server', flat=True))
+
+
+def probe_servers(scorer, ip_list, on_idle=None, idle_interval=1.0):
+    """两阶段探测，按完成顺序逐个产出 (server, score, metrics)
+
+    第一阶段（PREFILTER_ENABLED 开启时）：短超时的TCP连接预筛选，端口不通的代理直接记0分，不再做HTTP探测
+    第二阶段：对存活代理做完整的HTTP/HTTPS探测，on_idle 见 IPScorer.iter_scores
+    SCORE_DEADLINE 从第一阶段开始计时，预筛选的耗时也计入截止时间
+    """
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    scorer.start_deadline()
+    if config.get('PREFILTER_ENABLED', False):
+        alive, dead = tcp_prefilter(
+            ip_list,
+            timeout=config.get('PREFILTER_TIMEOUT', 2),
+            concurrency=config.get('PREFILTER_CONCURRENCY', 1000),
+        )
+        for server in dead:
+            yield server, 0, {'attempts': 0, 'successes': 0,
+                              'probes': [{'protocol': 'tcp', 'success': False, 'latency': None}]}
+        ip_list = [server for server in ip_list if server in alive]
+
+    yield from scorer.iter_scores(ip_list, on_idle=on_idle, idle_interval=idle_interval)
+
+
+def make_writer(timeout, **overrides):
+    """按 IP_POOL_CONFIG 创建评分写回阶段"""
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    options = {
+        'batch_size': config.get('SCORE_FLUSH_SIZE', 50),
+        'flush_interval': config.get('SCORE_FLUSH_INTERVAL', 2),
+        'chunk_size': config.get('SCORE_WRITE_CHUNK_SIZE', WRITE_CHUNK_SIZE),
+        'use_history': config.get('SCORE_MODEL', 'latest') in ('history', 'composite'),
+        'timeout': timeout,
+    }
+    options.update(overrides)
+    return ScoreWriter(config.get('MIN_SCORE', 60), **options)
+
+
+def finish_score(writer, stats):
+    """评分收尾：清理过期历史，按需重算综合分数，发布热门代理池和共享代理池，并记录本次运行的汇总"""
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    if writer.use_history:
+        prune_history()
+    
+    if config.get('SCORE_MODEL') == 'composite' and writer.kept_servers:
+        # 只对本次写回的代理做一次向量化的综合评分，只更新分数，是否删除仍由探测/历史分数决定；
+        # 增量评分和分布式汇总不会因此重算、重写整个IP池
+        from .composite_score import compute_composite_scores
+        composite = compute_composite_scores(sorted(writer.kept_servers), timeout=writer.timeout)
+        update_score_values(composite, chunk_size=writer.chunk_size)
+        logger.info(f"综合评分完成: {len(composite)} 个IP")
+    
+    if writer.deleted_count:
+        logger.warning(f"已删除 {writer.deleted_count} 个低分IP")
+    
+    # 用最新分数重建爬虫读取的热门代理池和共享的Redis代理池
+    refresh_hot_pool()
+    publish_proxy_pool()
+    
+    # 只记录总体结果，不记录每个IP的分数
+    logger.warning(f"IP评分完成: 共更新 {writer.updated_count} 个IP; {stats.summary()}")
+
+
+def start_score(engine=None, mode=None):
+    """评分服务
+    
+    Args:
+        engine (str, optional): 评分引擎，见 get_scorer
+        mode (str, optional): 重评分模式，见 select_servers
+    """
     try:
-        with transaction.atomic():
-            # 获取所有IP
-            ips = IpData.objects.all()
-            ip_list = [ip.server for ip in ips]
-            
-            if not ip_list:
-                logger.warning("IP池为空")
-                return True
-            
-            # 评分
-            scorer = IPScorer()
-            scores = scorer.score_ip_pool(ip_list)
-            
-            min_score = getattr(settings, 'IP_POOL_CONFIG', {}).get('MIN_SCORE', 60)
-            
-            # 批量更新分数
-            updated_count = 0
-            deleted_count = 0
-            low_score_servers = []
-            
-            for server, score in scores.items():
-                IpData.objects.filter(server=server).update(score=score)
-                updated_count += 1
-                
-                # 记录低分IP
-                if score < min_score:
-                    low_score_servers.append(server)
-            
-            # 删除低分IP
-            if low_score_servers:
-                deleted_count = IpData.objects.filter(server__in=low_score_servers).delete()[0]
-                logger.warning(f"已删除 {deleted_count} 个低分IP")
-            
-            # 只记录总体结果，不记录每个IP的分数
-            logger.warning(f"IP评分完成: 共更新 {updated_count} 个IP")
-            
+        ip_list = select_servers(mode)
+        if not ip_list:
+            logger.warning("IP池为空或没有到期需要重评分的IP")
             return True
+        
+        # 评分：网络探测在任何事务之外进行，避免长时间持有行锁
+        # 每个代理探测完成后立即交给写回阶段，按小批量写入数据库
+        scorer = get_scorer(engine)
+        writer = make_writer(scorer.timeout)
+        stats = ProbeStats()
+        with writer:
+            # 探测停滞、迟迟没有新结果时，也按 flush_interval 写回已缓冲的结果
+            idle_interval = max(0.1, min(1.0, writer.flush_interval))
+            for server, score, metrics in probe_servers(scorer, ip_list, on_idle=writer.flush_if_due,
+                                                        idle_interval=idle_interval):
+                stats.add(metrics)
+                writer.add(server, score, metrics)
+        
+        finish_score(writer, stats)
+        return True
     except Exception as e:
         logger.error(f"评分失败: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        return False 
\ No newline at end of file
+        return False
+
+
+def split_chunks(ip_list, chunk_size, parallelism):
+    """把代理列表切分为子任务，每块最多 chunk_size 个，
+    块数超过 parallelism 时增大块大小，使子任务数量不超过 parallelism"""
+    if not ip_list:
+        return []
+    chunk_size = max(1, chunk_size)
+    if parallelism and math.ceil(len(ip_list) / chunk_size) > parallelism:
+        chunk_size = math.ceil(len(ip_list) / parallelism)
+    return [ip_list[i:i + chunk_size] for i in range(0, len(ip_list), chunk_size)]
+
+
+def score_chunk(servers, engine=None):
+    """分布式评分的子任务：只探测，不写数据库
+
+    子任务出错时记录日志并返回已完成的结果，而不是抛出异常：chord 中任何一个子任务失败，
+    汇总任务都不会执行，其他子任务的探测结果会全部丢失。
+
+    Returns:
+        list: [[server, score, metrics], ...]，可直接被Celery的JSON序列化
+    """
+    results = []
+    try:
+        scorer = get_scorer(engine)
+        for server, score, metrics in probe_servers(scorer, servers):
+            results.append([server, score, metrics])
+    except Exception as e:
+        logger.error(f"评分子任务失败: {e}，保留已完成的 {len(results)}/{len(servers)} 个结果")
+        import traceback
+        logger.error(traceback.format_exc())
+    return results
+
+
+def aggregate_scores(chunk_results, engine=None):
+    """分布式评分的汇总：合并所有子任务的结果，一次性批量写回
+
+    Args:
+        chunk_results (list): 各子任务 score_chunk 的返回值
+    """
+    try:
+        scorer = get_scorer(engine)
+        # 汇总时结果已全部到齐，不需要按时间小批量写回
+        writer = make_writer(scorer.timeout, batch_size=sys.maxsize, flush_interval=math.inf)
+        stats = ProbeStats()
+        with writer:
+            for results in chunk_results:
+                for server, score, metrics in results or ():
+                    stats.add(metrics)
+                    writer.add(server, score, metrics)
+        
+        finish_score(writer, stats)
+        return True
+    except Exception as e:
+        logger.error(f"汇总评分结果失败: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return False
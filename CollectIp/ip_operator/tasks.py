@@ -4,7 +4,7 @@ import json
 import logging
 import subprocess
 import traceback
-from celery import shared_task
+from celery import chord, group, shared_task
 from django.conf import settings
 from pathlib import Path
 import redis
@@ -242,14 +242,77 @@ def crawl_douban_task(movie_name, strategy="sequential", max_pages=2, **kwargs):
     return run_spider_task.delay('douban_spider', movie_name=movie_name, **params)
 
 @shared_task
-def score_ip_task():
-    """IP评分任务"""
+def score_ip_task(engine=None, fanout=None):
+    """
+    IP评分任务
+    
+    Args:
+        engine: 评分引擎，可选值有 thread, async；为None时使用 IP_POOL_CONFIG['SCORER_ENGINE']
+        fanout: 是否把IP池分块分发到多个worker评分；为None时使用 IP_POOL_CONFIG['SCORE_FANOUT']
+    """
     try:
         logger.info("开始执行IP评分任务")
-        from .services.scorer import start_score
-        result = start_score()
+        config = getattr(settings, 'IP_POOL_CONFIG', {})
+        if fanout is None:
+            fanout = config.get('SCORE_FANOUT', False)
+        if fanout:
+            result = start_fanout_score(engine=engine)
+        else:
+            from .services.scorer import start_score
+            result = start_score(engine=engine)
         logger.info(f"IP评分任务完成: {result}")
         return result
     except Exception as e:
         logger.error(f"IP评分任务执行失败: {str(e)}", exc_info=True)
-        return None 
\ No newline at end of file
+        return None
+
+def start_fanout_score(engine=None, mode=None):
+    """
+    分布式评分：把待评分的IP切分成块，以chord分发给所有worker并行探测，
+    全部完成后由 aggregate_scores_task 汇总并批量写回
+    
+    Returns:
+        dict: 分发结果，包含子任务数量和chord的任务ID
+    """
+    from .services.scorer import select_servers, split_chunks
+    
+    config = getattr(settings, 'IP_POOL_CONFIG', {})
+    ip_list = select_servers(mode)
+    chunks = split_chunks(
+        ip_list,
+        config.get('FANOUT_CHUNK_SIZE', 500),
+        config.get('FANOUT_PARALLELISM', 8),
+    )
+    if not chunks:
+        logger.warning("IP池为空或没有到期需要重评分的IP")
+        return {'status': 'skipped', 'reason': 'empty_pool'}
+    
+    header = group(score_chunk_task.s(chunk, engine) for chunk in chunks)
+    result = chord(header)(aggregate_scores_task.s(engine))
+    logger.info(f"分布式评分已分发: {len(ip_list)} 个IP, {len(chunks)} 个子任务")
+    return {'status': 'dispatched', 'chunks': len(chunks), 'servers': len(ip_list), 'task_id': result.id}
+
+@shared_task
+def score_chunk_task(servers, engine=None):
+    """
+    分布式评分子任务：探测一块IP，返回结果交给汇总任务，不写数据库
+    
+    Args:
+        servers: 本块的代理地址列表
+        engine: 评分引擎
+    """
+    from .services.scorer import score_chunk
+    logger.info(f"开始评分子任务: {len(servers)} 个IP")
+    return score_chunk(servers, engine)
+
+@shared_task
+def aggregate_scores_task(chunk_results, engine=None):
+    """
+    分布式评分汇总任务：合并所有子任务结果并批量写回
+    
+    Args:
+        chunk_results: 各子任务的返回值列表
+        engine: 评分引擎，用于确定超时时间等评分参数
+    """
+    from .services.scorer import aggregate_scores
+    return aggregate_scores(chunk_results, engine)
@@ -0,0 +1,77 @@
+"""
+TCP连接预筛选
+在完整的HTTP/HTTPS探测之前，先对所有 ip:port 并发发起非阻塞TCP连接，
+连接被拒绝或在短超时内无响应的代理直接判定为失效，不再进入耗时的HTTP探测阶段。
+"""
+import asyncio
+import logging
+import time
+
+from .score_kernel import parse_proxy
+
+# 设置日志
+logger = logging.getLogger('ip_operator')
+
+
+async def tcp_connect(server, timeout):
+    """尝试与代理建立TCP连接，返回连接耗时（秒），失败返回None"""
+    address = parse_proxy(server)
+    if address is None:
+        return None
+    start_time = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(*address), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed_time = time.monotonic() - start_time
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return elapsed_time
+
+
+async def async_tcp_prefilter(ip_list, timeout=2.0, concurrency=1000):
+    """并发探测所有代理的TCP端口
+
+    Returns:
+        tuple: (alive, dead)，alive 为 {server: 连接耗时}，dead 为失效代理列表
+    """
+    semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+
+    async def check(server):
+        async with semaphore:
+            return server, await tcp_connect(server, timeout)
+
+    alive, dead = {}, []
+    for server, elapsed_time in await asyncio.gather(*(check(server) for server in ip_list)):
+        if elapsed_time is None:
+            dead.append(server)
+        else:
+            alive[server] = elapsed_time
+    return alive, dead
+
+
+def tcp_prefilter(ip_list, timeout=2.0, concurrency=1000):
+    """TCP预筛选的同步入口，在独立的事件循环中运行
+
+    Args:
+        ip_list (list): 代理地址列表
+        timeout (float): 单个TCP连接的超时时间（秒）
+        concurrency (int): 同时进行的连接数量上限，注意不要超过进程的文件描述符上限
+
+    Returns:
+        tuple: (alive, dead)，alive 为 {server: 连接耗时}，dead 为失效代理列表
+    """
+    ip_list = list(ip_list)
+    if not ip_list:
+        return {}, []
+
+    start_time = time.monotonic()
+    alive, dead = asyncio.run(async_tcp_prefilter(ip_list, timeout, concurrency))
+    logger.info(
+        f"TCP预筛选完成: {len(ip_list)} 个IP, 存活 {len(alive)}, 失效 {len(dead)}, "
+        f"耗时 {time.monotonic() - start_time:.1f}秒"
+    )
+    return alive, dead
@@ -0,0 +1,591 @@
+import asyncio
+import importlib.util
+import random
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from index.models import IpData
+from .async_scorer import AsyncIPScorer
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, ProxyBreaker
+from .crawl_ip.crawl_ip.crawl_ip.middlewares import HedgedRequestMiddleware, ProxyFeedback, ProxyMiddleware
+from .domain_bandit import DomainBandit
+from .inflight import InflightTracker
+from .ip_scorer import IPScorer
+from .probe_policy import TLS
+from .probe_server import ProbeServer
+from .proxy_farm import ProxyFarm
+from .redis_pool import RedisProxyPool
+from .services.composite_score import composite_scores, compute_composite_scores
+from .services.rescoring import select_rescore_batch
+from .services.score_writer import ScoreWriter, _build_update_sql, update_score_values, write_capabilities, write_scores
+from .services.scorer import aggregate_scores, probe_servers, score_chunk
+from .weighted_pool import WeightedPool
+
+TEST_POOL_CONFIG = {'CAPABILITY_TTL': 3600, 'PROBE_CACHE_TTL': 0}
+
+
+@override_settings(IP_POOL_CONFIG=TEST_POOL_CONFIG)
+class CapabilityTTLTests(TestCase):
+    """不支持CONNECT的结论过期后重新探测HTTPS"""
+
+    server = '10.0.0.1:8080'
+
+    def setUp(self):
+        self.checked_at = timezone.now() - timedelta(minutes=50)
+        IpData.objects.create(server=self.server, ssl='yes', supports_connect=False,
+                              capability_checked_at=self.checked_at)
+        self.scorer = IPScorer()
+
+    def https_probed(self):
+        hint = self.scorer.load_protocol_hints([self.server])[self.server]
+        return any(url.startswith('https:') for url in self.scorer.select_test_urls(hint))
+
+    def test_other_capabilities_do_not_renew_connect_verdict(self):
+        self.assertFalse(self.https_probed())
+        # 本次评分没有探测HTTPS，只得出了HTTP和SOCKS能力
+        write_capabilities({self.server: {'capabilities': {'http': True, 'connect': None, 'socks5': False}}})
+        proxy = IpData.objects.get(server=self.server)
+        self.assertTrue(proxy.supports_http)
+        self.assertEqual(proxy.capability_checked_at, self.checked_at)
+
+    def test_expired_connect_verdict_probes_https_again(self):
+        write_capabilities({self.server: {'capabilities': {'http': True, 'connect': None}}})
+        # 距上次验证CONNECT超过有效期
+        later = timezone.now() + timedelta(minutes=20)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertTrue(self.https_probed())
+            # 重新探测后得出的CONNECT结果刷新验证时间
+            write_capabilities({self.server: {'capabilities': {'http': True, 'connect': False}}})
+            self.assertFalse(self.https_probed())
+
+
+@override_settings(IP_POOL_CONFIG=TEST_POOL_CONFIG)
+class AsyncTLSClassificationTests(TestCase):
+    """异步引擎经代理访问HTTPS时，TLS握手失败归类为TLS并跳过其余HTTPS探测"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.judge = ProbeServer('127.0.0.1', 0).start_in_thread()
+        cls.farm = ProxyFarm(1, modes={'bad_tls': 1.0}).start_in_thread()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.farm.stop()
+        cls.judge.stop()
+        super().tearDownClass()
+
+    def test_bad_tls_proxy_blocks_https(self):
+        scorer = AsyncIPScorer(concurrency=1)
+        # bad_tls 代理回复 CONNECT 后发送垃圾数据，不会连接HTTPS目标，目标地址无需可用
+        scorer.use_probe_target(self.judge.http_url, 'https://127.0.0.1:9/judge')
+        scorer.https_test_urls.append('https://127.0.0.1:9/judge?retry=1')
+        scorer.timeout = 3
+
+        [(server, score, metrics)] = list(scorer.iter_scores(self.farm.servers))
+        outcomes = [probe['outcome'] for probe in metrics['probes']]
+        self.assertEqual(outcomes, ['ok', TLS])
+        self.assertEqual(metrics['skipped'], 1)
+        self.assertFalse(metrics['capabilities']['connect'])
+        self.assertGreater(score, 0)
+
+
+@override_settings(IP_POOL_CONFIG=dict(TEST_POOL_CONFIG, MIN_SCORE=60, PREFILTER_ENABLED=False))
+class ScoreChunkFailureTests(TestCase):
+    """分布式评分中一个子任务出错时，其他子任务的结果仍然写回"""
+
+    chunks = [['10.0.1.1:80', '10.0.1.2:80'], ['10.0.2.1:80', '10.0.2.2:80']]
+
+    def setUp(self):
+        for chunk in self.chunks:
+            for server in chunk:
+                IpData.objects.create(server=server, score=70)
+
+    @staticmethod
+    def probe_servers(scorer, servers):
+        for server in servers:
+            if server == '10.0.2.2:80':
+                raise RuntimeError('数据库连接中断')
+            yield server, 90, {'attempts': 1, 'successes': 1, 'probes': []}
+
+    def test_failing_chunk_keeps_other_results(self):
+        with mock.patch('ip_operator.services.scorer.probe_servers', self.probe_servers), \
+                mock.patch('ip_operator.services.scorer.publish_proxy_pool'):
+            results = [score_chunk(chunk, 'thread') for chunk in self.chunks]
+            # 出错的子任务返回出错前已完成的结果
+            self.assertEqual([server for server, _, _ in results[1]], ['10.0.2.1:80'])
+            self.assertTrue(aggregate_scores(results, 'thread'))
+
+        scores = dict(IpData.objects.values_list('server', 'score'))
+        self.assertEqual(scores, {'10.0.1.1:80': 90, '10.0.1.2:80': 90, '10.0.2.1:80': 90, '10.0.2.2:80': 70})
+
+
+@override_settings(IP_POOL_CONFIG=TEST_POOL_CONFIG)
+class StalledProbeFlushTests(TestCase):
+    """探测停滞时，已缓冲的结果按 flush_interval 写回，不等下一个结果到来"""
+
+    fast, slow = '10.0.3.1:80', '10.0.3.2:80'
+
+    def setUp(self):
+        IpData.objects.create(server=self.fast, score=70)
+        IpData.objects.create(server=self.slow, score=70)
+
+    def probe_single_ip(self, ip, hint=None):
+        if ip == self.slow:
+            time.sleep(0.6)
+        return 90, {}
+
+    async def aiter_scores(self, ip_list, protocol_hints=None):
+        for ip in ip_list:
+            if ip == self.slow:
+                await asyncio.sleep(0.6)
+            yield ip, 90, {}
+
+    def assert_flushed_while_stalled(self, scorer):
+        fast_score_when_slow_arrived = None
+        with mock.patch.object(scorer, 'prepare', return_value={}), \
+                ScoreWriter(60, flush_interval=0.2) as writer:
+            for server, score, metrics in scorer.iter_scores([self.fast, self.slow], on_idle=writer.flush_if_due,
+                                                             idle_interval=0.1):
+                if server == self.slow:
+                    fast_score_when_slow_arrived = IpData.objects.get(server=self.fast).score
+                writer.add(server, score, metrics)
+        self.assertEqual(fast_score_when_slow_arrived, 90)
+
+    def test_thread_engine(self):
+        scorer = IPScorer()
+        with mock.patch.object(scorer, 'probe_single_ip', self.probe_single_ip):
+            self.assert_flushed_while_stalled(scorer)
+
+    def test_async_engine(self):
+        scorer = AsyncIPScorer(concurrency=2)
+        with mock.patch.object(scorer, 'aiter_scores', self.aiter_scores), \
+                mock.patch.object(scorer, 'store_probes'):
+            self.assert_flushed_while_stalled(scorer)
+
+
+@override_settings(IP_POOL_CONFIG=dict(TEST_POOL_CONFIG, SCORE_DEADLINE=1, PREFILTER_ENABLED=True))
+class PrefilterDeadlineTests(TestCase):
+    """评分截止时间从TCP预筛选之前开始计时"""
+
+    @staticmethod
+    def tcp_prefilter(ip_list, **kwargs):
+        time.sleep(0.4)
+        return {server: 0.01 for server in ip_list}, []
+
+    def test_prefilter_counts_against_deadline(self):
+        scorer = IPScorer()
+        remaining = []
+
+        def probe_single_ip(ip, hint=None):
+            remaining.append(scorer.remaining_time())
+            return 90, {}
+
+        with mock.patch('ip_operator.services.scorer.tcp_prefilter', self.tcp_prefilter), \
+                mock.patch.object(scorer, 'probe_single_ip', probe_single_ip), \
+                mock.patch.object(scorer, 'detect_real_ip'):
+            results = list(probe_servers(scorer, ['10.0.4.1:80']))
+
+        self.assertEqual([server for server, _, _ in results], ['10.0.4.1:80'])
+        self.assertLess(remaining[0], 0.7)
+        # 本次评分结束后截止时间清除，下次评分重新计时
+        self.assertIsNone(scorer.deadline)
+
+
+@override_settings(IP_POOL_CONFIG=dict(TEST_POOL_CONFIG, PROXY_INFLIGHT_TIERS={80: 3, 60: 2}))
+class InflightTierTests(TestCase):
+    """在途上限只有一份档位定义，低于所有档位的代理不比最低一档宽松"""
+
+    def test_unmatched_score_uses_lowest_tier(self):
+        tracker = InflightTracker()
+        tracker.set_scores({'10.0.5.1:80': 90, '10.0.5.2:80': 10})
+        self.assertEqual(tracker.limit('10.0.5.1:80'), 3)
+        self.assertEqual(tracker.limit('10.0.5.2:80'), 2)
+        # 不在代理池快照中的代理同样使用最低一档
+        self.assertEqual(tracker.limit('10.0.5.3:80'), 2)
+        for _ in range(2):
+            tracker.acquire('10.0.5.2:80')
+        self.assertTrue(tracker.saturated('10.0.5.2:80'))
+
+
+class DomainBanditSelectionTests(TestCase):
+    """按域名的Thompson采样：成败记录更新后验，选择偏向在该域名表现好的代理"""
+
+    def test_update_posterior_and_decay(self):
+        bandit = DomainBandit(prior=(1.0, 1.0), half_life=100)
+        self.assertEqual(bandit.posterior('a.com', 'p1', now=0), (1.0, 1.0))
+        bandit.update('a.com', 'p1', True, now=0)
+        bandit.update('a.com', 'p1', True, now=0)
+        bandit.update('a.com', 'p1', False, now=0)
+        self.assertEqual(bandit.posterior('a.com', 'p1', now=0), (3.0, 2.0))
+        # 计数按半衰期衰减
+        alpha, beta = bandit.posterior('a.com', 'p1', now=100)
+        self.assertAlmostEqual(alpha, 2.0)
+        self.assertAlmostEqual(beta, 1.5)
+        # 其他域名不受影响
+        self.assertEqual(bandit.posterior('b.com', 'p1', now=0), (1.0, 1.0))
+
+    def test_choose_prefers_proxies_good_for_the_domain(self):
+        bandit = DomainBandit(half_life=0, rng=random.Random(7))
+        for _ in range(20):
+            bandit.update('a.com', 'good', True)
+            bandit.update('a.com', 'bad', False)
+            bandit.update('b.com', 'good', False)
+            bandit.update('b.com', 'bad', True)
+
+        picks = [bandit.choose('a.com', ['good', 'bad']) for _ in range(200)]
+        self.assertGreater(picks.count('good'), 190)
+        picks = [bandit.choose('b.com', ['good', 'bad']) for _ in range(200)]
+        self.assertGreater(picks.count('bad'), 190)
+        self.assertIsNone(bandit.choose('a.com', []))
+
+
+@override_settings(IP_POOL_CONFIG=TEST_POOL_CONFIG)
+class DomainBanditRetentionTests(TestCase):
+    """按域名的成败记录不随代理轮换无限增长"""
+
+    def test_per_domain_cap_drops_least_recently_updated(self):
+        bandit = DomainBandit(max_proxies=2)
+        bandit.update('a.com', 'p1', True, now=0)
+        bandit.update('a.com', 'p2', True, now=1)
+        bandit.update('a.com', 'p1', False, now=2)
+        bandit.update('a.com', 'p3', True, now=3)
+        self.assertEqual(list(bandit.stats['a.com']), ['p1', 'p3'])
+
+    def test_rotated_out_proxies_are_forgotten(self):
+        middleware = ProxyMiddleware('localhost', 'user', 'password', 'db')
+        middleware.set_proxy_list([('p1:80', True, 90), ('p2:80', True, 90)])
+        middleware.bandit.update('a.com', 'p1:80', True)
+        middleware.bandit.update('b.com', 'p2:80', False)
+
+        middleware.set_proxy_list([('p2:80', True, 90), ('p3:80', True, 90)])
+        self.assertEqual(middleware.bandit.stats, {'b.com': mock.ANY})
+        self.assertEqual(list(middleware.bandit.stats['b.com']), ['p2:80'])
+
+
+class ProxyFeedbackFlushTests(TestCase):
+    """反馈写回时并发重新评分，且每次重新评分的代理数量有上限"""
+
+    def test_rescoring_is_parallel_and_bounded(self):
+        scorer = mock.Mock()
+        scorer.test_single_ip.side_effect = lambda proxy: time.sleep(0.3) or 80
+        connection = mock.MagicMock()
+        feedback = ProxyFeedback(lambda: connection, scorer, workers=10, max_rescore=10)
+        for i in range(15):
+            feedback.record(f'10.0.6.{i}:80', success=True)
+        feedback.record('10.0.6.99:80', success=False)
+
+        start = time.monotonic()
+        self.assertEqual(feedback.flush(), 16)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(scorer.test_single_ip.call_count, 10)
+
+        sql, params = connection.cursor.return_value.__enter__.return_value.execute.call_args[0]
+        # 重新评分的10个代理写入新分数，失败的代理置0，其余代理保留原分数
+        self.assertEqual(sql.count('WHEN %s THEN %s'), 11 + 16)
+        connection.commit.assert_called_once()
+
+
+class WeightedPoolTests(TestCase):
+    """树状数组代理池：增删后前缀和与重建一致，抽样频率与权重成正比"""
+
+    def assertTreeConsistent(self, pool):
+        rebuilt = WeightedPool(pool.items())
+        for key in pool:
+            self.assertEqual(pool.weight(key), rebuilt.weight(key))
+        self.assertAlmostEqual(pool.total, rebuilt.total)
+        self.assertAlmostEqual(pool._prefix_sum(len(pool.keys)), pool.total)
+
+    def test_add_update_remove(self):
+        pool = WeightedPool([('a', 1), ('b', 2), ('c', 0)])
+        self.assertEqual(sorted(pool), ['a', 'b'])
+
+        for i in range(10):
+            pool.add(f'p{i}', i + 1)
+        pool.update('a', 5)
+        pool.update('b', 0)  # 权重不大于0时移除
+        pool.remove('p3')
+        pool.remove('missing')
+        self.assertNotIn('b', pool)
+        self.assertNotIn('p3', pool)
+        self.assertEqual(len(pool), 10)
+        self.assertEqual(pool.total, 5 + sum(range(1, 11)) - 4)
+        self.assertTreeConsistent(pool)
+
+        # 空槽位超过一半时整体重建
+        slots = len(pool.keys)
+        for i in range(8):
+            pool.remove(f'p{i}')
+        self.assertEqual(sorted(pool), ['a', 'p8', 'p9'])
+        self.assertLess(len(pool.keys), slots)
+        self.assertLessEqual(len(pool.keys), 2 * len(pool))
+        self.assertTreeConsistent(pool)
+
+    def test_sample_follows_weights(self):
+        pool = WeightedPool()
+        for key, weight in (('a', 1), ('b', 3), ('c', 6), ('d', 4)):
+            pool.add(key, weight)
+        pool.remove('d')
+        rng = random.Random(42)
+        draws = 30000
+        counts = {key: 0 for key in pool}
+        for _ in range(draws):
+            counts[pool.sample(rng)] += 1
+        for key, expected in (('a', 0.1), ('b', 0.3), ('c', 0.6)):
+            self.assertAlmostEqual(counts[key] / draws, expected, delta=0.02)
+
+        self.assertIsNone(WeightedPool().sample(rng))
+
+
+class ProxyBreakerTests(TestCase):
+    """熔断器：熔断到期进入 half_open，只放行一个试探请求，试探结果决定恢复或加倍熔断"""
+
+    def test_half_open_transition(self):
+        breaker = ProxyBreaker(failure_threshold=2, base_delay=10, max_delay=100, trial_timeout=5)
+        proxy = '1.1.1.1:80'
+
+        self.assertFalse(breaker.failure(proxy, now=0))
+        self.assertEqual(breaker.state(proxy, now=0), CLOSED)
+        self.assertTrue(breaker.failure(proxy, now=1))
+        self.assertEqual(breaker.state(proxy, now=5), OPEN)
+        self.assertFalse(breaker.available(proxy, now=5))
+        self.assertEqual(breaker.pop_due(now=5), [])
+
+        # 熔断到期：half_open，只放行一个试探请求
+        self.assertEqual(breaker.pop_due(now=11), [proxy])
+        self.assertEqual(breaker.state(proxy, now=11), HALF_OPEN)
+        self.assertTrue(breaker.available(proxy, now=11))
+        breaker.acquire(proxy, now=11)
+        self.assertFalse(breaker.available(proxy, now=12))
+        # 试探请求迟迟没有结果时允许再次试探
+        self.assertTrue(breaker.available(proxy, now=16))
+
+        # 试探失败：再次熔断，时长翻倍
+        self.assertTrue(breaker.failure(proxy, now=16))
+        self.assertEqual(breaker.state(proxy, now=35), OPEN)
+        self.assertEqual(breaker.pop_due(now=36), [proxy])
+
+        # 试探成功：恢复为 closed 并清除记录
+        breaker.acquire(proxy, now=36)
+        breaker.success(proxy)
+        self.assertEqual(breaker.state(proxy, now=36), CLOSED)
+        self.assertNotIn(proxy, breaker.entries)
+        self.assertFalse(breaker.failure(proxy, now=37))
+
+
+@override_settings(IP_POOL_CONFIG={'RESCORE_BASE_INTERVAL': 1000, 'RESCORE_MAX_BACKOFF': 6})
+class RescoreBatchTests(TestCase):
+    """增量重评分：只选已到期的代理，按优先级从高到低排列并截取前N个"""
+
+    def setUp(self):
+        self.now = timezone.now()
+
+        def proxy(server, age=None, **fields):
+            last_scored_at = None if age is None else self.now - timedelta(seconds=age)
+            IpData.objects.create(server=server, last_scored_at=last_scored_at, **fields)
+
+        proxy('10.0.0.1:80')                                     # 从未评分，最优先
+        proxy('10.0.0.2:80', age=4000, score=100)                # 陈旧4倍，可靠
+        proxy('10.0.0.3:80', age=4000, score=0)                  # 陈旧4倍，分数低
+        proxy('10.0.0.4:80', age=2000, score=100, use_count=50)  # 陈旧2倍，使用频繁
+        proxy('10.0.0.5:80', age=3000, score=100, fail_count=2)  # 连续失败，退避后尚未到期
+        proxy('10.0.0.6:80', age=500, score=100)                 # 尚未到期
+
+    def test_orders_due_proxies_by_priority(self):
+        self.assertEqual(select_rescore_batch(limit=10, now=self.now), [
+            '10.0.0.1:80', '10.0.0.4:80', '10.0.0.2:80', '10.0.0.3:80',
+        ])
+
+    def test_limit_keeps_highest_priorities(self):
+        self.assertEqual(select_rescore_batch(limit=2, now=self.now), ['10.0.0.1:80', '10.0.0.4:80'])
+
+
+class WriteScoresTests(TestCase):
+    """多行 CASE UPDATE：按块逐行写入分数、评分时间和连续失败次数，低分代理被删除"""
+
+    def setUp(self):
+        for i, fail_count in enumerate((0, 3, 1, 0, 0)):
+            IpData.objects.create(server=f'10.0.0.{i}:80', score=50, fail_count=fail_count)
+
+    def test_update_sql_shape(self):
+        sql, params = _build_update_sql([('a:1', 80), ('b:2', 70)], timezone.now(), {'b:2'})
+        self.assertEqual(sql.count('WHEN %s THEN %s'), 2)
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertEqual(params[:4], ['a:1', 80, 'b:2', 70])
+        self.assertEqual(params[-3:], ['b:2', 'a:1', 'b:2'])
+
+        sql, params = _build_update_sql([('a:1', 80)], None, ())
+        self.assertNotIn('fail_count', sql)
+        self.assertEqual(params, ['a:1', 80, 'a:1'])
+
+    def test_write_scores_in_chunks(self):
+        now = timezone.now()
+        scores = {'10.0.0.0:80': 90, '10.0.0.1:80': 70, '10.0.0.2:80': 65, '10.0.0.3:80': 10}
+        updated, deleted = write_scores(scores, min_score=60, now=now, chunk_size=2, failed={'10.0.0.1:80'})
+        self.assertEqual((updated, deleted), (3, 1))
+
+        rows = {row.server: row for row in IpData.objects.all()}
+        self.assertNotIn('10.0.0.3:80', rows)
+        self.assertEqual({server: row.score for server, row in rows.items()},
+                         {'10.0.0.0:80': 90, '10.0.0.1:80': 70, '10.0.0.2:80': 65, '10.0.0.4:80': 50})
+        self.assertEqual({server: row.fail_count for server, row in rows.items()},
+                         {'10.0.0.0:80': 0, '10.0.0.1:80': 4, '10.0.0.2:80': 0, '10.0.0.4:80': 0})
+        self.assertEqual(rows['10.0.0.0:80'].last_scored_at, now)
+        self.assertIsNone(rows['10.0.0.4:80'].last_scored_at)
+
+    def test_update_score_values_only_touches_score(self):
+        self.assertEqual(update_score_values({'10.0.0.1:80': 88, '10.0.0.2:80': 77}, chunk_size=1), 2)
+        row = IpData.objects.get(server='10.0.0.1:80')
+        self.assertEqual((row.score, row.fail_count, row.last_scored_at), (88, 3, None))
+
+
+@skipUnless(importlib.util.find_spec('fakeredis') and importlib.util.find_spec('lupa'),
+            '需要 fakeredis 和 lupa 执行Lua脚本')
+class RedisProxyPoolTests(TestCase):
+    """共享代理池的Lua租用/归还：按分数档位限制在途请求，归还时调整权重"""
+
+    def setUp(self):
+        import fakeredis
+        self.client = fakeredis.FakeRedis()
+        self.pool = RedisProxyPool(self.client, prefix='test', lease_ttl=60, min_weight=5, alpha=0.5,
+                                   timeout=10, inflight_tiers={80: 2, 0: 1})
+        self.pool.publish([('a:80', 90, True), ('b:80', 50, False)])
+
+    def test_lease_respects_inflight_limits(self):
+        self.assertEqual(self.pool.size('https'), 1)
+        self.assertEqual(sorted(self.pool.lease('http') for _ in range(3)), ['a:80', 'a:80', 'b:80'])
+        self.assertIsNone(self.pool.lease('http'))
+        self.assertIsNone(self.pool.lease('https'))  # https 池只有 a，已达上限
+        self.assertEqual((self.pool.inflight('a:80'), self.pool.inflight('b:80')), (2, 1))
+        self.assertLessEqual(self.client.ttl('test:inflight:a:80'), 60)
+
+        self.pool.release('b:80', None)
+        self.assertEqual(self.pool.inflight('b:80'), 0)
+        self.assertFalse(self.client.exists('test:inflight:b:80'))
+        self.assertEqual(self.pool.lease('http'), 'b:80')
+
+    def test_release_adjusts_weight(self):
+        self.pool.lease('http')
+        self.pool.release('a:80', True, latency=0)
+        self.assertAlmostEqual(self.client.zscore('test:http', 'a:80'), 95)   # 向目标值100靠拢
+        self.assertAlmostEqual(self.client.zscore('test:https', 'a:80'), 95)
+
+        self.pool.release('b:80', False)
+        self.assertAlmostEqual(self.client.zscore('test:http', 'b:80'), 25)   # 失败时权重减半
+        for _ in range(3):
+            self.pool.release('b:80', False)
+        self.assertIsNone(self.client.zscore('test:http', 'b:80'))  # 低于 min_weight 时移出池
+        self.assertEqual(self.pool.inflight('b:80'), 0)
+
+
+class CompositeScoreTests(TestCase):
+    """综合评分：速度越小越好，只计算写回的代理时不计新鲜度"""
+
+    SPEED_ONLY = {'latency': 0, 'success': 0, 'speed': 1, 'uptime': 0, 'freshness': 0}
+
+    @staticmethod
+    def speed_metrics(speeds):
+        count = len(speeds)
+        return {
+            'server': [f'10.0.0.{i}:80' for i in range(count)],
+            'ping_ms': np.full(count, np.nan), 'speed': np.array(speeds, dtype=float),
+            'uptime': np.full(count, np.nan), 'age': np.full(count, np.nan),
+            'attempts': np.zeros(count), 'successes': np.zeros(count), 'latency': np.full(count, np.nan),
+        }
+
+    def test_lower_speed_ranks_higher(self):
+        scores = composite_scores(self.speed_metrics([10, 1, 5]), weights=self.SPEED_ONLY)
+        self.assertEqual(scores.tolist(), [33, 100, 67])
+
+        reference = np.array([1.0, 2.0, 5.0, 10.0])
+        scores = composite_scores(self.speed_metrics([1, 10]), weights=self.SPEED_ONLY, speed_reference=reference)
+        self.assertEqual(scores.tolist(), [100, 25])
+
+    @override_settings(IP_POOL_CONFIG={
+        'COMPOSITE_WEIGHTS': {'latency': 0, 'success': 0, 'speed': 0, 'uptime': 1, 'freshness': 1},
+    })
+    def test_subset_ignores_freshness(self):
+        IpData.objects.create(server='10.0.0.1:80', uptime1='90%', last_scored_at=timezone.now() - timedelta(days=10))
+
+        self.assertEqual(compute_composite_scores(['10.0.0.1:80']), {'10.0.0.1:80': 90})
+        # 计算整个IP池时，十天未评分的代理新鲜度接近0
+        self.assertEqual(compute_composite_scores(), {'10.0.0.1:80': 45})
+
+
+class FixedDelayHedge(HedgedRequestMiddleware):
+    """不需要积累响应耗时样本，等待0.3秒后对冲"""
+
+    def hedge_delay(self, domain):
+        return 0.3
+
+
+class FarmProxyMiddleware:
+    """原请求使用不响应的代理，对冲请求使用正常的代理，并记录到达本中间件的异常"""
+
+    proxies = {}
+    exceptions = []
+
+    def process_request(self, request, spider):
+        request.meta['proxy'] = f"http://{self.proxies[request.meta['hedge_attempt']]}"
+
+    def process_exception(self, request, exception, spider):
+        self.exceptions.append((request.meta['hedge_attempt'], type(exception)))
+
+
+class HedgeAbortTests(TestCase):
+    """对冲请求中落败一方的传输被中止，连接关闭后才把异常交给下载中间件（归还代理）"""
+
+    def test_loser_connection_is_closed(self):
+        from scrapy import Spider
+        from scrapy.crawler import CrawlerProcess
+        from twisted.internet.defer import CancelledError
+
+        judge = ProbeServer('127.0.0.1', 0).start_in_thread()
+        hang = ProxyFarm(1, modes={'hang': 1.0}).start_in_thread()
+        ok = ProxyFarm(1, modes={'ok': 1.0}).start_in_thread()
+        hang_proxy = hang.proxies[0]
+        self.addCleanup(judge.stop)
+        self.addCleanup(hang.stop)
+        self.addCleanup(ok.stop)
+        FarmProxyMiddleware.proxies = {'primary': hang.servers[0], 'hedge': ok.servers[0]}
+        responses = []
+
+        class JudgeSpider(Spider):
+            name = 'hedge_abort'
+            start_urls = [judge.http_url]
+
+            def parse(self, response):
+                responses.append(response.status)
+
+        module = 'ip_operator.crawl_ip.crawl_ip.crawl_ip'
+        process = CrawlerProcess({
+            'HEDGE_ENABLED': True,
+            'DOWNLOAD_TIMEOUT': 30,
+            'DOWNLOAD_HANDLERS': {scheme: f'{module}.handlers.HedgeAwareDownloadHandler' for scheme in ('http', 'https')},
+            'DOWNLOADER_MIDDLEWARES': {f'{__name__}.FixedDelayHedge': 700, f'{__name__}.FarmProxyMiddleware': 750},
+            'ROBOTSTXT_OBEY': False,
+            'TELNETCONSOLE_ENABLED': False,
+            'LOG_LEVEL': 'WARNING',
+        }, install_root_handler=False)
+        crawler = process.create_crawler(JudgeSpider)
+        process.crawl(crawler)
+        start = time.monotonic()
+        process.start()
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(responses, [200])
+        self.assertEqual(crawler.stats.get_value('hedge/won'), 1)
+        self.assertEqual(crawler.stats.get_value('hedge/aborted'), 1)
+        # 落败的一方以 CancelledError 结束，此时连接已由客户端中止，而不是等到 DOWNLOAD_TIMEOUT
+        self.assertEqual(FarmProxyMiddleware.exceptions, [('primary', CancelledError)])
+        self.assertLess(elapsed, 10)
+        for _ in range(50):
+            if hang_proxy.open_connections == 0:
+                break
+            time.sleep(0.05)
+        self.assertEqual(hang_proxy.open_connections, 0)
@@ -0,0 +1,134 @@
+"""
+按权重随机选择代理的内存池
+
+用树状数组（Fenwick tree）保存每个代理的权重前缀和:
+- sample(): 按权重随机选择一个代理，O(log n)
+- update(): 修改单个代理的权重，O(log n)
+- add() / remove(): 追加或移除代理，O(log n)；移除只把槽位权重置0，
+  空槽位超过一半时整体重建（均摊 O(log n)）
+
+爬虫的 ProxyMiddleware 用它代替 random.choice(proxy_list)，分数高、响应快的代理被选中的概率更大，
+请求成功或失败后立即调整权重，不需要等下一次从MySQL刷新代理列表。
+"""
+import random
+
+
+class WeightedPool:
+    """按权重随机选择的代理池，权重必须为正数"""
+
+    def __init__(self, items=()):
+        """
+        Args:
+            items (iterable): (key, weight) 序列
+        """
+        self._rebuild(list(items))
+
+    def _rebuild(self, items):
+        self.keys = []
+        self.weights = []
+        self.index = {}
+        for key, weight in items:
+            if key in self.index or weight <= 0:
+                continue
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.weights.append(float(weight))
+        # 线性时间建树: 每个节点把自己的值加到父节点上
+        self.tree = [0.0] + self.weights
+        size = len(self.tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.weights)
+
+    def _add_delta(self, slot, delta):
+        i = slot + 1
+        size = len(self.tree)
+        while i < size:
+            self.tree[i] += delta
+            i += i & -i
+        self.total += delta
+
+    def _prefix_sum(self, count):
+        """前 count 个槽位的权重和"""
+        result = 0.0
+        while count > 0:
+            result += self.tree[count]
+            count -= count & -count
+        return result
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def weight(self, key, default=None):
+        slot = self.index.get(key)
+        return default if slot is None else self.weights[slot]
+
+    def add(self, key, weight):
+        """追加代理，已存在时等同于 update"""
+        if key in self.index:
+            self.update(key, weight)
+            return
+        if weight <= 0:
+            return
+        self.index[key] = len(self.keys)
+        self.keys.append(key)
+        self.weights.append(float(weight))
+        # 新节点 i 覆盖槽位 (i - lowbit(i), i]，其中除自身外的部分由已有前缀和得出
+        i = len(self.keys)
+        self.tree.append(weight + self._prefix_sum(i - 1) - self._prefix_sum(i - (i & -i)))
+        self.total += weight
+
+    def update(self, key, weight):
+        """修改代理权重，权重不大于0时移除"""
+        slot = self.index.get(key)
+        if slot is None:
+            return
+        if weight <= 0:
+            self.remove(key)
+            return
+        self._add_delta(slot, weight - self.weights[slot])
+        self.weights[slot] = float(weight)
+
+    def remove(self, key):
+        """移除代理，不存在时忽略"""
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return
+        self._add_delta(slot, -self.weights[slot])
+        self.weights[slot] = 0.0
+        self.keys[slot] = None
+        if len(self.index) * 2 < len(self.keys):
+            self._rebuild(self.items())
+
+    def items(self):
+        """[(key, weight)]"""
+        return [(key, self.weights[slot]) for key, slot in self.index.items()]
+
+    def sample(self, rng=random):
+        """按权重随机选择一个代理，池为空时返回None"""
+        if not self.index:
+            return None
+        target = rng.random() * self.total
+        # 从最高位开始在树上二分查找第一个前缀和超过 target 的槽位
+        position = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = position + step
+            if nxt < len(self.tree) and self.tree[nxt] <= target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        slot = min(position, len(self.keys) - 1)
+        if self.keys[slot] is None:
+            # 多次增量更新后浮点误差可能落在已移除的槽位上，重建后重新选择
+            self._rebuild(self.items())
+            return self.sample(rng)
+        return self.keys[slot]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+综合评分基准测试
+
+在数据库中生成N个代理及其评分历史，对比:
+- 逐个代理评分: score_model.compute_history_scores，即引入综合评分之前评分收尾实际执行的代码
+  （使用纯Python的 decayed_scores，与编译评分内核之前一致）
+- 综合评分（整个IP池）: composite_score.compute_composite_scores 读取指标并一次向量化计算
+- 综合评分（本次写回的代理）: 增量评分后 finish_score 只对写回的 --touched 个代理重算
+测试数据使用 bench- 前缀，结束后自动清理。
+
+用法:
+    python utlis/bench_composite_score.py --count 100000
+    python utlis/bench_composite_score.py --count 100000 --settings CollectIp.settings_optimized
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import timedelta
+
+# 添加项目根目录到Python路径
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+sys.path.insert(0, project_root)
+
+PREFIX = 'bench-'
+
+
+def seed(IpData, ScoreHistory, count, history_per_proxy, now):
+    """生成代理和评分历史，部分指标缺失"""
+    cleanup(IpData, ScoreHistory)
+    servers = [f'{PREFIX}{i:06d}:8080' for i in range(count)]
+    IpData.objects.bulk_create(
+        [
+            IpData(
+                server=server,
+                ping=round(random.uniform(0.01, 3), 4) if random.random() > 0.3 else None,
+                speed=round(random.uniform(0, 100), 2) if random.random() > 0.2 else None,
+                uptime1=f'{random.randint(0, 100)}%',
+                uptime2=f'{random.randint(0, 50)}/{random.randint(0, 50)}',
+                last_scored_at=now - timedelta(seconds=random.uniform(0, 7 * 86400)),
+            )
+            for server in servers
+        ],
+        batch_size=1000,
+    )
+    history = []
+    for server in servers:
+        for _ in range(history_per_proxy):
+            success = random.random() < 0.7
+            history.append(ScoreHistory(
+                server=server,
+                success=success,
+                latency_ms=random.randint(50, 12000) if success else None,
+                probed_at=now - timedelta(seconds=random.uniform(0, 2 * 86400)),
+            ))
+    ScoreHistory.objects.bulk_create(history, batch_size=1000)
+    return servers
+
+
+def cleanup(IpData, ScoreHistory):
+    IpData.objects.filter(server__startswith=PREFIX).delete()
+    ScoreHistory.objects.filter(server__startswith=PREFIX).delete()
+
+
+def timed(label, func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label}: {best:8.3f} 秒 ({len(result)} 个代理)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='综合评分基准测试')
+    parser.add_argument('--count', type=int, default=100000, help='代理数量')
+    parser.add_argument('--history', type=int, default=3, help='每个代理的评分历史条数')
+    parser.add_argument('--touched', type=int, default=1000, help='增量评分写回的代理数量')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    parser.add_argument('--settings', default='CollectIp.settings', help='Django配置模块')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', args.settings)
+    import django
+    django.setup()
+
+    from unittest import mock
+    from django.db import connection
+    from django.utils import timezone
+    from index.models import IpData, ScoreHistory
+    from ip_operator import score_kernel
+    from ip_operator.services import score_model
+    from ip_operator.services.composite_score import compute_composite_scores
+
+    now = timezone.now()
+    print(f"数据库: {connection.vendor}, 代理数量: {args.count}, 每个代理 {args.history} 条评分历史")
+    try:
+        servers = seed(IpData, ScoreHistory, args.count, args.history, now)
+        touched = random.sample(servers, min(args.touched, len(servers)))
+
+        with mock.patch.object(score_model, 'decayed_scores', score_kernel.python_decayed_scores):
+            per_proxy = timed("逐个代理评分      ",
+                              lambda: score_model.compute_history_scores(servers, now=now), args.repeat)
+        whole = timed("综合评分(整个IP池)", lambda: compute_composite_scores(servers, now=now), args.repeat)
+        timed(f"综合评分(写回的{len(touched)}个)", lambda: compute_composite_scores(touched, now=now), args.repeat)
+        print(f"加速比:             {per_proxy / whole:8.1f}x")
+    finally:
+        cleanup(IpData, ScoreHistory)
+
+
+if __name__ == '__main__':
+    main()
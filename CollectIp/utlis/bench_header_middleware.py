@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+请求头中间件基准测试
+
+对比 RandomUserAgentMiddleware 每秒能处理的请求数:
+- 旧实现: 每个请求随机拼装请求头（逐项随机选择、生成Cookie、拼接与UA无关的 Sec-CH-UA-*），
+  并向标准输出打印约10行调试信息（测试时输出到 /dev/null）
+- 新实现: 启动时预先生成的请求头组合，每个请求只做一次随机选择和一次请求头合并
+
+用法:
+    python utlis/bench_header_middleware.py --requests 20000
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import string
+import argparse
+import contextlib
+from urllib.parse import urlparse
+
+# 添加项目根目录和Scrapy项目目录到Python路径
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'ip_operator', 'crawl_ip', 'crawl_ip'))
+
+from scrapy import Request, Spider
+
+URLS = [
+    'https://movie.douban.com/subject/{}/',
+    'https://search.douban.com/movie/subject_search?search_text={}',
+    'https://www.zhihu.com/question/{}',
+    'https://www.example.com/item/{}',
+    'https://www.example.com/list?page={}',
+]
+
+LEGACY_CHROME_VERSIONS = ['110', '111', '112', '113', '114', '115', '116', '117', '118', '119', '120', '121', '122']
+LEGACY_PLATFORMS = ['"Windows"', '"macOS"', '"Linux"', '"Android"', '"iOS"']
+LEGACY_ACCEPT = [
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+]
+LEGACY_SCREEN_RESOLUTIONS = ['1920x1080', '2560x1440', '1366x768', '1440x900', '1536x864', '2560x1600', '3840x2160', '1280x720']
+
+
+def legacy_cookie(templates):
+    timestamp = int(time.time())
+    return random.choice(templates).format(
+        random_id=random.randint(1000000000, 9999999999),
+        random_id2=random.randint(1000000000, 9999999999),
+        timestamp=timestamp,
+        random_char=''.join(random.choices(string.ascii_lowercase + string.digits, k=11)),
+        random_num=random.randint(1, 7),
+    )
+
+
+def legacy_referrer(url):
+    parsed_url = urlparse(url)
+    domain, scheme = parsed_url.netloc, parsed_url.scheme
+    if '/search' in url:
+        return f"{scheme}://{domain}/"
+    if any(part in url for part in ['/detail', '/item', '/product', '/subject']):
+        return f"{scheme}://{domain}/search"
+    if '/user' in url or '/member' in url or '/profile' in url:
+        return f"{scheme}://{domain}/"
+    if random.random() < 0.8:
+        if random.random() < 0.7:
+            return f"{scheme}://{domain}/"
+        return random.choice(["https://www.google.com/search?q=", "https://www.bing.com/search?q=",
+                              "https://www.baidu.com/s?wd="]) + domain
+    return None
+
+
+def legacy_process_request(mw, request, generate_random_cookie):
+    """旧实现的 process_request（按原逻辑精简）"""
+    netloc = urlparse(request.url).netloc
+    parts = netloc.split('.')
+    domain = '.'.join(parts[1:]) if len(parts) > 2 and parts[0] == 'www' else netloc
+    user_agent = random.choice(mw.user_agents)
+    request.headers['User-Agent'] = user_agent
+    request.headers['Accept-Language'] = random.choice(mw.accept_language)
+    request.headers['Accept'] = random.choice(LEGACY_ACCEPT)
+    request.headers.update({
+        'Accept-Encoding': 'gzip, deflate, br', 'Connection': 'keep-alive', 'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Dest': 'document', 'Sec-Fetch-Mode': 'navigate', 'Sec-Fetch-Site': 'none',
+        'Sec-Fetch-User': '?1', 'Cache-Control': 'max-age=0',
+    })
+    for site_domain, template in mw.site_specific_templates.items():
+        if site_domain in domain:
+            headers = template.copy()
+            if site_domain == 'douban.com':
+                headers.update({
+                    "authority": domain, "method": request.method, "path": urlparse(request.url).path,
+                    "scheme": "https", "cookie": generate_random_cookie(),
+                    "cache-control": random.choice(["max-age=0", "no-cache"]),
+                    "priority": random.choice(["u=0, i", "u=1, i"]),
+                })
+            request.headers.update(headers)
+            print(f"【UA中间件】为域名 {domain} 使用特定请求头配置")
+            break
+    if random.random() < 0.9:
+        version = random.choice(LEGACY_CHROME_VERSIONS)
+        request.headers.update({
+            'sec-ch-ua': f'"Google Chrome";v="{version}", "Chromium";v="{version}", "Not A(Brand";v="99"',
+            'sec-ch-ua-platform': random.choice(LEGACY_PLATFORMS),
+            'sec-ch-ua-mobile': random.choice(['?0', '?1']),
+        })
+    if 'Referer' not in request.headers:
+        referer = legacy_referrer(request.url)
+        if referer:
+            request.headers['Referer'] = referer
+    if random.random() < 0.7 and 'Cookie' not in request.headers:
+        request.headers['Cookie'] = legacy_cookie(mw.cookie_templates)
+    if random.random() < 0.5:
+        random.choice(LEGACY_SCREEN_RESOLUTIONS).split('x')
+        random.choice([24, 30, 32])
+        request.headers.update({
+            'Sec-CH-UA-Bitness': random.choice(['64', '32']),
+            'Sec-CH-UA-Arch': random.choice(['x86', 'arm']),
+            'Sec-CH-UA-Full-Version': f'"{random.choice(LEGACY_CHROME_VERSIONS)}.0.{random.randint(1000, 9999)}.{random.randint(10, 99)}"',
+            'Sec-CH-UA-Platform-Version': f'"{random.randint(10, 14)}.{random.randint(0, 9)}.{random.randint(10000, 99999)}"',
+            'Sec-CH-UA-Model': '""',
+            'Sec-CH-UA-WoW64': random.choice(['?0', '?1']),
+        })
+    print(f"\n【UA中间件】请求 URL: {request.url[:50]}...")
+    print(f"【UA中间件】域名: {domain}")
+    print(f"【UA中间件】User-Agent: {user_agent[:50]}...")
+    for flag in ('特定站点配置', '添加指纹保护', '添加Referer', '添加Cookie', 'AJAX请求', '资源请求', '添加额外headers'):
+        print(f"【UA中间件】{flag}: 否")
+
+
+def run(process, requests):
+    """返回每秒处理的请求数"""
+    start = time.perf_counter()
+    for request in requests:
+        process(request)
+    return len(requests) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='请求头中间件基准测试')
+    parser.add_argument('--requests', type=int, default=20000, help='请求数量')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from crawl_ip.middlewares import RandomUserAgentMiddleware, generate_random_cookie
+        mw = RandomUserAgentMiddleware()
+    mw.debug = False
+    spider = Spider('bench')
+
+    def make_requests():
+        return [Request(URLS[i % len(URLS)].format(1000000 + i)) for i in range(args.requests)]
+
+    print(f"请求数量: {args.requests}, 请求头组合: {len(getattr(mw, 'profiles', ()))}")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        legacy = run(lambda r: legacy_process_request(mw, r, generate_random_cookie), make_requests())
+        current = run(lambda r: mw.process_request(r, spider), make_requests())
+    print(f"旧实现: {legacy:12,.0f} 请求/秒 ({1e6 / legacy:7.1f} 微秒/请求)")
+    print(f"新实现: {current:12,.0f} 请求/秒 ({1e6 / current:7.1f} 微秒/请求)")
+    print(f"加速比: {current / legacy:12.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+评分计算内核基准测试
+
+对比 ip_operator.score_kernel 的纯Python实现与Cython编译实现（_score_kernel.pyx）:
+- parse_proxy: 代理地址解析校验
+- decayed_scores: 评分历史的时间衰减聚合
+- latency_quantile: 延迟分位数
+并校验两者结果一致。需要先编译内核:
+    python utlis/setup.py build_ext --inplace
+
+用法:
+    python utlis/bench_score_kernel.py --proxies 10000 --history 50
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+# 添加项目根目录到Python路径
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+sys.path.insert(0, project_root)
+
+from ip_operator import score_kernel
+
+
+def best_of(repeat, func, *args):
+    """重复执行，返回最快一次的耗时和结果"""
+    best, result = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def make_servers(count):
+    servers = [f'{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.'
+               f'{random.randint(0, 255)}:{random.randint(1, 65535)}' for _ in range(count)]
+    # 混入少量非法地址
+    servers.extend(['1.2.3:80', '1.2.3.4', '256.1.1.1:80', '1.2.3.4:0', 'a.b.c.d:80'] * (count // 100))
+    return servers
+
+
+def make_history(servers, per_proxy):
+    rows = []
+    for server in servers:
+        for _ in range(per_proxy):
+            success = random.random() < 0.7
+            latency = random.randint(50, 9000) if success else None
+            rows.append((server, success, latency, random.uniform(0, 3 * 86400)))
+    random.shuffle(rows)
+    return rows
+
+
+def report(name, python_time, compiled_time, same):
+    print(f"{name:18s} 纯Python {python_time:8.4f} 秒 | Cython {compiled_time:8.4f} 秒 | "
+          f"加速 {python_time / compiled_time:6.1f}x | 结果一致: {same}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评分计算内核基准测试')
+    parser.add_argument('--proxies', type=int, default=10000, help='代理数量')
+    parser.add_argument('--history', type=int, default=50, help='每个代理的历史记录数量')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    args = parser.parse_args()
+
+    if not score_kernel.COMPILED:
+        print("Cython内核未编译，请先执行: python utlis/setup.py build_ext --inplace")
+        return
+
+    random.seed(0)
+    servers = make_servers(args.proxies)
+    rows = make_history(servers[:args.proxies], args.history)
+    latencies = [random.uniform(0.05, 10) for _ in range(args.history * 20)]
+    print(f"代理数量: {args.proxies}, 历史记录: {len(rows)}")
+
+    def parse_all(parse):
+        return [parse(server) for server in servers]
+
+    python_time, expected = best_of(args.repeat, parse_all, score_kernel.python_parse_proxy)
+    compiled_time, actual = best_of(args.repeat, parse_all, score_kernel.parse_proxy)
+    report('parse_proxy', python_time, compiled_time, expected == actual)
+
+    params = (86400 / 4, 1.0, 1.0, 10.0)
+    python_time, expected = best_of(args.repeat, score_kernel.python_decayed_scores, rows, *params)
+    compiled_time, actual = best_of(args.repeat, score_kernel.decayed_scores, rows, *params)
+    same = expected.keys() == actual.keys() and all(abs(expected[k] - actual[k]) < 1e-6 for k in expected)
+    report('decayed_scores', python_time, compiled_time, same)
+
+    def quantiles(quantile):
+        return [quantile(latencies, q) for q in (0.5, 0.9, 0.95, 0.99)] * 100
+
+    python_time, expected = best_of(args.repeat, quantiles, score_kernel.python_latency_quantile)
+    compiled_time, actual = best_of(args.repeat, quantiles, score_kernel.latency_quantile)
+    report('latency_quantile', python_time, compiled_time, expected == actual)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+评分结果写回基准测试
+
+对比逐行 UPDATE（旧实现）与分块多行 UPDATE/DELETE（score_writer.write_scores）
+写回 N 个代理评分所需的时间。测试数据使用 bench- 前缀，结束后自动清理。
+
+用法:
+    python utlis/bench_score_writeback.py --count 10000
+    python utlis/bench_score_writeback.py --count 10000 --settings CollectIp.settings_optimized
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# 添加项目根目录到Python路径
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+sys.path.insert(0, project_root)
+
+PREFIX = 'bench-'
+
+
+def make_scores(count, low_ratio):
+    """生成评分结果，其中 low_ratio 比例的代理为0分"""
+    scores = {}
+    for i in range(count):
+        server = f'{PREFIX}{i:06d}:8080'
+        scores[server] = 0 if random.random() < low_ratio else random.uniform(10, 100)
+    return scores
+
+
+def seed(IpData, scores):
+    IpData.objects.filter(server__startswith=PREFIX).delete()
+    IpData.objects.bulk_create(
+        [IpData(server=server, score=100) for server in scores],
+        batch_size=1000,
+    )
+
+
+def legacy_write(IpData, scores, min_score):
+    """旧实现：每个代理一条 UPDATE，再删除低分代理"""
+    from django.db import transaction
+
+    with transaction.atomic():
+        low_score_servers = []
+        for server, score in scores.items():
+            IpData.objects.filter(server=server).update(score=score)
+            if score < min_score:
+                low_score_servers.append(server)
+        if low_score_servers:
+            IpData.objects.filter(server__in=low_score_servers).delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评分结果写回基准测试')
+    parser.add_argument('--count', type=int, default=10000, help='代理数量')
+    parser.add_argument('--low-ratio', type=float, default=0.3, help='低分代理比例')
+    parser.add_argument('--chunk-size', type=int, default=500, help='每条语句处理的代理数量')
+    parser.add_argument('--settings', default='CollectIp.settings', help='Django配置模块')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', args.settings)
+    import django
+    django.setup()
+
+    from django.db import connection
+    from index.models import IpData
+    from ip_operator.services.score_writer import write_scores
+
+    min_score = 10
+    scores = make_scores(args.count, args.low_ratio)
+    print(f"数据库: {connection.vendor}, 代理数量: {args.count}, 低分比例: {args.low_ratio:.0%}")
+
+    try:
+        seed(IpData, scores)
+        start = time.perf_counter()
+        legacy_write(IpData, scores, min_score)
+        legacy_time = time.perf_counter() - start
+        print(f"逐行写回:   {legacy_time:8.3f} 秒")
+
+        seed(IpData, scores)
+        start = time.perf_counter()
+        updated, deleted = write_scores(scores, min_score, chunk_size=args.chunk_size)
+        bulk_time = time.perf_counter() - start
+        print(f"批量写回:   {bulk_time:8.3f} 秒 (更新 {updated}, 删除 {deleted}, 每块 {args.chunk_size})")
+
+        print(f"加速比:     {legacy_time / bulk_time:8.1f}x")
+    finally:
+        IpData.objects.filter(server__startswith=PREFIX).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+评分引擎基准测试
+
+在独立进程中启动本地探测目标服务器和模拟代理集群（ip_operator/proxy_farm.py），
+然后用各评分引擎对这些代理评分，输出吞吐量（代理/秒）、探测延迟 p50/p99、
+峰值内存（tracemalloc统计的Python分配）和探测结果分布。不访问外网，也不需要数据库。
+
+用法:
+    python utlis/bench_scorer.py --count 500
+    python utlis/bench_scorer.py --count 2000 --engines async prefilter --mix ok=0.3,refuse=0.4,hang=0.2,reset=0.1
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from collections import Counter
+
+# 添加项目根目录到Python路径
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, '..'))
+sys.path.insert(0, project_root)
+
+DEFAULT_MIX = 'ok=0.5,refuse=0.2,hang=0.1,reset=0.05,bad_tls=0.1,error_5xx=0.05'
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, ratio = item.partition('=')
+        mix[name.strip()] = float(ratio)
+    return mix
+
+
+def make_certificate(directory):
+    """用openssl生成自签名证书，没有openssl时返回 (None, None)，只测试HTTP"""
+    if not shutil.which('openssl'):
+        return None, None
+    certfile = os.path.join(directory, 'judge.crt')
+    keyfile = os.path.join(directory, 'judge.key')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-keyout', keyfile, '-out', certfile],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return certfile, keyfile
+
+
+def run_farm(conn, count, mix, latency_median, latency_sigma, certfile, keyfile):
+    """子进程：启动探测目标和模拟代理集群，把地址发回主进程，收到任意消息后退出"""
+    from ip_operator.probe_server import ProbeServer
+    from ip_operator.proxy_farm import ProxyFarm
+
+    judge = ProbeServer('127.0.0.1', 0, 0 if certfile else None, certfile, keyfile).start_in_thread()
+    farm = ProxyFarm(count, mix, latency_median, latency_sigma).start_in_thread()
+    conn.send((farm.servers, farm.server_modes(), judge.http_url, judge.https_url))
+    conn.recv()
+    farm.stop()
+    judge.stop()
+
+
+def make_scorer(engine, args, http_url, https_url):
+    from ip_operator.ip_scorer import IPScorer
+    from ip_operator.async_scorer import AsyncIPScorer
+
+    scorer = IPScorer() if engine == 'thread' else AsyncIPScorer(concurrency=args.concurrency)
+    scorer.use_probe_target(http_url, https_url, verify_ssl=False)
+    scorer.timeout = args.timeout
+    scorer.load_protocol_hints = lambda ip_list: {}  # 不读数据库
+    return scorer
+
+
+def iter_engine(engine, scorer, servers, args):
+    """按引擎名称产出 (server, score, metrics)；prefilter 为 TCP预筛选 + 异步探测"""
+    if engine != 'prefilter':
+        yield from scorer.iter_scores(servers)
+        return
+
+    from ip_operator.tcp_prefilter import tcp_prefilter
+    alive, dead = tcp_prefilter(servers, timeout=args.prefilter_timeout, concurrency=args.concurrency * 2)
+    for server in dead:
+        yield server, 0, {'attempts': 0, 'probes': [{'protocol': 'tcp', 'success': False,
+                                                       'latency': None, 'outcome': 'tcp_dead'}]}
+    yield from scorer.iter_scores([server for server in servers if server in alive])
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_engine(engine, servers, modes, args, http_url, https_url):
+    scorer = make_scorer('async' if engine == 'prefilter' else engine, args, http_url, https_url)
+    latencies = []
+    outcomes = Counter()
+    kept = Counter()
+    attempts = 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for server, score, metrics in iter_engine(engine, scorer, servers, args):
+        attempts += metrics.get('attempts', 0)
+        for probe in metrics.get('probes', ()):
+            outcomes[probe.get('outcome', 'ok' if probe.get('success') else 'error')] += 1
+            if probe.get('success'):
+                latencies.append(probe['latency'])
+        if score > 0:
+            kept[modes[server]] += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\n[{engine}]")
+    print(f"  耗时:       {elapsed:8.2f} 秒, 吞吐量 {len(servers) / elapsed:8.1f} 代理/秒, 请求 {attempts} 次")
+    print(f"  探测延迟:   p50 {percentile(latencies, 0.5) * 1000:7.1f} ms, p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+    print(f"  峰值内存:   {peak / 1024 / 1024:8.1f} MB")
+    print(f"  结果分布:   {dict(outcomes.most_common())}")
+    print(f"  得分>0代理: {dict(kept)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评分引擎基准测试（本地模拟代理集群）')
+    parser.add_argument('--count', type=int, default=500, help='模拟代理数量')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='代理模式比例，例如 ok=0.5,refuse=0.5')
+    parser.add_argument('--latency', type=float, default=0.05, help='代理延迟中位数（秒）')
+    parser.add_argument('--sigma', type=float, default=0.5, help='代理延迟对数正态分布σ')
+    parser.add_argument('--timeout', type=float, default=3, help='评分超时（秒）')
+    parser.add_argument('--prefilter-timeout', type=float, default=1, help='TCP预筛选超时（秒）')
+    parser.add_argument('--concurrency', type=int, default=500, help='异步引擎并发上限')
+    parser.add_argument('--engines', nargs='+', default=['thread', 'async', 'prefilter'],
+                        choices=['thread', 'async', 'prefilter'], help='要测试的评分引擎')
+    parser.add_argument('--no-tls', action='store_true', help='不启用HTTPS探测')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = (None, None) if args.no_tls else make_certificate(tmp)
+        parent, child = multiprocessing.Pipe()
+        farm = multiprocessing.Process(
+            target=run_farm,
+            args=(child, args.count, parse_mix(args.mix), args.latency, args.sigma, certfile, keyfile),
+            daemon=True,
+        )
+        farm.start()
+        servers, modes, http_url, https_url = parent.recv()
+
+        print(f"模拟代理: {args.count} 个, 模式: {dict(Counter(modes.values()))}")
+        print(f"探测目标: {http_url} {https_url or '(未启用HTTPS)'}, 超时 {args.timeout} 秒")
+        try:
+            for engine in args.engines:
+                bench_engine(engine, servers, modes, args, http_url, https_url)
+        finally:
+            parent.send('stop')
+            farm.join(15)
+
+
+if __name__ == '__main__':
+    main()
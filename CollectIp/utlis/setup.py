@@ -1,8 +1,28 @@
-from setuptools import setup
+"""
+编译评分计算内核 ip_operator/_score_kernel.pyx
+
+在 CollectIp 目录下执行:
+    python utlis/setup.py build_ext --inplace
+编译产物 ip_operator/_score_kernel.*.so（Windows下为 .pyd）会被 ip_operator.score_kernel 自动加载，
+未编译时使用纯Python实现。
+"""
+import sys
+
+from setuptools import Extension, setup
 from Cython.Build import cythonize
 
+extra_compile_args = ['/O2'] if sys.platform == 'win32' else ['-O3']
+
 setup(
-    ext_modules=cythonize([
-        "ip_operator/ip_scorer.pyx"
-    ])
-) 
\ No newline at end of file
+    name='collectip-score-kernel',
+    ext_modules=cythonize(
+        [
+            Extension(
+                'ip_operator._score_kernel',
+                ['ip_operator/_score_kernel.pyx'],
+                extra_compile_args=extra_compile_args,
+            ),
+        ],
+        compiler_directives={'language_level': 3},
+    ),
+)